@@ -2,40 +2,19 @@
 
 import argparse
 # from code import interact
-import datetime, os, json
-from typing import Any
+import os, sys, json
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from langchain_ollama import OllamaLLM
-from langchain_core.prompts import ChatPromptTemplate
-from langchain.chat_models import init_chat_model
-from langchain.agents import create_agent
-from langchain.agents import AgentState
-from langchain.agents.middleware import AgentMiddleware
-from langgraph.prebuilt import create_react_agent
-from langgraph.checkpoint.memory import InMemorySaver
 # from pydantic_core.core_schema import is_instance_schema
 from utils import logger
-import tools
 
-class CustomState(AgentState):
-    user_preferences: dict
-    diary_file_path: str = ""
-    plan_file_path: str = ""
-    lst_diary_lines: list[str] = []
-    llm: ChatOpenAI | OllamaLLM = None
-
-class CustomMiddleware(AgentMiddleware):
-    state_schema = CustomState
-    # tools = [tool1, tool2]
-
-    def before_model(self, state: CustomState, runtime) -> dict[str, Any] | None:
-        logger.debug(f"before_model: {state}")
+# langchain, 模型后端与工具等较重的模块只在需要时导入(见 init_model 与 aid_agent.py),
+# init, cache, --help, -V 等命令不加载它们, 启动耗时见 benchmarks/bench_startup.py.
 
 logger.debug("start")
 
+# 加载 .env 之前的环境变量, batch 命令在各工作区中以它为基础加载工作区的 .env
+base_environ = dict(os.environ)
 load_dotenv(".env")
-print(f"MODEL_API_KEY222: {os.getenv('MODEL_API_KEY')}")
 
 # 获取脚本所在目录
 script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -78,8 +57,9 @@ def init_config():
 # ------------------------------------------------------------------------------
 # models 
 # ------------------------------------------------------------------------------
-def init_model(models_config, custom_model):
-    """初始化模型并返回 llm 变量"""
+def init_model(models_config, custom_model, llm_cache=False):
+    """初始化模型并返回 llm 变量. llm_cache 为 True 时缓存模型回复(见 llm_cache.py),
+    缓存以当前配置中的日记与计划文件的版本为键的一部分"""
     # 从配置文件中获取模型配置, 并创建模型
     model_config = models_config["model_config"]
     logger.trace(f"model_config: {model_config}")
@@ -109,17 +89,29 @@ def init_model(models_config, custom_model):
         
     logger.debug(f"selection: {selection}, model_name: {model_name}, model_api_url: {model_api_url}")
 
+    # 可选的模型回复缓存, 脚本中重复的一次性提问可以直接返回
+    cache = None
+    if llm_cache:
+        from llm_cache import ResponseCache
+        cache = ResponseCache(config.get("diary_file"), config.get("plan_file"))
+        logger.debug("llm response cache enabled")
+
+    # 只导入所选的模型后端
     if selection == "ollama":
+        from langchain_ollama import OllamaLLM
         llm = OllamaLLM(
             model=model_name,
             # base_url=model_api_url,
             # api_key=model_api_key,
+            cache=cache,
         )
     else:
+        from langchain_openai import ChatOpenAI
         llm = ChatOpenAI(
             model_name=model_name,
             api_key=model_api_key,
             base_url=model_api_url,
+            cache=cache,
         )
     logger.trace(f"    model:{selection}: {llm}")
     
@@ -129,99 +121,26 @@ def init_model(models_config, custom_model):
     return llm
 
 
-# ------------------------------------------------------------------------------
-# tools 
-# ------------------------------------------------------------------------------
-
-lst_tools = [
-    tools.get_current_date_time,
-    tools.read_diary_file,
-    tools.get_day_diary,
-    tools.get_month_diary,
-    tools.get_year_diary,
-    tools.calc_sum_from_expression,
-    tools.get_plan,
-    tools.email_receive_diary_pop,
-    tools.email_send_notification,
-]
-
-# Create system prompt for the agent
-# Read system prompt from file
-prompt_file_path = os.path.join(script_dir, 'aid_prompt_system.md')
-with open(prompt_file_path, 'r', encoding='utf-8') as f:
-    SYSTEM_PROMPT = f.read()
-
-
-
-is_bold = False
-is_italic = False
-def print_markdown_to_bash_shell(markdown_text: str) -> str:
-    """
-    将Markdown格式的文本转换为Bash Shell脚本格式.
-
-    :param markdown_text: Markdown格式的文本
-    :return: 转换后的Bash Shell脚本格式文本
-    """
-    global is_bold
-    global is_italic
-    
-    # 处理加粗语法 **内容**
-    i = 0
-    while i < len(markdown_text):
-        # 检查是否遇到加粗标记
-        if markdown_text[i:i+2] == "**":
-            # 切换加粗状态
-            if not is_bold:
-                print("\033[01;4m", flush=True, end = "")
-                is_bold = True
-            else:
-                print("\033[0m", flush=True, end = "")
-                is_bold = False
-            i += 2  # 跳过两个星号
-
-        # 检查是否遇到斜体标记
-        elif markdown_text[i] == "_":
-            # 切换斜体状态
-            if not is_italic:
-                print("\033[03;36m", flush=True, end = "")
-                is_italic = True
-            else:
-                print("\033[0m", flush=True, end = "")
-                is_italic = False
-            i += 1  # 跳过1个星号
-            
-        # 检查是否遇到标题标记
-        elif markdown_text[i] == "#":
-            print("\033[01;34m", flush=True, end = "")
-            print(f"{markdown_text[i]}", flush=True, end = "")
-            i += 1
-        # 检查是否遇到换行符
-        elif markdown_text[i] == "\n":
-            print(f"{markdown_text[i]}", flush=True, end = "")
-            print("\033[0m", flush=True, end = "")
-            is_bold = False
-            i += 1
-        else:
-            print(f"{markdown_text[i]}", flush=True, end = "")
-            i += 1
-    
-    if markdown_text.endswith("\n"):
-        print("\033[0m", flush=True, end = "")
-        is_bold = False
+def init_workspace(llm_cache=False):
+    """在当前目录(工作区)中加载配置, 初始化模型与 agent 中间件.
+    返回 (config, diary_file_path, plan_file_path, llm, middleware). batch 命令的每个工作区进程也调用它."""
+    global config, diary_file_path, plan_file_path, models_config, custom_model, llm
+    from tool_executor import ToolExecutionMiddleware, DEFAULT_TOOL_WORKERS, DEFAULT_TOOL_TIMEOUT
+    from history_compaction import HistoryCompactionMiddleware, DEFAULT_MAX_TOKENS
 
+    config, diary_file_path, plan_file_path, models_config, custom_model = init_config()
+    llm = init_model(models_config, custom_model, llm_cache=llm_cache or config.get("llm_cache", False))
 
-# Create a ReAct agent by LangGraph
-def build_agent(llm, tools):
-    agent = create_agent(
-        model=llm,
-        tools=tools,
-        system_prompt=SYSTEM_PROMPT,
-        # middleware=[CustomMiddleware()],
-        state_schema=CustomState,
-        checkpointer=InMemorySaver(),
-        # debug=True,
+    # 同一步中的多个工具调用并发执行, 带超时与耗时记录
+    tool_execution = ToolExecutionMiddleware(
+        max_workers=int(config.get("tool_workers", DEFAULT_TOOL_WORKERS)),
+        timeout=float(config.get("tool_timeout", DEFAULT_TOOL_TIMEOUT)),
+        tool_timeouts=config.get("tool_timeouts"),
     )
-    return agent
+    # 长会话中旧的工具结果折叠, 超出 token 预算的旧对话并入摘要
+    history_compaction = HistoryCompactionMiddleware(
+        llm, max_tokens=int(config.get("history_max_tokens", DEFAULT_MAX_TOKENS)))
+    return config, diary_file_path, plan_file_path, llm, [tool_execution, history_compaction]
 
 
 
@@ -234,12 +153,22 @@ if __name__ == "__main__":
     #     -i, --interactive: interactive mode
 
     parser = argparse.ArgumentParser(description="Aid - AI Assistant for Diary Management")
-    parser.add_argument("command", nargs='?', default=None, help="Command (init or run)")
+    parser.add_argument("command", nargs='?', default=None, help="Command (init, cache, mail-watch, batch or run)")
     parser.add_argument("-s", "--shell", action="store_true", help="show in bash shell")
     parser.add_argument("-V", "--version", action="version", version="%(prog)s 1.0")
     parser.add_argument("-v", "--verbose", help="verbose mode")
     parser.add_argument("-u", "--user_prompt", type=str, help="user prompt")
     parser.add_argument("-i", "--interactive", action="store_true", help="interactive mode")
+    parser.add_argument("--session", nargs='?', const="last", metavar="ID|list",
+                        help="resume a saved session (the last one if no ID), or \"list\" to list sessions")
+    parser.add_argument("--output", choices=["text", "jsonl"], default="text",
+                        help="output format: text for terminals, jsonl for one JSON event per line (see jsonl_output.py)")
+    parser.add_argument("--prompts", metavar="FILE", help="batch: prompt file, one prompt per line")
+    parser.add_argument("--workspaces", nargs="+", metavar="DIR", help="batch: workspace directories")
+    parser.add_argument("--workers", type=int, help="batch: number of workspaces processed at the same time")
+    parser.add_argument("--model-concurrency", type=int, help="batch: max concurrent model requests across all workspaces")
+    parser.add_argument("--results", metavar="DIR", help="batch: write results to DIR/<workspace>-<path hash>.jsonl instead of <workspace>/.aid/batch/")
+    parser.add_argument("--llm-cache", action="store_true", help="cache model responses until the diary or plan file changes (also enabled by \"llm_cache\" in aid_config.json)")
 
     args = parser.parse_args()
     
@@ -248,105 +177,96 @@ if __name__ == "__main__":
         import aid_init
         aid_init.init_project()
         exit(0)
+    # 处理cache命令: 显示缓存统计
+    elif args.command == "cache":
+        from cache_store import cache_store
+        for namespace, stat in sorted(cache_store.stats().items()):
+            print(f"{namespace}: {stat['entries']} entries, {stat['bytes'] or 0} bytes, "
+                  f"hits {stat['hits']}, misses {stat['misses']}, evictions {stat['evictions']}")
+        exit(0)
+    # 处理mail-watch命令: 后台接收日记邮件
+    elif args.command == "mail-watch":
+        import mail_watch
+        mail_watch.main()
+        exit(0)
+    # 处理batch命令: 在多个工作区中执行同一组问题
+    elif args.command == "batch":
+        if not args.prompts or not args.workspaces:
+            parser.error("batch requires --prompts and --workspaces")
+        if args.verbose:
+            logger.set_level(int(args.verbose))
+        import aid_batch
+        exit(aid_batch.run_batch(args.prompts, args.workspaces, init_workspace, base_environ,
+                                 workers=args.workers, model_concurrency=args.model_concurrency,
+                                 results_dir=args.results, llm_cache=args.llm_cache))
+    # 列出保存的会话
+    elif args.session == "list":
+        import datetime
+        from session_store import SessionStore
+        for thread_id, title, updated_at, turns in SessionStore().list():
+            print(f"{thread_id}  {datetime.datetime.fromtimestamp(updated_at):%Y-%m-%d %H:%M}  {turns:>3} turns  {title}")
+        exit(0)
     else:
         # 原有逻辑
         mode = None
-        in_shell = args.shell
+        in_shell = args.shell and args.output == "text"
+        # jsonl 模式下标准输出只输出事件, 日志改到标准错误
+        if args.output == "jsonl":
+            logger.set_stream(sys.stderr)
         if args.verbose:
-            print(f"verbose: {args.verbose}")
+            logger.info(f"verbose: {args.verbose}")
             logger.set_level(int(args.verbose))
 
         if args.user_prompt:
             mode = "once"
         elif args.interactive:
             mode = "interactive"
-            print("请输入您的问题（输入'q'结束）：")
+            if args.output == "text":
+                print("请输入您的问题（输入'q'结束）：")
         else:
             parser.print_help()
             exit(1)
 
-    # 初始化配置和模型
-    config, diary_file_path, plan_file_path, models_config, custom_model = init_config()
-    llm = init_model(models_config, custom_model)
-
-    # Create agent instance
-    agent = build_agent(llm, lst_tools)
-    logger.debug(f"Created agent: {agent}")
-
-    user_input = ""
-    if args.user_prompt:
-        user_input = args.user_prompt
+    import asyncio
+    from diary_store import diary_store
+    from aid_agent import build_agent, lst_tools, run_session
+
+    # 初始化配置, 模型与 agent 中间件
+    config, diary_file_path, plan_file_path, llm, middleware = init_workspace(args.llm_cache)
+
+    # 交互模式下监视日记文件, 会话中的编辑即时生效
+    if args.interactive:
+        diary_store.watch(diary_file_path)
+
+    # 持久会话: 指定 --session 或 aid_config.json 中 "persist_sessions" 为 true 时, 对话保存在 .aid/sessions.db,
+    # 之后可用 --session [ID] 继续; 否则对话只保存在内存中
+    sessions = None
+    thread_id = "1"
+    if args.session or config.get("persist_sessions", False):
+        from session_store import SessionStore, SESSION_TTL_DAYS
+        sessions = SessionStore()
+        thread_id = sessions.resolve(args.session)
+        session_ttl_days = float(config.get("session_ttl_days", SESSION_TTL_DAYS))
+        sessions.prune(thread_id, session_ttl_days)
+        logger.info(f"会话: {thread_id}")
+
+    async def main():
+        if sessions is None:
+            agent = build_agent(llm, lst_tools, middleware)
+            logger.debug(f"Created agent: {agent}")
+            await run_session(agent, llm, diary_file_path, plan_file_path, args.user_prompt, args.interactive, in_shell,
+                              output=args.output)
+            return
+
+        async with sessions.checkpointer() as checkpointer:
+            agent = build_agent(llm, lst_tools, middleware, checkpointer)
+            logger.debug(f"Created agent: {agent}")
+            try:
+                await run_session(agent, llm, diary_file_path, plan_file_path, args.user_prompt, args.interactive, in_shell,
+                                  thread_id, sessions, args.output)
+            finally:
+                # 只保留本会话最新的几个 checkpoint
+                sessions.prune(thread_id, session_ttl_days)
 
     # 循环相应用户输入
-    while True:
-        if args.interactive:
-            print("\n>\033[01;35m", flush=True, end = "")
-            user_input = input("")
-            print("\033[0m", flush=True, end = "")
-            if user_input == 'q':
-                break
-            if len(user_input.strip()) == 0:
-                continue
-        #response = agent.invoke({
-        #    # "input": user_input,
-        #    "messages": [{"role": "user", "content": user_input}]
-        #})
-        #print(response)
-
-        # ----------------------------------------
-        #for chunk in agent.stream({
-        #    "messages": [{"role": "user", "content": user_input}],
-        #    # "lst_diary_lines": [],
-        #    "diary_file_path": diary_file_path,
-        #}, {
-        #    "configurable": {"thread_id": "1"}
-        #}, stream_mode="values"):
-        #    # Each chunk contains the full state at that point
-        #    latest_message = chunk["messages"][-1]
-        #    # logger.debug(f"##### message type: {type(latest_message)}, dir(latest_message): {dir(latest_message)}")
-        #    if latest_message.content:
-        #        print(f"\033[01;34m[{latest_message.type}]\033[0m >>>{latest_message.content}<<<")
-        #    elif hasattr(latest_message, "tool_calls"):
-        #        logger.debug(f"[Tool] Calling tools: {[tc['name'] for tc in latest_message.tool_calls]}")
-        #    else:
-        #        logger.debug(f"##### chunk: {chunk}")
-
-
-        # ----------------------------------------
-        str_current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        user_prompt = f"当前时间: {str_current_time}\n{user_input}"
-        is_reasoning = False
-        for token, metadata in agent.stream(
-            {
-                "messages": [{"role": "user", "content": user_prompt}],
-                "diary_file_path": diary_file_path,
-                "plan_file_path": plan_file_path,
-                # "llm": default_llm,
-                "llm": llm,
-            }, {
-                "configurable": {"thread_id": "1"}
-            },
-            stream_mode="messages",
-        ):
-            # print(f"node: {metadata}")
-            # print(f"content: {token}")
-            if token.content_blocks and token.content_blocks[0]["type"] == "text":
-                if is_reasoning:
-                    is_reasoning = False
-                    print("#####\n")
-                if metadata["langgraph_node"] == "tools":
-                    logger.trace(f"\033[02;37m[Tool] {token.content_blocks[0]['text']}\033[0m", flush=True, end = "")
-                else:
-                    if in_shell:
-                        print_markdown_to_bash_shell(token.content_blocks[0]["text"])
-                    else:
-                        print(token.content_blocks[0]["text"], flush=True, end = "")
-            elif token.content_blocks and token.content_blocks[0]["type"] == "reasoning":
-                is_reasoning = True
-                print(f"\033[02;37m{token.content_blocks[0]['reasoning']}\033[0m", flush=True, end = "")
-
-
-        if not args.interactive:
-            print("\033[0m\n")
-            break
-##
\ No newline at end of file
+    asyncio.run(main())
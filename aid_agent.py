@@ -0,0 +1,204 @@
+"""agent 的构建与对话循环. 依赖 langchain/langgraph, 只在 aid.py 运行对话时才导入."""
+import asyncio
+import datetime, os
+from typing import Any
+from langchain.agents import create_agent
+from langchain.agents import AgentState
+from langchain.agents.middleware import AgentMiddleware
+from langgraph.checkpoint.memory import InMemorySaver
+from utils import logger
+from shell_markdown import ShellMarkdownRenderer
+from jsonl_output import JsonlEventWriter
+import tools
+from tools import AidContext
+
+# 获取脚本所在目录
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+# state 会被 checkpointer 在每一步保存, 只放小的句柄(文件路径). 日记内容由 diary_store 按引用提供.
+class CustomState(AgentState):
+    user_preferences: dict
+    diary_file_path: str = ""
+    plan_file_path: str = ""
+
+class CustomMiddleware(AgentMiddleware):
+    state_schema = CustomState
+    # tools = [tool1, tool2]
+
+    def before_model(self, state: CustomState, runtime) -> dict[str, Any] | None:
+        logger.debug(f"before_model: {state}")
+
+
+# ------------------------------------------------------------------------------
+# tools 
+# ------------------------------------------------------------------------------
+
+lst_tools = [
+    tools.get_current_date_time,
+    tools.get_day_diary,
+    tools.get_week_diary,
+    tools.get_month_diary,
+    tools.get_quarter_diary,
+    tools.get_diary_range,
+    tools.get_year_diary,
+    tools.get_period_summary,
+    tools.calc_sum_from_expression,
+    tools.get_score_stats,
+    tools.get_plan,
+    tools.email_receive_diary_pop,
+    tools.email_send_notification,
+]
+
+# Create system prompt for the agent
+# Read system prompt from file
+prompt_file_path = os.path.join(script_dir, 'aid_prompt_system.md')
+with open(prompt_file_path, 'r', encoding='utf-8') as f:
+    SYSTEM_PROMPT = f.read()
+
+
+
+# Create a ReAct agent by LangGraph
+def build_agent(llm, tools, middleware=(), checkpointer=None):
+    agent = create_agent(
+        model=llm,
+        tools=tools,
+        system_prompt=SYSTEM_PROMPT,
+        # middleware=[CustomMiddleware()],
+        middleware=list(middleware),
+        state_schema=CustomState,
+        context_schema=AidContext,
+        # 默认只在内存中保存对话; 持久会话使用 session_store 提供的 AsyncSqliteSaver
+        checkpointer=checkpointer if checkpointer is not None else InMemorySaver(),
+        # debug=True,
+    )
+    return agent
+
+
+def _turn_input(diary_file_path: str, plan_file_path: str, user_input: str) -> dict:
+    str_current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    user_prompt = f"当前时间: {str_current_time}\n{user_input}"
+    return {
+        "messages": [{"role": "user", "content": user_prompt}],
+        "diary_file_path": diary_file_path,
+        "plan_file_path": plan_file_path,
+    }
+
+
+async def stream_reply(agent, llm, diary_file_path: str, plan_file_path: str, user_input: str, in_shell: bool,
+                       thread_id: str = "1") -> None:
+    """把一轮对话的回复流式输出到终端.
+
+    使用 agent.astream: 工具为 async 实现, 执行期间事件循环不被阻塞, 回复与思考过程持续输出.
+    """
+    is_reasoning = False
+    renderer = ShellMarkdownRenderer() if in_shell else None
+    async for token, metadata in agent.astream(
+        _turn_input(diary_file_path, plan_file_path, user_input),
+        {"configurable": {"thread_id": thread_id}},
+        context=AidContext(llm=llm),
+        stream_mode="messages",
+    ):
+        # print(f"node: {metadata}")
+        # print(f"content: {token}")
+        node = metadata["langgraph_node"]
+        # 只有 model 节点的输出是回复; 中间件节点(如历史压缩写回的摘要消息)不输出
+        if node not in ("model", "tools"):
+            continue
+        if token.content_blocks and token.content_blocks[0]["type"] == "text":
+            if is_reasoning:
+                is_reasoning = False
+                print("#####\n")
+            if node == "tools":
+                logger.trace(f"\033[02;37m[Tool] {token.content_blocks[0]['text']}\033[0m", flush=True, end = "")
+            else:
+                if renderer is not None:
+                    renderer.feed(token.content_blocks[0]["text"])
+                else:
+                    print(token.content_blocks[0]["text"], flush=True, end = "")
+        elif token.content_blocks and token.content_blocks[0]["type"] == "reasoning":
+            is_reasoning = True
+            print(f"\033[02;37m{token.content_blocks[0]['reasoning']}\033[0m", flush=True, end = "")
+    if renderer is not None:
+        renderer.close()
+
+
+async def stream_reply_jsonl(agent, llm, diary_file_path: str, plan_file_path: str, user_input: str,
+                             thread_id: str = "1", stream=None, model_semaphore=None) -> JsonlEventWriter:
+    """把一轮对话输出为 JSON Lines 事件(见 jsonl_output.py), stream 默认为标准输出.
+
+    同时订阅 messages(流式文本)与 updates(每步完整的模型消息与工具结果, 含 token 用量) 两种流.
+    出错时先输出 error 事件再抛出. 返回 writer, 其中有本轮的调用次数与 token 用量.
+    model_semaphore 为 batch 命令限制模型请求并发数的信号量, 放入 AidContext 供工具与中间件使用.
+    """
+    writer = JsonlEventWriter(stream)
+    writer.start(thread_id, user_input)
+    answer = ""
+    try:
+        async for mode, data in agent.astream(
+            _turn_input(diary_file_path, plan_file_path, user_input),
+            {"configurable": {"thread_id": thread_id}},
+            context=AidContext(llm=llm, model_semaphore=model_semaphore),
+            stream_mode=["messages", "updates"],
+        ):
+            if mode == "messages":
+                token, metadata = data
+                # 只有 model 节点的输出是回复: 工具内部的模型调用(如 get_plan)与中间件节点
+                # (如历史压缩写回的摘要消息)的输出都不属于回复
+                if metadata["langgraph_node"] != "model" or not token.content_blocks:
+                    continue
+                block = token.content_blocks[0]
+                if block["type"] == "text":
+                    writer.text("token", block["text"])
+                elif block["type"] == "reasoning":
+                    writer.text("reasoning", block["reasoning"])
+                continue
+
+            for node, update in data.items():
+                # 中间件节点(如历史压缩)的更新不输出
+                if node not in ("model", "tools") or not update:
+                    continue
+                for message in update.get("messages", []):
+                    if message.type == "ai":
+                        writer.model_message(message)
+                        if not message.tool_calls:
+                            answer = message.text
+                    elif message.type == "tool":
+                        writer.tool_message(message)
+    except Exception as e:
+        writer.error(e)
+        raise
+    writer.final(answer)
+    return writer
+
+
+async def run_session(agent, llm, diary_file_path: str, plan_file_path: str,
+                      user_prompt: str | None, interactive: bool, in_shell: bool,
+                      thread_id: str = "1", sessions=None, output: str = "text") -> None:
+    """循环响应用户输入: 交互模式下逐条读取输入(在线程中读取, 不阻塞事件循环), 否则只执行一次.
+    sessions 为 session_store.SessionStore 时, 每轮对话后记录会话的使用时间.
+    output 为 "jsonl" 时输出 JSON Lines 事件, 不输出提示符与终端样式."""
+    jsonl = output == "jsonl"
+    user_input = user_prompt or ""
+    while True:
+        if interactive:
+            if not jsonl:
+                print("\n>\033[01;35m", flush=True, end = "")
+            user_input = await asyncio.to_thread(input, "")
+            if not jsonl:
+                print("\033[0m", flush=True, end = "")
+            if user_input == 'q':
+                break
+            if len(user_input.strip()) == 0:
+                continue
+
+        if jsonl:
+            await stream_reply_jsonl(agent, llm, diary_file_path, plan_file_path, user_input, thread_id)
+        else:
+            await stream_reply(agent, llm, diary_file_path, plan_file_path, user_input, in_shell, thread_id)
+        if sessions is not None:
+            sessions.touch(thread_id, user_input)
+
+        if not interactive:
+            if not jsonl:
+                print("\033[0m\n")
+            break
@@ -0,0 +1,172 @@
+"""batch 命令: 在多个工作区中执行同一组问题.
+
+    python aid.py batch --prompts prompts.txt --workspaces ws1 ws2 ... [--workers N] [--model-concurrency N] [--results DIR]
+
+主进程只导入一次 langchain 与工具模块, 之后为每个工作区 fork 一个工作进程(同时最多 workers 个).
+工作进程切换到工作区目录, 只加载该工作区的 aid_config.json 与 .env, 缓存(.aid/cache)也在该工作区中;
+每个进程只处理一个工作区, 进程内的单例(cache_store, diary_store 等)不会在工作区之间共享.
+所有工作进程同时进行的模型请求数由一个跨进程的信号量限制, 包括工具与历史压缩中的模型请求(见 model_limit.py).
+
+每个问题的结果以 JSON Lines 事件(见 jsonl_output.py)写入 <工作区>/.aid/batch/<时间>.jsonl,
+指定 --results 时写入 <DIR>/<工作区名>-<路径哈希>.jsonl(不同目录下的同名工作区不会互相覆盖).
+"""
+import os
+import time
+import hashlib
+import asyncio
+import datetime
+import multiprocessing
+from dotenv import load_dotenv, dotenv_values
+from langchain.agents.middleware import AgentMiddleware
+from utils import logger
+from model_limit import amodel_slot
+
+# 所有工作区同时进行的模型请求数上限
+DEFAULT_MODEL_CONCURRENCY = 4
+# 工作区中保存结果的目录
+RESULTS_DIR = os.path.join(".aid", "batch")
+
+
+class ModelConcurrencyMiddleware(AgentMiddleware):
+    """用跨进程的信号量限制 agent 的模型请求并发数. 工具内部的模型调用通过 AidContext.model_semaphore 获取同一个信号量."""
+
+    def __init__(self, semaphore):
+        super().__init__()
+        self.semaphore = semaphore
+
+    async def awrap_model_call(self, request, handler):
+        async with amodel_slot(self.semaphore):
+            return await handler(request)
+
+
+def read_prompts(path: str) -> list[str]:
+    """问题文件: 每行一个问题, 忽略空行与 # 开头的行."""
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+
+def result_file_name(workspace: str) -> str:
+    """--results 目录中的结果文件名: 工作区名加上绝对路径的哈希, 如 a/diary 与 b/diary 不会互相覆盖."""
+    path = os.path.abspath(workspace)
+    return f"{os.path.basename(path)}-{hashlib.sha1(path.encode('utf-8')).hexdigest()[:8]}.jsonl"
+
+
+# 工作进程的全局状态, 由 _init_worker 设置
+_semaphore = None
+_init_workspace = None
+_base_environ = None
+
+
+def _init_worker(semaphore, init_workspace, base_environ):
+    global _semaphore, _init_workspace, _base_environ
+    _semaphore = semaphore
+    _init_workspace = init_workspace
+    _base_environ = base_environ
+
+
+async def _run_prompts(workspace: str, prompts: list[str], result_path: str, llm_cache: bool) -> dict:
+    import tools
+    from aid_agent import build_agent, lst_tools, stream_reply_jsonl
+
+    # 只使用本工作区的 .env: 从加载 .env 之前的环境变量开始(tools 在导入时读取了主进程的 .env)
+    os.environ.clear()
+    os.environ.update(_base_environ)
+    load_dotenv(".env")
+    tools.env_vars = dotenv_values(".env")
+
+    config, diary_file_path, plan_file_path, llm, middleware = _init_workspace(llm_cache)
+    agent = build_agent(llm, lst_tools, [*middleware, ModelConcurrencyMiddleware(_semaphore)])
+
+    failed = 0
+    tokens = 0
+    os.makedirs(os.path.dirname(result_path), exist_ok=True)
+    with open(result_path, "w", encoding="utf-8") as f:
+        for i, prompt in enumerate(prompts, 1):
+            # 每个问题是独立的对话
+            try:
+                writer = await stream_reply_jsonl(agent, llm, diary_file_path, plan_file_path, prompt,
+                                                  f"batch-{i}", f, model_semaphore=_semaphore)
+                tokens += writer.usage["total_tokens"]
+            except Exception as e:
+                failed += 1
+                logger.error(f"##### batch: {workspace}: prompt {i} failed: {e}")
+    return {"failed": failed, "tokens": tokens}
+
+
+def _run_workspace(task: tuple) -> dict:
+    """在工作进程中处理一个工作区."""
+    workspace, prompts, result_path, llm_cache = task
+    start = time.perf_counter()
+    result = {"workspace": workspace, "results": result_path, "prompts": len(prompts), "failed": len(prompts),
+              "tokens": 0, "error": None}
+    try:
+        os.chdir(workspace)
+        result.update(asyncio.run(_run_prompts(workspace, prompts, result_path, llm_cache)))
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        # 工作进程退出时不执行 atexit, 这里发送完通知邮件并保存缓存统计
+        from mail_sender import close_notification_sender
+        from cache_store import cache_store
+        close_notification_sender()
+        cache_store.close()
+    result["elapsed"] = time.perf_counter() - start
+    return result
+
+
+def run_batch(prompts_path: str, workspaces: list[str], init_workspace, base_environ: dict,
+              workers: int | None = None, model_concurrency: int | None = None,
+              results_dir: str | None = None, llm_cache: bool = False) -> int:
+    """在各工作区中执行问题文件中的问题. 全部成功返回 0, 否则返回 1.
+
+    init_workspace 为 aid.init_workspace, 在工作进程中(工作区目录下)加载配置并初始化模型与中间件;
+    base_environ 为加载 .env 之前的环境变量.
+    """
+    prompts = read_prompts(prompts_path)
+    if not prompts:
+        logger.error(f"没有要执行的问题: {prompts_path}")
+        return 1
+
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    tasks = []
+    ok = True
+    for workspace in dict.fromkeys(os.path.abspath(w) for w in workspaces):
+        if not os.path.isdir(workspace):
+            logger.error(f"工作区不存在: {workspace}")
+            ok = False
+            continue
+        if results_dir:
+            result_path = os.path.join(os.path.abspath(results_dir), result_file_name(workspace))
+        else:
+            result_path = os.path.join(workspace, RESULTS_DIR, f"{stamp}.jsonl")
+        tasks.append((workspace, prompts, result_path, llm_cache))
+    if not tasks:
+        return 1
+
+    # 在主进程中导入一次, fork 出的工作进程直接继承
+    import aid_agent  # noqa: F401
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(tasks)))
+    model_concurrency = max(1, model_concurrency or DEFAULT_MODEL_CONCURRENCY)
+    # fork 可以继承已导入的模块; 不支持 fork 的平台上工作进程会重新导入
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    semaphore = context.BoundedSemaphore(model_concurrency)
+    logger.info(f"batch: {len(prompts)} prompts x {len(tasks)} workspaces, {workers} workers, "
+                f"{model_concurrency} concurrent model requests")
+
+    start = time.perf_counter()
+    with context.Pool(workers, initializer=_init_worker, initargs=(semaphore, init_workspace, base_environ),
+                      maxtasksperchild=1) as pool:
+        for result in pool.imap_unordered(_run_workspace, tasks):
+            if result["error"]:
+                ok = False
+                print(f"{result['workspace']}: error: {result['error']}", flush=True)
+                continue
+            if result["failed"]:
+                ok = False
+            done = result["prompts"] - result["failed"]
+            print(f"{result['workspace']}: {done}/{result['prompts']} ok, {result['elapsed']:.1f}s, "
+                  f"{result['tokens']} tokens -> {result['results']}", flush=True)
+    logger.info(f"batch: done in {time.perf_counter() - start:.1f}s")
+    return 0 if ok else 1
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+"""Checkpoint 体积基准: 用 aid_agent.build_agent 构建真实的 agent(CustomState, 中间件与工具),
+模型为固定输出的假模型(不访问网络), 每轮调用一次 get_day_diary 读取不同日期的日记.
+
+日记只以句柄(diary_file_path)保存在 state 中, 所以 checkpoint 的体积只随对话(messages 与
+工具调用任务)增长, 与日记文件的大小无关. 分别用 30 天与 3 年的日记运行同样的轮数,
+比较 InMemorySaver 中累计保存的字节数; 大日记多出 10% 以上时以非 0 退出.
+
+    python benchmarks/bench_checkpoint.py [turns]
+"""
+import os, sys, tempfile
+import asyncio
+import datetime
+from typing import Any
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langgraph.checkpoint.memory import InMemorySaver
+from aid_agent import AidContext, build_agent
+import tools
+
+DEFAULT_TURNS = 100
+
+
+class DiaryReadingFakeModel(BaseChatModel):
+    """收到用户消息时请求 get_day_diary(按轮次换日期), 收到工具结果后回复一句话."""
+
+    dates: list[str]
+    turn: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "diary-reading-fake"
+
+    def bind_tools(self, tools, **kwargs: Any):
+        return self
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        if messages[-1].type == "tool":
+            message = AIMessage("完成.")
+        else:
+            date = self.dates[self.turn % len(self.dates)]
+            self.turn += 1
+            message = AIMessage("", tool_calls=[{"name": "get_day_diary", "args": {"date": date},
+                                                 "id": f"call_{self.turn}"}])
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def make_diary(path: str, days: int) -> list[str]:
+    """生成 days 天的示例日记, 返回日期列表."""
+    dates = []
+    day = datetime.date(2024, 1, 1)
+    with open(path, "w", encoding="utf-8") as f:
+        for _ in range(days):
+            dates.append(day.isoformat())
+            f.write(f"- {day.isoformat()} 周{'一二三四五六日'[day.weekday()]}：\n")
+            f.write("    - 健康：跑步：+2. 早睡：+1. \n")
+            f.write("    - 工作：(8.0h) 完成后端API重构，修复了3个性能问题。\n")
+            f.write("    - 学习：阅读《深入理解计算机系统》第3章：程序的机器级表示。\n")
+            f.write("    - 总结：周一开工状态不错，代码重构进展顺利，晚上回家感觉有点疲惫。\n")
+            day += datetime.timedelta(days=1)
+    return dates
+
+
+def saved_bytes(saver: InMemorySaver) -> dict[str, int]:
+    """InMemorySaver 中各通道累计保存的字节数."""
+    sizes = {}
+    for key, value in saver.blobs.items():
+        sizes[key[2]] = sizes.get(key[2], 0) + len(value[1])
+    return sizes
+
+
+async def run(diary_file: str, dates: list[str], turns: int) -> dict[str, int]:
+    llm = DiaryReadingFakeModel(dates=dates)
+    saver = InMemorySaver()
+    agent = build_agent(llm, [tools.get_day_diary], checkpointer=saver)
+    config = {"configurable": {"thread_id": "bench"}}
+    for n in range(turns):
+        await agent.ainvoke({"messages": [{"role": "user", "content": f"第{n + 1}轮: 读一下日记"}],
+                             "diary_file_path": diary_file, "plan_file_path": ""},
+                            config, context=AidContext(llm=llm))
+    return saved_bytes(saver)
+
+
+def main():
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_TURNS
+    totals = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for days in (30, 3 * 365):
+            diary_file = os.path.join(tmp, f"diary-{days}.md")
+            dates = make_diary(diary_file, days)
+            sizes = asyncio.run(run(diary_file, dates, turns))
+            total = sum(sizes.values())
+            totals.append(total)
+            channels = ", ".join(f"{name} {size}" for name, size in sorted(sizes.items(), key=lambda i: -i[1]) if size)
+            print(f"diary {os.path.getsize(diary_file):>8} B, {turns} turns: checkpoints {total:>9} B "
+                  f"({total // turns} B/turn; {channels})")
+    ratio = totals[1] / totals[0] - 1
+    print(f"large vs small diary: {ratio:+.1%}")
+    sys.exit(0 if ratio <= 0.1 else 1)
+
+
+if __name__ == "__main__":
+    main()
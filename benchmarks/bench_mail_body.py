@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""邮件正文提取基准: 对比旧方式(整封邮件拼接后 email.message_from_bytes 解析, 再逐个编码试解码)
+与 mail_utils.extract_text_body 的流式提取.
+
+生成带图片附件的多 MB 邮件, 邮件内容按行逐行产出(模拟从 POP3 连接逐行读取),
+统计两种方式的耗时与内存峰值(tracemalloc).
+
+    python benchmarks/bench_mail_body.py [附件MB ...]
+"""
+import os, sys, io
+import time
+import email
+import tracemalloc
+from email.message import EmailMessage
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mail_utils import extract_text_body
+
+DIARY_TEXT = "- 2026-01-20 周二：\n    - 健康：跑步：+2. 早睡：+1.\n    - 工作：(8.0h) 完成后端API重构.\n"
+
+
+def make_message(attachment_mb: float) -> bytes:
+    msg = EmailMessage()
+    msg["From"] = "Peer <peer@example.com>"
+    msg["To"] = "me@example.com"
+    msg["Subject"] = "日记"
+    msg["Message-ID"] = "<bench@example.com>"
+    msg.set_content(DIARY_TEXT, charset="gbk")
+    msg.add_alternative(f"<pre>{DIARY_TEXT}</pre>", subtype="html")
+    for n in range(2):
+        msg.add_attachment(os.urandom(int(attachment_mb * 1024 * 1024 / 2)), maintype="image", subtype="jpeg", filename=f"photo{n}.jpg")
+    return msg.as_bytes()
+
+
+def iter_lines(raw: bytes):
+    """像 poplib 那样逐行产出(不含换行符)."""
+    for line in io.BytesIO(raw):
+        yield line.rstrip(b"\r\n")
+
+
+def legacy_body(lines) -> str:
+    msg = email.message_from_bytes(b"\n".join(list(lines)))
+    for part in (msg.walk() if msg.is_multipart() else [msg]):
+        if part.get_content_type() == "text/plain" and "attachment" not in str(part.get("Content-Disposition")):
+            payload = part.get_payload(decode=True)
+            for encoding in ['utf-8', 'gbk', 'gb2312', 'latin-1']:
+                try:
+                    return payload.decode(encoding)
+                except UnicodeDecodeError:
+                    continue
+    return ""
+
+
+def streaming_body(lines) -> str:
+    lines = iter(lines)
+    _, body = extract_text_body(lines)
+    for _ in lines:  # 与 email_receive_diary_pop 一样读完剩余内容
+        pass
+    return body
+
+
+def measure(func, raw: bytes) -> tuple[float, float, str]:
+    tracemalloc.start()
+    start = time.perf_counter()
+    body = func(iter_lines(raw))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1024 / 1024, body
+
+
+def main():
+    sizes = [float(arg) for arg in sys.argv[1:]] or [1, 5, 20]
+    print(f"{'附件(MB)':>8} {'邮件(MB)':>8} | {'旧方式 ms':>10} {'峰值 MB':>8} | {'流式 ms':>8} {'峰值 MB':>8}")
+    for size in sizes:
+        raw = make_message(size)
+        legacy_ms, legacy_peak, legacy = measure(legacy_body, raw)
+        stream_ms, stream_peak, body = measure(streaming_body, raw)
+        assert body.strip() == legacy.strip() == DIARY_TEXT.strip(), (body, legacy)
+        print(f"{size:>8.1f} {len(raw) / 1024 / 1024:>8.1f} | {legacy_ms * 1000:>10.1f} {legacy_peak:>8.1f} | "
+              f"{stream_ms * 1000:>8.1f} {stream_peak:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""--shell 渲染基准: 把一份较长的 Markdown 回复切成 1~6 字的小块(模拟模型流式输出)送入渲染器,
+统计每秒渲染的字节数与 write 调用次数, 并与逐字符写出并 flush(改动前的输出方式)对比.
+
+输出写到 /dev/null(每次 flush 即一次 write 系统调用), 不访问终端. 逐字符写出不做 Markdown 处理,
+只作为系统调用开销的参照.
+
+    python benchmarks/bench_shell_render.py [重复次数, 默认 200]
+"""
+import os, sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shell_markdown import ShellMarkdownRenderer
+
+SECTION = """## 1月第{n}周总结
+
+本周**运动**共 _5_ 次, 平均每次 `45` 分钟, 比上周多 **2 次**.
+
+- 阅读: 完成 *原则* 第 3~5 章
+- 早睡: 7 天中 **4 天** 在 23:00 前入睡
+1. 下周继续保持运动
+2. 减少睡前使用手机
+
+| 日期 | 分数 | 备注 |
+|---|---|---|
+| 2026-01-0{n} | 8 | 状态不错 |
+| 2026-01-1{n} | **10** | 全部完成 |
+
+> 坚持比强度更重要.
+
+```
+score = sum(day_scores) / len(day_scores)
+```
+
+"""
+DEFAULT_REPEAT = 200
+
+
+class CountingStream:
+    """写到 /dev/null, 统计 write 次数与字节数."""
+
+    def __init__(self):
+        self.file = open(os.devnull, "w", encoding="utf-8")
+        self.writes = 0
+        self.bytes = 0
+
+    def write(self, s):
+        self.writes += 1
+        self.bytes += len(s.encode("utf-8"))
+        return self.file.write(s)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def chunks(text: str, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    result = []
+    i = 0
+    while i < len(text):
+        n = rng.randint(1, 6)
+        result.append(text[i:i + n])
+        i += n
+    return result
+
+
+def render_per_char(parts: list[str], stream) -> None:
+    """改动前的方式: 每个字符(与转义码)单独写出并 flush."""
+    for part in parts:
+        for c in part:
+            stream.write(c)
+            stream.flush()
+
+
+def render_buffered(parts: list[str], stream) -> None:
+    renderer = ShellMarkdownRenderer(stream)
+    for part in parts:
+        renderer.feed(part)
+    renderer.close()
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_REPEAT
+    text = "".join(SECTION.format(n=n % 9 + 1) for n in range(repeat))
+    parts = chunks(text)
+    size = len(text.encode("utf-8"))
+    print(f"{size / 1024:.0f} KiB markdown in {len(parts)} chunks")
+    for name, render in (("per-char", render_per_char), ("buffered", render_buffered)):
+        stream = CountingStream()
+        start = time.perf_counter()
+        render(parts, stream)
+        elapsed = time.perf_counter() - start
+        stream.close()
+        print(f"{name:>9}: {elapsed * 1000:.1f}ms, {size / elapsed / 1024 / 1024:.1f} MiB/s, "
+              f"{stream.writes} writes, {stream.bytes / 1024:.0f} KiB out")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""启动耗时基准: 用 python -X importtime 运行 aid.py 的轻量命令(-V, --help, init),
+统计模块导入的总耗时, 并检查是否导入了不该导入的重模块(langchain, 模型后端, 邮件库等).
+
+超出预算或导入了禁止的模块时以非 0 退出, 可用于 CI 检查.
+
+    python benchmarks/bench_startup.py [导入耗时预算(毫秒), 默认 150]
+"""
+import os, sys
+import time
+import tempfile
+import subprocess
+
+AID = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "aid.py")
+
+COMMANDS = [["-V"], ["--help"], ["init"]]
+# 这些命令不应导入的模块(前缀匹配)
+FORBIDDEN = ("langchain", "langgraph", "openai", "ollama", "tools", "aid_agent",
+             "imaplib", "poplib", "smtplib", "asyncio")
+DEFAULT_BUDGET_MS = 150
+
+
+def import_times(stderr: str) -> list[tuple[str, int, int, int]]:
+    """解析 -X importtime 的输出, 返回 [(模块名, 自身耗时us, 累计耗时us, 层级), ...], 层级 0 为顶层模块."""
+    result = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        # 缩进表示被哪个模块导入, 顶层模块的累计耗时之和即总导入耗时
+        depth = (len(name) - len(name.lstrip())) // 2
+        result.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return result
+
+
+def run(args: list[str], cwd: str) -> tuple[float, list]:
+    """运行 aid.py, 返回 (耗时, 导入记录). aid.py 异常退出时抛出 RuntimeError, 附带其错误输出."""
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", AID, *args], cwd=cwd,
+                          capture_output=True, text=True, stdin=subprocess.DEVNULL)
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        errors = "\n".join(line for line in proc.stderr.splitlines() if not line.startswith("import time:"))
+        raise RuntimeError(f"aid.py {' '.join(args)} exited with {proc.returncode}:\n{errors}")
+    return elapsed, import_times(proc.stderr)
+
+
+def main():
+    budget_ms = float(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_BUDGET_MS
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        for args in COMMANDS:
+            try:
+                elapsed, modules = run(args, tmp)
+            except RuntimeError as e:
+                print(f"{' '.join(args):>8}: FAIL {e}")
+                ok = False
+                continue
+            top = [m for m in modules if m[3] == 0]
+            total_ms = sum(m[2] for m in top) / 1000
+            forbidden = sorted({m[0] for m in modules if m[0].split(".")[0].startswith(FORBIDDEN)})
+            slowest = ", ".join(f"{m[0]} {m[2] / 1000:.1f}ms" for m in sorted(top, key=lambda m: -m[2])[:5])
+            status = "ok"
+            if total_ms > budget_ms or forbidden:
+                status = "FAIL"
+                ok = False
+            name = " ".join(args)
+            print(f"{name:>8}: {status} wall {elapsed * 1000:.0f}ms, imports {total_ms:.1f}ms / {budget_ms:.0f}ms "
+                  f"({len(modules)} modules); slowest: {slowest}")
+            if forbidden:
+                print(f"{'':>8}  forbidden imports: {', '.join(forbidden)}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
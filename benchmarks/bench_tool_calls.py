@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+"""并发工具调用基准: 模型在一条消息中同时请求 get_plan, get_month_diary 与 get_current_date_time,
+对比工具线程池宽度为 1(逐个执行)与默认宽度(并发执行)时一轮对话的耗时.
+
+模型为固定输出的假模型(不访问网络), 工具用 sleep 模拟耗时: get_plan 模拟缓存未命中时的 llm 提取,
+get_month_diary 模拟读取与解析日记. 并发时一轮的耗时应接近最慢的工具, 而不是各工具耗时之和.
+
+    python benchmarks/bench_tool_calls.py [get_plan秒数] [get_month_diary秒数]
+"""
+import os, sys
+import time
+import asyncio
+from typing import Any
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain.agents import create_agent
+from langchain.tools import tool
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from tool_executor import ToolExecutionMiddleware, DEFAULT_TOOL_WORKERS
+
+PLAN_SECONDS = 1.0
+DIARY_SECONDS = 0.5
+
+
+class ToolCallingFakeModel(BaseChatModel):
+    """第一步同时请求三个工具, 收到工具结果后回复一句话."""
+
+    @property
+    def _llm_type(self) -> str:
+        return "tool-calling-fake"
+
+    def bind_tools(self, tools, **kwargs: Any):
+        return self
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        if messages[-1].type == "tool":
+            message = AIMessage("完成.")
+        else:
+            message = AIMessage("", tool_calls=[
+                {"name": "get_plan", "args": {"date": "2026-01"}, "id": "call_plan"},
+                {"name": "get_month_diary", "args": {"date": "2026-01"}, "id": "call_diary"},
+                {"name": "get_current_date_time", "args": {}, "id": "call_time"},
+            ])
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+@tool
+async def get_plan(date: str) -> str:
+    """获取指定时段的计划."""
+    await asyncio.to_thread(time.sleep, PLAN_SECONDS)
+    return f"{date} 计划"
+
+
+@tool
+async def get_month_diary(date: str) -> str:
+    """Read the diary for a specific month."""
+    await asyncio.to_thread(time.sleep, DIARY_SECONDS)
+    return f"{date} 日记"
+
+
+@tool
+def get_current_date_time() -> str:
+    """Get the current date and time."""
+    return "2026-01-31 21:00:00"
+
+
+async def run_turn(workers: int) -> tuple[float, list]:
+    middleware = ToolExecutionMiddleware(max_workers=workers)
+    agent = create_agent(model=ToolCallingFakeModel(), tools=[get_plan, get_month_diary, get_current_date_time],
+                         middleware=[middleware])
+    start = time.perf_counter()
+    await agent.ainvoke({"messages": [{"role": "user", "content": "总结1月份的执行情况"}]})
+    return time.perf_counter() - start, middleware.timings
+
+
+def main():
+    global PLAN_SECONDS, DIARY_SECONDS
+    if len(sys.argv) > 1:
+        PLAN_SECONDS = float(sys.argv[1])
+    if len(sys.argv) > 2:
+        DIARY_SECONDS = float(sys.argv[2])
+    print(f"get_plan {PLAN_SECONDS}s, get_month_diary {DIARY_SECONDS}s, get_current_date_time ~0s")
+
+    for workers in (1, DEFAULT_TOOL_WORKERS):
+        # 每次使用新的事件循环, 默认线程池随之替换
+        elapsed, timings = asyncio.run(run_turn(workers))
+        tools = ", ".join(f"{name} {seconds:.2f}s" for name, _, seconds, _ in sorted(timings))
+        # 各工具的耗时包含等待线程池的时间
+        print(f"workers={workers}: turn {elapsed:.2f}s ({tools})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import os
+import json
+import time
+import atexit
+import sqlite3
+import threading
+from utils import logger
+
+CACHE_DIR = os.path.join(".", ".aid", "cache")
+CACHE_DB_NAME = "cache.db"
+
+# 默认上限: 超过后按最近访问时间(LRU)淘汰
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_ENTRIES = 20000
+# 每写入多少次检查一次是否需要淘汰
+EVICT_INTERVAL = 64
+# 访问时间的更新粒度(秒), 避免每次命中都写数据库
+TOUCH_INTERVAL = 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace   TEXT NOT NULL,
+    key         TEXT NOT NULL,
+    value       TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    expires_at  REAL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at);
+CREATE TABLE IF NOT EXISTS stats (
+    namespace TEXT PRIMARY KEY,
+    hits      INTEGER NOT NULL DEFAULT 0,
+    misses    INTEGER NOT NULL DEFAULT 0,
+    evictions INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+class CacheStore:
+    """.aid/cache 下统一的缓存: SQLite(WAL 模式)中的命名空间键值对, 值为 json.
+
+    多个 aid 进程(定时任务与交互会话)可同时读写, 由 SQLite 的文件锁保证一致;
+    支持按条目设置过期时间(ttl), 总大小或条目数超限时按最近访问时间淘汰.
+    命中/未命中次数在进程退出时累加到数据库中, 可通过 "aid.py cache" 查看.
+    数据库在第一次使用时才打开, 路径相对于当时的工作目录.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.db_path = os.path.join(cache_dir, CACHE_DB_NAME)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = None
+        self._writes = 0
+        # 本进程中尚未写入数据库的计数: {namespace: [hits, misses, evictions]}
+        self._counters: dict[str, list[int]] = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _count(self, namespace: str, field: int, n: int = 1) -> None:
+        self._counters.setdefault(namespace, [0, 0, 0])[field] += n
+
+    def get(self, namespace: str, key: str, default=None):
+        """获取缓存值, 不存在或已过期则返回 default."""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value, expires_at, accessed_at FROM entries WHERE namespace = ? AND key = ?",
+                (namespace, key)).fetchone()
+            if row is None or (row[1] is not None and row[1] <= now):
+                self._count(namespace, 1)
+                return default
+            if now - row[2] > TOUCH_INTERVAL:
+                conn.execute("UPDATE entries SET accessed_at = ? WHERE namespace = ? AND key = ?", (now, namespace, key))
+            self._count(namespace, 0)
+        try:
+            return json.loads(row[0])
+        except json.JSONDecodeError:
+            logger.error(f"##### Failed to decode cache entry: {namespace}/{key}")
+            return default
+
+    def set(self, namespace: str, key: str, value, ttl: float | None = None) -> None:
+        """写入缓存值(需可 json 序列化). ttl 为过期秒数, None 表示不过期."""
+        data = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (namespace, key, data, len(data), expires_at, now))
+            self._writes += 1
+            if self._writes % EVICT_INTERVAL == 0:
+                self._evict(conn, now)
+
+    def items(self, namespace: str) -> list[tuple[str, object]]:
+        """获取命名空间中所有未过期的 (key, value), 按 key 排序. 不计入命中统计."""
+        now = time.time()
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT key, value FROM entries WHERE namespace = ? AND (expires_at IS NULL OR expires_at > ?) ORDER BY key",
+                (namespace, now)).fetchall()
+        result = []
+        for key, value in rows:
+            try:
+                result.append((key, json.loads(value)))
+            except json.JSONDecodeError:
+                logger.error(f"##### Failed to decode cache entry: {namespace}/{key}")
+        return result
+
+    def delete(self, namespace: str, key: str) -> None:
+        with self._lock:
+            self._connect().execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def clear(self, namespace: str | None = None) -> None:
+        """清空指定命名空间, namespace 为 None 时清空全部缓存."""
+        with self._lock:
+            conn = self._connect()
+            if namespace is None:
+                conn.execute("DELETE FROM entries")
+            else:
+                conn.execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        """删除过期条目, 再按最近访问时间淘汰到上限以内."""
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for namespace, n in conn.execute(
+                    "SELECT namespace, COUNT(*) FROM entries WHERE expires_at IS NOT NULL AND expires_at <= ? GROUP BY namespace",
+                    (now,)).fetchall():
+                self._count(namespace, 2, n)
+            conn.execute("DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+
+            count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+            if count > self.max_entries or total > self.max_bytes:
+                victims = []
+                for namespace, key, size in conn.execute("SELECT namespace, key, size FROM entries ORDER BY accessed_at"):
+                    if count <= self.max_entries and total <= self.max_bytes:
+                        break
+                    victims.append((namespace, key))
+                    count -= 1
+                    total -= size
+                conn.executemany("DELETE FROM entries WHERE namespace = ? AND key = ?", victims)
+                for namespace, _ in victims:
+                    self._count(namespace, 2)
+                logger.debug(f"##### cache evicted {len(victims)} entries")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def flush_stats(self) -> None:
+        """把本进程的命中/未命中/淘汰计数累加到数据库中."""
+        with self._lock:
+            if self._conn is None or not self._counters:
+                return
+            counters, self._counters = self._counters, {}
+            try:
+                self._conn.executemany(
+                    "INSERT INTO stats (namespace, hits, misses, evictions) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(namespace) DO UPDATE SET hits = hits + excluded.hits, "
+                    "misses = misses + excluded.misses, evictions = evictions + excluded.evictions",
+                    [(namespace, *c) for namespace, c in counters.items()])
+            except sqlite3.Error as e:
+                logger.error(f"##### Failed to save cache stats: {e}")
+
+    def stats(self) -> dict[str, dict]:
+        """各命名空间的条目数, 大小与累计的命中/未命中/淘汰次数."""
+        self.flush_stats()
+        with self._lock:
+            conn = self._connect()
+            result = {}
+            for namespace, count, size in conn.execute("SELECT namespace, COUNT(*), SUM(size) FROM entries GROUP BY namespace"):
+                result[namespace] = {"entries": count, "bytes": size, "hits": 0, "misses": 0, "evictions": 0}
+            for namespace, hits, misses, evictions in conn.execute("SELECT namespace, hits, misses, evictions FROM stats"):
+                result.setdefault(namespace, {"entries": 0, "bytes": 0})
+                result[namespace].update(hits=hits, misses=misses, evictions=evictions)
+            return result
+
+    def close(self) -> None:
+        self.flush_stats()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# 进程内共享的缓存实例
+cache_store = CacheStore()
+atexit.register(cache_store.close)
@@ -0,0 +1,234 @@
+import os
+import re
+import hashlib
+from bisect import bisect_left, bisect_right
+from utils import logger
+from cache_store import cache_store
+
+# 日期行: "- 2026-01-19 周一：" (允许前导空白)
+DATE_LINE_PATTERN = re.compile(rb'^\s*-\s*(\d{4}-\d{2}-\d{2})')
+# 分段行: 标题 "## ..." 或 "第NN周:" 会结束上一天的日记
+BREAK_LINE_PATTERN = re.compile('^(?:#|第\\d+周)'.encode("utf-8"))
+
+INDEX_VERSION = 2
+
+
+class DiaryIndex:
+    """日记文件索引: 日期 → (起始字节, 结束字节, 起始行, 结束行).
+
+    日期按字典序排序保存(YYYY-MM-DD 的字典序即时间序), 区间查询使用 bisect.
+    tail_start 为文件中最后一条日记的起始字节, prefix_digest 为其之前内容的哈希,
+    用于文件追加或只修改末尾时增量更新索引(见 update_diary_index).
+    """
+
+    def __init__(self, path: str, size: int, mtime_ns: int, digest: str, entries: list,
+                 tail_start: int = 0, prefix_digest: str = ""):
+        self.path = path
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.digest = digest
+        self.tail_start = tail_start
+        self.prefix_digest = prefix_digest
+        # entries: [(date, byte_start, byte_end, line_start, line_end), ...] 按日期排序
+        self.entries = sorted(entries, key=lambda e: e[0])
+        self.dates = [e[0] for e in self.entries]
+        self.positions = {}
+        for i, date in enumerate(self.dates):
+            # 同一日期出现多次时, 取文件中最先出现的一条
+            if date not in self.positions or self.entries[i][1] < self.entries[self.positions[date]][1]:
+                self.positions[date] = i
+
+    def lookup(self, date: str) -> tuple | None:
+        """查找指定日期(YYYY-MM-DD)的条目, 不存在则返回 None."""
+        i = self.positions.get(date)
+        return self.entries[i] if i is not None else None
+
+    def range(self, start: str, end: str) -> list[tuple]:
+        """查找日期在 [start, end] 闭区间内的条目, 按日期排序."""
+        lo = bisect_left(self.dates, start)
+        hi = bisect_right(self.dates, end)
+        return self.entries[lo:hi]
+
+    def prefix(self, prefix: str) -> list[tuple]:
+        """查找日期以 prefix 开头的条目, 如 "2026-01" 或 "2026"."""
+        lo = bisect_left(self.dates, prefix)
+        hi = bisect_left(self.dates, prefix + "\uffff")
+        return self.entries[lo:hi]
+
+    def matches_stat(self, st: os.stat_result) -> bool:
+        return st.st_size == self.size and st.st_mtime_ns == self.mtime_ns
+
+    def to_json(self) -> dict:
+        return {
+            "version": INDEX_VERSION,
+            "path": self.path,
+            "size": self.size,
+            "mtime_ns": self.mtime_ns,
+            "sha1": self.digest,
+            "tail_start": self.tail_start,
+            "prefix_sha1": self.prefix_digest,
+            "entries": self.entries,
+        }
+
+    @classmethod
+    def from_json(cls, data: dict) -> "DiaryIndex":
+        return cls(data["path"], data["size"], data["mtime_ns"], data["sha1"],
+                   [tuple(e) for e in data["entries"]], data["tail_start"], data["prefix_sha1"])
+
+
+def _scan(f, sha1, offset: int, line_no: int, entries: list) -> tuple[int, object]:
+    """从 offset 处扫描日记行, 把日期条目追加到 entries.
+
+    Returns:
+        (最后一条日记的起始字节, 该位置之前内容的哈希对象)
+    """
+    current = None  # [date, byte_start, line_start]
+    tail_start, prefix_sha1 = offset, sha1.copy()
+    for line in f:
+        m = DATE_LINE_PATTERN.match(line)
+        if m or BREAK_LINE_PATTERN.match(line):
+            if current is not None:
+                entries.append((current[0], current[1], offset, current[2], line_no))
+                current = None
+            if m:
+                current = [m.group(1).decode("ascii"), offset, line_no]
+                tail_start, prefix_sha1 = offset, sha1.copy()
+        sha1.update(line)
+        offset += len(line)
+        line_no += 1
+
+    if current is not None:
+        entries.append((current[0], current[1], offset, current[2], line_no))
+    return tail_start, prefix_sha1
+
+
+def build_diary_index(diary_file: str) -> DiaryIndex:
+    """单遍扫描日记文件, 同时计算内容哈希并建立日期索引.
+
+    Args:
+        diary_file: The path to the diary file.
+
+    Returns:
+        The built DiaryIndex.
+    """
+    path = os.path.abspath(os.path.expanduser(diary_file))
+    sha1 = hashlib.sha1()
+    entries = []
+
+    with open(path, "rb") as f:
+        st = os.fstat(f.fileno())
+        tail_start, prefix_sha1 = _scan(f, sha1, 0, 0, entries)
+
+    logger.debug(f"##### build_diary_index: {len(entries)} entries.")
+    return DiaryIndex(path, st.st_size, st.st_mtime_ns, sha1.hexdigest(), entries,
+                      tail_start, prefix_sha1.hexdigest())
+
+
+def update_diary_index(index: DiaryIndex) -> DiaryIndex:
+    """增量更新索引: 最后一条日记之前的内容未变时, 只重新解析之后的部分.
+
+    日记通常只在末尾追加或修改当天的内容, 此时不必重新解析整个文件.
+    否则(前面的内容有改动)退化为 build_diary_index.
+
+    Args:
+        index: The previous DiaryIndex of the diary file.
+
+    Returns:
+        The updated DiaryIndex.
+    """
+    path = index.path
+    with open(path, "rb") as f:
+        st = os.fstat(f.fileno())
+        if st.st_size >= index.tail_start:
+            # 只哈希前缀, 不做逐行匹配
+            sha1 = hashlib.sha1()
+            remaining = index.tail_start
+            while remaining > 0:
+                chunk = f.read(min(remaining, 1 << 20))
+                if not chunk:
+                    break
+                sha1.update(chunk)
+                remaining -= len(chunk)
+
+            if remaining == 0 and sha1.hexdigest() == index.prefix_digest:
+                entries = [e for e in index.entries if e[1] < index.tail_start]
+                # 最后一条日记的起始行号
+                tail = next((e for e in index.entries if e[1] == index.tail_start), None)
+                line_no = tail[3] if tail is not None else 0
+                tail_start, prefix_sha1 = _scan(f, sha1, index.tail_start, line_no, entries)
+                logger.debug(f"##### update_diary_index: reparsed {st.st_size - index.tail_start} bytes.")
+                return DiaryIndex(path, st.st_size, st.st_mtime_ns, sha1.hexdigest(), entries,
+                                  tail_start, prefix_sha1.hexdigest())
+
+    return build_diary_index(path)
+
+
+def _file_digest(path: str) -> str:
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def _load_cached_index(path: str) -> DiaryIndex | None:
+    data = cache_store.get("diary_index", path)
+    if data is None:
+        return None
+    try:
+        if data.get("version") != INDEX_VERSION or data.get("path") != path:
+            return None
+        return DiaryIndex.from_json(data)
+    except (AttributeError, KeyError, TypeError) as e:
+        logger.error(f"##### Failed to load diary index cache: {path}: {e}")
+        return None
+
+
+def _save_cached_index(index: DiaryIndex) -> None:
+    try:
+        cache_store.set("diary_index", index.path, index.to_json())
+    except Exception as e:
+        logger.error(f"##### Failed to save diary index cache: {e}")
+
+
+# 进程内索引缓存: {绝对路径: DiaryIndex}
+_indexes: dict[str, DiaryIndex] = {}
+
+
+def load_diary_index(diary_file: str) -> DiaryIndex:
+    """获取日记文件的索引.
+
+    依次使用进程内缓存、磁盘缓存(./.aid/cache/), 以文件大小+修改时间判断是否有效;
+    两者不一致时再比较内容哈希, 哈希也不一致才重建索引.
+
+    Args:
+        diary_file: The path to the diary file.
+
+    Returns:
+        The DiaryIndex of the diary file.
+    """
+    path = os.path.abspath(os.path.expanduser(diary_file))
+    st = os.stat(path)
+
+    index = _indexes.get(path)
+    if index is not None and index.matches_stat(st):
+        return index
+
+    if index is None:
+        index = _load_cached_index(path)
+        if index is not None and index.matches_stat(st):
+            _indexes[path] = index
+            return index
+
+    if index is not None and index.size == st.st_size and index.digest == _file_digest(path):
+        # 仅修改时间变化(如 touch), 内容未变
+        logger.debug(f"##### diary index still valid: {path}")
+        index.mtime_ns = st.st_mtime_ns
+    elif index is not None:
+        index = update_diary_index(index)
+    else:
+        index = build_diary_index(path)
+
+    _indexes[path] = index
+    _save_cached_index(index)
+    return index
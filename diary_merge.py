@@ -0,0 +1,249 @@
+import os
+import re
+import stat
+import hashlib
+import datetime
+import tempfile
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from utils import logger
+from cache_store import CACHE_DIR, cache_store
+from diary_store import DiarySnapshot, diary_store
+from mail_utils import SEEN_MESSAGE_TTL
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# 片段第一行可以指定日期: "2026-01-20", "- 2026-01-20 周二：" 等, 否则使用邮件的日期
+FRAGMENT_DATE_PATTERN = re.compile(r'^\s*-?\s*(\d{4}-\d{2}-\d{2})\s*(?:周[一二三四五六日天])?\s*[:：]?\s*')
+# 邮件签名分隔行(RFC 3676), 之后的内容不写入日记
+SIGNATURE_SEPARATOR = "-- "
+WEEKDAYS = "一二三四五六日"
+# 写入时日记文件被其他程序修改, 重新定位后再试的次数
+MAX_ATTEMPTS = 3
+LOCK_FILE_NAME = "diary_merge.lock"
+
+_lock = threading.Lock()
+
+
+def _mail_date(value: str | None) -> str:
+    """邮件日期(isoformat)对应的本地日期, 没有日期时为今天."""
+    if value:
+        try:
+            date = datetime.datetime.fromisoformat(value)
+            if date.tzinfo is not None:
+                date = date.astimezone()
+            return date.date().isoformat()
+        except ValueError:
+            logger.warn(f"##### Invalid email date: {value}")
+    return datetime.date.today().isoformat()
+
+
+def format_fragment(body: str, date: str) -> tuple[str, list[str]]:
+    """把邮件正文整理为日记条目下的列表项.
+
+    第一行是日期时, 以其为目标日期(不再写入该行), 否则使用 date. 各行保持相对缩进,
+    顶层的行缩进 4 个空格, 不是列表项的加上 "- ".
+
+    Args:
+        body: The body of the email.
+        date: The default target date, in the format YYYY-MM-DD.
+
+    Returns:
+        (target date, item lines)
+    """
+    lines = []
+    for line in body.splitlines():
+        if line == SIGNATURE_SEPARATOR:
+            break
+        if line.strip():
+            lines.append(line.rstrip())
+
+    if lines:
+        m = FRAGMENT_DATE_PATTERN.match(lines[0])
+        if m:
+            try:
+                date = datetime.date.fromisoformat(m.group(1)).isoformat()
+                rest = lines[0][m.end():]
+                lines = ([rest] if rest else []) + lines[1:]
+            except ValueError:
+                pass
+    if not lines:
+        return date, []
+
+    indent = min(len(line) - len(line.lstrip()) for line in lines)
+    items = []
+    for line in lines:
+        line = line[indent:]
+        if not line.startswith((" ", "\t", "-", "*")):
+            line = "- " + line
+        items.append("    " + line)
+    return date, items
+
+
+def _content_end(snapshot: DiarySnapshot, start: int, end: int) -> int:
+    """[start, end) 区间中最后一个非空白字符之后的位置(不含条目后的空行)."""
+    return start + len(snapshot.reader.read_bytes(start, end).rstrip())
+
+
+def _insertions(snapshot: DiarySnapshot, groups: dict[str, list[str]]) -> list[tuple[int, bytes]]:
+    """通过日记索引定位各日期的写入位置, 返回按位置排序的 [(字节位置, 插入内容), ...].
+
+    日期已存在时追加到该日条目的末尾; 不存在时在前一个日期的条目之后新建条目,
+    没有更早的日期时放在最早的条目之前.
+    """
+    index = snapshot.index
+    result = []
+    for date, items in groups.items():
+        text = "\n".join(items)
+        entry = index.lookup(date)
+        if entry is not None:
+            result.append((_content_end(snapshot, entry[1], entry[2]), date, "\n" + text))
+            continue
+
+        weekday = WEEKDAYS[datetime.date.fromisoformat(date).weekday()]
+        block = f"- {date} 周{weekday}：\n{text}"
+        i = bisect_left(index.dates, date)
+        if i > 0:
+            prev = index.entries[i - 1]
+            result.append((_content_end(snapshot, prev[1], prev[2]), date, "\n" + block))
+        elif index.entries:
+            result.append((index.entries[0][1], date, block + "\n"))
+        else:
+            end = _content_end(snapshot, 0, snapshot.reader.size)
+            result.append((end, date, ("\n" if end else "") + block))
+
+    # 同一位置的多个插入按日期排列
+    result.sort(key=lambda r: (r[0], r[1]))
+    return [(offset, text.encode("utf-8")) for offset, _, text in result]
+
+
+def _copy_range(src, dst, start: int, end: int) -> None:
+    """把 src 的 [start, end) 复制到 dst 当前位置, 优先由内核直接复制(copy_file_range)."""
+    remaining = end - start
+    if hasattr(os, "copy_file_range"):
+        try:
+            while remaining > 0:
+                n = os.copy_file_range(src.fileno(), dst.fileno(), remaining, start)
+                if n == 0:
+                    break
+                start += n
+                remaining -= n
+        except OSError:
+            pass  # 不支持时(如跨文件系统)改为普通读写
+    src.seek(start)
+    while remaining > 0:
+        chunk = src.read(min(remaining, 1 << 20))
+        if not chunk:
+            break
+        dst.write(chunk)
+        remaining -= len(chunk)
+
+
+def _apply(snapshot: DiarySnapshot, insertions: list[tuple[int, bytes]]) -> bool:
+    """把插入内容写入日记文件. 文件已不是 snapshot 的版本时不写入, 返回 False.
+
+    插入位置都在文件末尾时直接追加; 否则写到同目录的临时文件后原子替换, 插入点之间的
+    原有内容由内核复制, 不经过 Python.
+    """
+    path = snapshot.path
+    size = snapshot.reader.size
+    offset = insertions[0][0]
+    data = b"".join(text for _, text in insertions)
+    tail = snapshot.reader.read_bytes(offset, size)
+
+    if all(o == offset for o, _ in insertions) and (tail == b"" or (tail == b"\n" and data.startswith(b"\n"))):
+        if tail:
+            data = data[1:] + b"\n"
+        with open(path, "ab") as f:
+            if not snapshot.reader.matches_stat(os.fstat(f.fileno())):
+                return False
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        logger.debug(f"##### diary_merge: appended {len(data)} bytes to {path}")
+        return True
+
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", dir=os.path.dirname(path))
+    try:
+        with open(path, "rb") as src, os.fdopen(fd, "wb", buffering=0) as dst:
+            st = os.fstat(src.fileno())
+            if not snapshot.reader.matches_stat(st):
+                return False
+            pos = 0
+            for offset, text in insertions:
+                _copy_range(src, dst, pos, offset)
+                dst.write(text)
+                pos = offset
+            _copy_range(src, dst, pos, size)
+            os.fsync(dst.fileno())
+        os.chmod(tmp_path, stat.S_IMODE(st.st_mode))
+        if not snapshot.reader.matches_stat(os.stat(path)):
+            return False
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+    logger.debug(f"##### diary_merge: inserted {len(data)} bytes into {path}")
+    return True
+
+
+@contextmanager
+def _merge_lock():
+    """进程内与进程间(mail-watch, 多个会话)互斥地写入日记."""
+    with _lock:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(os.path.join(CACHE_DIR, LOCK_FILE_NAME), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def merge_fragments(diary_file: str, fragments: list[dict]) -> list[str]:
+    """把邮件中的日记片段写入日记文件的对应日期下.
+
+    以 Message-ID(没有时为正文哈希)去重, 已写入过的片段跳过. 同一日期的片段合并后一起写入,
+    只改动插入点所在的区域, 写入后日记索引增量更新.
+
+    Args:
+        diary_file: The path to the diary file.
+        fragments: The fragments, dicts with "body" and optional "message_id", "date" (isoformat).
+
+    Returns:
+        The dates written to, sorted.
+    """
+    groups: dict[str, list[str]] = {}
+    merged_keys = []
+    for fragment in fragments:
+        body = fragment.get("body", "")
+        key = fragment.get("message_id") or hashlib.sha1(body.encode("utf-8")).hexdigest()
+        if key in merged_keys or cache_store.get("diary_merged", key) is not None:
+            logger.debug(f"##### diary_merge: already merged: {key}")
+            continue
+        date, items = format_fragment(body, _mail_date(fragment.get("date")))
+        if items:
+            groups.setdefault(date, []).extend(items)
+        merged_keys.append(key)
+
+    if groups:
+        with _merge_lock():
+            for _ in range(MAX_ATTEMPTS):
+                snapshot = diary_store.get(diary_file)
+                if _apply(snapshot, _insertions(snapshot, groups)):
+                    break
+                logger.warn(f"##### diary_merge: {snapshot.path} changed while merging, retrying")
+            else:
+                raise RuntimeError(f"diary file keeps changing: {diary_file}")
+            diary_store.get(diary_file)
+
+    for key in merged_keys:
+        cache_store.set("diary_merged", key, 1, ttl=SEEN_MESSAGE_TTL)
+    return sorted(groups)
@@ -0,0 +1,177 @@
+import re
+from bisect import bisect_left, bisect_right
+from utils import logger
+from cache_store import cache_store
+
+# 日期行: "- 2026-01-19 周一："
+DATE_LINE_PATTERN = re.compile(r'^\s*-\s*(\d{4}-\d{2}-\d{2})\s*(周[一二三四五六日天])?')
+# 项目行: "    - 健康：跑步：+2. 早睡：+1. "
+ITEM_LINE_PATTERN = re.compile(r'^(\s+)-\s*([^：:\s]+)\s*[：:]\s*(.*)$')
+# 分数: "跑步：+2", "熬夜: -1", 或不带名称的 "+1"
+SCORE_PATTERN = re.compile(r'(?:([^\s：:。.,，;；()（）+\-]+)\s*[：:]\s*)?(?<![0-9A-Za-z])([+-]\d+(?:\.\d+)?)')
+# 时长: "(8.0h)", "（2h）"
+HOURS_PATTERN = re.compile(r'[(（]\s*(\d+(?:\.\d+)?)\s*h\s*[)）]', re.IGNORECASE)
+
+RECORDS_VERSION = 1
+
+
+class DiaryRecord:
+    """一天中某个项目的记录, 如 2026-01-19 的 "健康".
+
+    scores 为 ((名称, 分数), ...), 不带名称的分数名称为空字符串; hours 为记录的时长, 没有则为 None.
+    """
+
+    __slots__ = ("date", "weekday", "category", "text", "scores", "hours")
+
+    def __init__(self, date: str, weekday: str, category: str, text: str,
+                 scores: tuple = (), hours: float | None = None):
+        self.date = date
+        self.weekday = weekday
+        self.category = category
+        self.text = text
+        self.scores = scores
+        self.hours = hours
+
+    @property
+    def score(self) -> float:
+        return sum(value for _, value in self.scores)
+
+    def to_list(self) -> list:
+        return [self.date, self.weekday, self.category, self.text, [list(s) for s in self.scores], self.hours]
+
+    @classmethod
+    def from_list(cls, data: list) -> "DiaryRecord":
+        return cls(data[0], data[1], data[2], data[3], tuple(tuple(s) for s in data[4]), data[5])
+
+    def __repr__(self) -> str:
+        return f"DiaryRecord({self.date}, {self.category}, scores={self.scores}, hours={self.hours})"
+
+
+def _number(text: str) -> int | float:
+    value = float(text)
+    return int(value) if value.is_integer() else value
+
+
+def parse_item(date: str, weekday: str, category: str, text: str) -> DiaryRecord:
+    """解析一个项目的文本, 提取分数与时长."""
+    text = text.strip()
+    scores = tuple((name or "", _number(value)) for name, value in SCORE_PATTERN.findall(text))
+    m = HOURS_PATTERN.search(text)
+    hours = float(m.group(1)) if m else None
+    return DiaryRecord(date, weekday, category, text, scores, hours)
+
+
+def parse_diary(text: str) -> list[DiaryRecord]:
+    """单遍解析日记文本, 返回项目记录列表(按文件顺序).
+
+    日期行下缩进的 "- 类别：内容" 为一条记录, 更深缩进的行并入上一条记录的内容.
+
+    Args:
+        text: The diary text.
+
+    Returns:
+        The parsed DiaryRecord list.
+    """
+    records = []
+    date = weekday = None
+    current = None  # [category, text, indent]
+
+    def flush():
+        if current is not None:
+            records.append(parse_item(date, weekday, current[0], current[1]))
+
+    for line in text.splitlines():
+        m = DATE_LINE_PATTERN.match(line)
+        if m:
+            flush()
+            current = None
+            date, weekday = m.group(1), m.group(2) or ""
+            continue
+        if date is None or not line.strip():
+            continue
+        if not line[0].isspace():
+            # 顶格的非日期行(标题等)结束当天的日记
+            flush()
+            current = None
+            date = None
+            continue
+        m = ITEM_LINE_PATTERN.match(line)
+        if m and (current is None or len(m.group(1)) <= current[2]):
+            flush()
+            current = [m.group(2), m.group(3), len(m.group(1))]
+        elif current is not None:
+            current[1] += " " + line.strip().lstrip("-").strip()
+        else:
+            # 没有类别的行
+            current = ["", line.strip().lstrip("-").strip(), len(line) - len(line.lstrip())]
+    flush()
+    return records
+
+
+class DiaryRecords:
+    """按日期排序的记录集合, 支持按日期区间查询."""
+
+    def __init__(self, records: list[DiaryRecord]):
+        self.records = sorted(records, key=lambda r: r.date)
+        self.dates = [r.date for r in self.records]
+
+    def range(self, start: str, end: str) -> list[DiaryRecord]:
+        """返回日期在 [start, end] 闭区间内的记录."""
+        return self.records[bisect_left(self.dates, start):bisect_right(self.dates, end)]
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+
+def format_records(records: list[DiaryRecord]) -> str:
+    """把记录格式化为紧凑文本, 每天一行, 如:
+
+        2026-01-19 周一 | 健康: 跑步：+2. 早睡：+1. | 工作(8h): (8.0h) 完成后端API重构...
+    """
+    lines = []
+    date = None
+    parts = []
+    for r in records:
+        if r.date != date:
+            if parts:
+                lines.append(" | ".join(parts))
+            date = r.date
+            parts = [f"{r.date} {r.weekday}".strip()]
+        label = r.category if r.hours is None else f"{r.category}({r.hours:g}h)"
+        parts.append(f"{label}: {r.text}")
+    if parts:
+        lines.append(" | ".join(parts))
+    return "\n".join(lines)
+
+
+def load_diary_records(snapshot) -> DiaryRecords:
+    """获取某版本日记的解析结果, 优先使用缓存(以日记路径为键, 内容哈希校验).
+
+    Args:
+        snapshot: The DiarySnapshot of the diary file.
+
+    Returns:
+        The DiaryRecords of the diary.
+    """
+    data = cache_store.get("diary_records", snapshot.path)
+    if data is not None:
+        try:
+            if data.get("version") == RECORDS_VERSION and data.get("sha1") == snapshot.version:
+                return DiaryRecords([DiaryRecord.from_list(r) for r in data["records"]])
+        except (AttributeError, KeyError, TypeError, IndexError) as e:
+            logger.error(f"##### Failed to load diary records cache: {snapshot.path}: {e}")
+
+    records = parse_diary(snapshot.reader.read(0, snapshot.reader.size))
+    logger.debug(f"##### parse_diary: {len(records)} records.")
+    try:
+        cache_store.set("diary_records", snapshot.path, {
+            "version": RECORDS_VERSION,
+            "sha1": snapshot.version,
+            "records": [r.to_list() for r in records],
+        })
+    except Exception as e:
+        logger.error(f"##### Failed to save diary records cache: {e}")
+    return DiaryRecords(records)
@@ -0,0 +1,72 @@
+import re
+import calendar
+import datetime
+
+# 支持的时段格式
+DAY_PATTERN = re.compile(r'^(\d{4})-(\d{1,2})-(\d{1,2})$')
+MONTH_PATTERN = re.compile(r'^(\d{4})-(\d{1,2})$')
+YEAR_PATTERN = re.compile(r'^(\d{4})$')
+# ISO 周: 2026-W04, 2026W4
+WEEK_PATTERN = re.compile(r'^(\d{4})-?[Ww](\d{1,2})$')
+# 季度: 2026-Q1, 2026-S1(与 get_plan 一致)
+QUARTER_PATTERN = re.compile(r'^(\d{4})-?[QqSs]([1-4])$')
+
+
+def _day(year: int, month: int, day: int) -> datetime.date:
+    return datetime.date(year, month, day)
+
+
+def period_range(period: str) -> tuple[str, str]:
+    """把时段描述转换为日期闭区间 (start, end), 均为 YYYY-MM-DD.
+
+    支持: YYYY-MM-DD, YYYY-MM, YYYY, ISO 周 YYYY-Www, 季度 YYYY-Qn/YYYY-Sn,
+    以及 "start..end" 形式的任意区间(两端可以是以上任意格式).
+
+    Args:
+        period: The period string.
+
+    Returns:
+        The (start, end) date strings, both inclusive.
+
+    Raises:
+        ValueError: If the period is not recognized.
+    """
+    period = period.strip()
+    if ".." in period:
+        first, last = period.split("..", 1)
+        start, _ = period_range(first)
+        _, end = period_range(last)
+        if start > end:
+            raise ValueError(f"时段起点晚于终点: {period}")
+        return start, end
+
+    m = DAY_PATTERN.match(period)
+    if m:
+        date = _day(int(m.group(1)), int(m.group(2)), int(m.group(3)))
+        return date.isoformat(), date.isoformat()
+
+    m = MONTH_PATTERN.match(period)
+    if m:
+        year, month = int(m.group(1)), int(m.group(2))
+        last_day = calendar.monthrange(year, month)[1]
+        return _day(year, month, 1).isoformat(), _day(year, month, last_day).isoformat()
+
+    m = YEAR_PATTERN.match(period)
+    if m:
+        year = int(m.group(1))
+        return f"{year:04d}-01-01", f"{year:04d}-12-31"
+
+    m = WEEK_PATTERN.match(period)
+    if m:
+        year, week = int(m.group(1)), int(m.group(2))
+        monday = datetime.date.fromisocalendar(year, week, 1)
+        return monday.isoformat(), (monday + datetime.timedelta(days=6)).isoformat()
+
+    m = QUARTER_PATTERN.match(period)
+    if m:
+        year, quarter = int(m.group(1)), int(m.group(2))
+        first_month = 3 * (quarter - 1) + 1
+        last_day = calendar.monthrange(year, first_month + 2)[1]
+        return _day(year, first_month, 1).isoformat(), _day(year, first_month + 2, last_day).isoformat()
+
+    raise ValueError(f"无法识别的时段: {period}")
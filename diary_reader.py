@@ -0,0 +1,69 @@
+import os
+import threading
+
+
+class DiaryReader:
+    """按字节区间读取日记内容的读取器.
+
+    只读取并解码被请求的部分, 不把整个文件读入内存.
+    用 os.pread 读取而不是 mmap: 编辑器在会话中截断或重写日记时, 访问映射中超出新文件末尾的页会触发 SIGBUS,
+    pread 只会读到较短的内容. 文件变化后(大小或修改时间不同)应重新打开, 见 diary_store.
+    """
+
+    def __init__(self, diary_file: str):
+        self.path = os.path.abspath(os.path.expanduser(diary_file))
+        self._file = open(self.path, "rb", buffering=0)
+        st = os.fstat(self._file.fileno())
+        self.size = st.st_size
+        self.mtime_ns = st.st_mtime_ns
+        # 没有 os.pread 的平台(Windows)用 seek + read, 需要加锁
+        self._lock = threading.Lock()
+
+    def _pread(self, start: int, end: int) -> bytes:
+        if hasattr(os, "pread"):
+            chunks = []
+            while start < end:
+                chunk = os.pread(self._file.fileno(), end - start, start)
+                # 文件被截断
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                start += len(chunk)
+            return b"".join(chunks)
+        with self._lock:
+            self._file.seek(start)
+            return self._file.read(end - start) or b""
+
+    def read(self, start: int, end: int) -> str:
+        """读取 [start, end) 字节区间并解码为文本."""
+        return str(self.read_bytes(start, end), "utf-8", errors="replace")
+
+    def read_bytes(self, start: int, end: int) -> bytes:
+        """读取 [start, end) 字节区间的原始内容."""
+        end = min(end, self.size)
+        if start >= end:
+            return b""
+        return self._pread(start, end)
+
+    def read_entries(self, entries: list[tuple]) -> str:
+        """读取索引条目覆盖的日记内容.
+
+        在文件中连续存放的条目作为一整块返回(包括其间的 "## 第05周" 等标题), 否则逐条拼接.
+
+        Args:
+            entries: The index entries sorted by date.
+
+        Returns:
+            The diary text of the entries.
+        """
+        if not entries:
+            return ""
+        if all(a[1] < b[1] for a, b in zip(entries, entries[1:])):
+            return self.read(entries[0][1], entries[-1][2])
+        return "".join(self.read(entry[1], entry[2]) for entry in entries)
+
+    def matches_stat(self, st: os.stat_result) -> bool:
+        return st.st_size == self.size and st.st_mtime_ns == self.mtime_ns
+
+    def close(self) -> None:
+        self._file.close()
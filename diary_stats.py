@@ -0,0 +1,84 @@
+import datetime
+from diary_parser import DiaryRecord
+
+GROUP_BY_CHOICES = ("category", "day", "week", "month")
+
+
+def _period_of(date: str, group_by: str) -> str:
+    if group_by == "day":
+        return date
+    if group_by == "month":
+        return date[:7]
+    # ISO 周, 如 2026-W04
+    year, week, _ = datetime.date.fromisoformat(date).isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def _fmt(value: float) -> str:
+    return f"{value:+g}" if value else "0"
+
+
+def score_stats(records: list[DiaryRecord], group_by: str = "category") -> str:
+    """单遍统计记录中的分数与时长, 返回 markdown 表格.
+
+    group_by 为 category 时每个类别一行(加分/减分/合计/时长); 为 day/week/month 时每个时段一行,
+    每个类别一列, 最后一行为总计.
+
+    Args:
+        records: The diary records to count, sorted by date.
+        group_by: One of "category", "day", "week", "month".
+
+    Returns:
+        The markdown table of the statistics.
+    """
+    if group_by not in GROUP_BY_CHOICES:
+        raise ValueError(f"group_by must be one of {GROUP_BY_CHOICES}, got {group_by!r}")
+
+    categories = {}  # 按出现顺序记录有分数或时长的类别
+    plus, minus, hours = {}, {}, {}
+    periods = {}  # {时段: {类别: 分数}}
+    days = set()
+    for r in records:
+        days.add(r.date)
+        if not r.scores and r.hours is None:
+            continue
+        categories.setdefault(r.category, None)
+        for _, value in r.scores:
+            if value > 0:
+                plus[r.category] = plus.get(r.category, 0) + value
+            else:
+                minus[r.category] = minus.get(r.category, 0) + value
+        if r.hours is not None:
+            hours[r.category] = hours.get(r.category, 0) + r.hours
+        if group_by != "category":
+            row = periods.setdefault(_period_of(r.date, group_by), {})
+            row[r.category] = row.get(r.category, 0) + r.score
+
+    if not categories:
+        return f"共 {len(days)} 天日记, 没有分数或时长记录."
+
+    names = list(categories)
+    lines = [f"共 {len(days)} 天日记."]
+    if group_by == "category":
+        lines.append("| 类别 | 加分 | 减分 | 合计 | 时长(h) |")
+        lines.append("|---|---|---|---|---|")
+        for name in names:
+            total = plus.get(name, 0) + minus.get(name, 0)
+            lines.append(f"| {name} | {_fmt(plus.get(name, 0))} | {_fmt(minus.get(name, 0))} | {_fmt(total)} | {hours.get(name, 0):g} |")
+        total = sum(plus.values()) + sum(minus.values())
+        lines.append(f"| 总计 | {_fmt(sum(plus.values()))} | {_fmt(sum(minus.values()))} | {_fmt(total)} | {sum(hours.values()):g} |")
+    else:
+        # 只有时长没有分数的类别只列在累计时长中
+        scored = [name for name in names if name in plus or name in minus]
+        if scored:
+            lines.append("| 时段 | " + " | ".join(scored) + " | 合计 |")
+            lines.append("|---" * (len(scored) + 2) + "|")
+            for period, row in periods.items():
+                cells = [_fmt(row.get(name, 0)) for name in scored]
+                lines.append(f"| {period} | " + " | ".join(cells) + f" | {_fmt(sum(row.values()))} |")
+            totals = [_fmt(plus.get(name, 0) + minus.get(name, 0)) for name in scored]
+            lines.append("| 总计 | " + " | ".join(totals) + f" | {_fmt(sum(plus.values()) + sum(minus.values()))} |")
+        if hours:
+            lines.append("")
+            lines.append("累计时长: " + ", ".join(f"{name} {value:g}h" for name, value in hours.items()))
+    return "\n".join(lines)
@@ -0,0 +1,110 @@
+import os
+import threading
+from utils import logger
+from diary_index import DiaryIndex, load_diary_index
+from diary_parser import DiaryRecords, load_diary_records
+from diary_reader import DiaryReader
+from diary_watcher import DiaryWatcher
+
+
+class DiarySnapshot:
+    """某一版本的日记: 索引 + 读取器. version 为日记内容的哈希."""
+
+    def __init__(self, index: DiaryIndex, reader: DiaryReader):
+        self.path = index.path
+        self.version = index.digest
+        self.index = index
+        self.reader = reader
+        self._records = None
+
+    @property
+    def records(self) -> DiaryRecords:
+        """结构化的日记记录(日期/类别/分数/时长), 首次访问时解析并缓存."""
+        if self._records is None:
+            self._records = load_diary_records(self)
+        return self._records
+
+    def read_day(self, date: str) -> str:
+        entry = self.index.lookup(date)
+        return self.reader.read(entry[1], entry[2]) if entry is not None else ""
+
+    def read_entries(self, entries: list[tuple]) -> str:
+        return self.reader.read_entries(entries)
+
+
+class DiaryStore:
+    """进程内的日记存储, 以文件路径与版本为键.
+
+    日记内容不再放入 agent 的 state(否则每个 checkpoint 都会复制一份), state 中只保留
+    diary_file_path 作为句柄, 工具通过 diary_store.get(path) 按引用访问日记.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # {绝对路径: DiarySnapshot}, 只保留每个文件的最新版本
+        self._snapshots: dict[str, DiarySnapshot] = {}
+        self._watchers: dict[str, DiaryWatcher] = {}
+
+    def get(self, diary_file: str) -> DiarySnapshot:
+        """获取日记文件的最新版本, 文件变化时重新加载索引并重新打开读取器.
+
+        Args:
+            diary_file: The path to the diary file.
+
+        Returns:
+            The DiarySnapshot of the diary file.
+        """
+        path = os.path.abspath(os.path.expanduser(diary_file))
+        with self._lock:
+            snapshot = self._snapshots.get(path)
+            st = os.stat(path)
+            if snapshot is not None and snapshot.reader.matches_stat(st) and snapshot.index.matches_stat(st):
+                return snapshot
+
+            index = load_diary_index(path)
+            if snapshot is not None and snapshot.version == index.digest and snapshot.reader.size == index.size:
+                # 内容未变(如 touch), 复用已打开的读取器
+                reader = snapshot.reader
+                reader.mtime_ns = index.mtime_ns
+            else:
+                # 旧版本的读取器不主动关闭, 可能仍有其他线程在读取, 由引用计数回收
+                reader = DiaryReader(path)
+            snapshot = DiarySnapshot(index, reader)
+            self._snapshots[path] = snapshot
+            logger.debug(f"##### diary_store: {path} version {snapshot.version[:8]}")
+            return snapshot
+
+    def watch(self, diary_file: str, interval: float = 1.0) -> DiaryWatcher:
+        """在后台监视日记文件, 文件被编辑后立即增量更新索引并重新打开读取器.
+
+        用于长时间运行的交互会话, 使编辑器中的修改无需重启即可被工具读到.
+
+        Args:
+            diary_file: The path to the diary file.
+            interval: The polling interval in seconds when inotify is unavailable.
+
+        Returns:
+            The started DiaryWatcher.
+        """
+        path = os.path.abspath(os.path.expanduser(diary_file))
+        with self._lock:
+            watcher = self._watchers.get(path)
+            if watcher is None:
+                watcher = DiaryWatcher(path, self.get, interval)
+                watcher.start()
+                self._watchers[path] = watcher
+        return watcher
+
+    def version(self, diary_file: str) -> str:
+        """获取日记文件当前的版本号(内容哈希)."""
+        return self.get(diary_file).version
+
+    def clear(self) -> None:
+        with self._lock:
+            for watcher in self._watchers.values():
+                watcher.stop()
+            self._watchers.clear()
+            self._snapshots.clear()
+
+
+diary_store = DiaryStore()
@@ -0,0 +1,146 @@
+import json
+import hashlib
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from utils import logger
+from model_limit import model_slot
+from cache_store import cache_store
+from diary_parser import format_records
+from diary_period import period_range, WEEK_PATTERN, MONTH_PATTERN, QUARTER_PATTERN, YEAR_PATTERN
+
+# 摘要提示词或格式变化时递增, 使旧缓存失效
+SUMMARY_VERSION = 1
+# 原文短于该长度的时段直接使用原文, 不调用 llm
+MIN_SUMMARY_CHARS = 600
+
+SUMMARY_PROMPT = """请把下面{label}的{source}压缩成一段不超过{limit}字的中文摘要.
+要求: 保留各项目的分数与累计时长等数字, 完成的主要事项, 出现的问题与反复出现的习惯; 不要评价, 不要添加原文没有的内容, 直接输出摘要.
+
+{content}"""
+
+
+def _month_segments(start: str, end: str) -> list[tuple[str, str]]:
+    """把 [start, end] 按 "ISO 周与自然月的交集" 切分为若干段, 每段不跨周也不跨月."""
+    day = datetime.date.fromisoformat(start)
+    last = datetime.date.fromisoformat(end)
+    segments = []
+    while day <= last:
+        week_end = day + datetime.timedelta(days=6 - day.weekday())
+        next_month = (day.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+        seg_end = min(week_end, next_month - datetime.timedelta(days=1), last)
+        segments.append((day.isoformat(), seg_end.isoformat()))
+        day = seg_end + datetime.timedelta(days=1)
+    return segments
+
+
+class DiarySummarizer:
+    """分层的日记摘要: 日 → 周(与月的交集) → 月 → 季度 → 年.
+
+    日级为解析后的紧凑记录(不调用 llm); 上层摘要由 llm 基于下一层的内容生成,
+    以"层级+时段+下层内容"的哈希为键缓存在 cache_store 的 summary 命名空间中.
+    某天的日记变化时只有包含它的各层摘要需要重新生成, 其余直接命中缓存.
+    """
+
+    def __init__(self, llm, max_workers: int = 4, model_semaphore=None):
+        self.llm = llm
+        self.max_workers = max_workers
+        # batch 命令中限制模型请求并发数的信号量(见 model_limit.py)
+        self.model_semaphore = model_semaphore
+
+    def _node(self, label: str, source: str, content: str, limit: int) -> str:
+        """生成(或从缓存获取)一个时段的摘要."""
+        if not content:
+            return ""
+        if len(content) <= MIN_SUMMARY_CHARS:
+            return content
+
+        key = hashlib.sha1(json.dumps([SUMMARY_VERSION, label, limit, content], ensure_ascii=False).encode("utf-8")).hexdigest()
+        cached = cache_store.get("summary", key)
+        if cached is not None:
+            return cached
+
+        logger.debug(f"##### summarize {label}: {len(content)} chars")
+        with model_slot(self.model_semaphore):
+            result = self.llm.invoke(SUMMARY_PROMPT.format(label=label, source=source, limit=limit, content=content))
+        summary = getattr(result, "content", result).strip()
+        cache_store.set("summary", key, summary)
+        return summary
+
+    def _map(self, func, items: list) -> list:
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(func, items))
+
+    @staticmethod
+    def _join(children: list[tuple[str, str]]) -> str:
+        return "\n".join(f"[{child}] {text}" for child, text in children if text)
+
+    def _reduce(self, label: str, source: str, children: list[tuple[str, str]], limit: int) -> str:
+        return self._node(label, source, self._join(children), limit)
+
+    def _segments(self, snapshot, segments: list[tuple[str, str]]) -> list[tuple[str, str]]:
+        """并发生成各段(周与月的交集)的摘要, 返回 [(标签, 摘要), ...]."""
+        def summarize(segment):
+            label = f"{segment[0]}至{segment[1]}" if segment[0] != segment[1] else segment[0]
+            return label, self._node(label, "日记", format_records(snapshot.records.range(*segment)), 300)
+        return self._map(summarize, segments)
+
+    def _months(self, snapshot, months: list[str]) -> dict[str, tuple[str, list]]:
+        """生成各月摘要, 返回 {YYYY-MM: (摘要, [(段标签, 段摘要), ...])}."""
+        pairs = [(month, segment) for month in months for segment in _month_segments(*period_range(month))]
+        children = {month: [] for month in months}
+        for (month, _), result in zip(pairs, self._segments(snapshot, [segment for _, segment in pairs])):
+            if result[1]:
+                children[month].append(result)
+        summaries = self._map(lambda month: self._reduce(f"{month}月", "各周日记摘要", children[month], 500), months)
+        return {month: (summary, children[month]) for month, summary in zip(months, summaries)}
+
+    def _quarters(self, snapshot, year: int, quarters: list[int]) -> dict[str, tuple[str, list]]:
+        """生成各季度摘要, 返回 {YYYY-Qn: (摘要, [(月份, 月摘要), ...])}."""
+        months = {q: [f"{year:04d}-{m:02d}" for m in range(3 * q - 2, 3 * q + 1)] for q in quarters}
+        month_nodes = self._months(snapshot, [m for q in quarters for m in months[q]])
+
+        def summarize(quarter):
+            children = [(m, month_nodes[m][0]) for m in months[quarter] if month_nodes[m][0]]
+            return self._reduce(f"{year}年第{quarter}季度", "各月日记摘要", children, 600), children
+        return {f"{year:04d}-Q{q}": result for q, result in zip(quarters, self._map(summarize, quarters))}
+
+    def summarize(self, snapshot, period: str) -> str:
+        """生成指定时段的分层摘要: 该时段的摘要 + 下一层各时段的摘要.
+
+        Args:
+            snapshot: The DiarySnapshot of the diary file.
+            period: 时段, 格式为 YYYY-Www, YYYY-MM, YYYY-Qn(或 YYYY-Sn) 或 YYYY.
+
+        Returns:
+            The summary text.
+
+        Raises:
+            ValueError: If the period is not a week, month, quarter or year.
+        """
+        period = period.strip()
+        if WEEK_PATTERN.match(period):
+            children = [c for c in self._segments(snapshot, _month_segments(*period_range(period))) if c[1]]
+            summary = self._reduce(period, "日记摘要", children, 500)
+        elif MONTH_PATTERN.match(period):
+            month = period_range(period)[0][:7]
+            summary, children = self._months(snapshot, [month])[month]
+        elif QUARTER_PATTERN.match(period):
+            m = QUARTER_PATTERN.match(period)
+            summary, children = self._quarters(snapshot, int(m.group(1)), [int(m.group(2))])[f"{m.group(1)}-Q{m.group(2)}"]
+        elif YEAR_PATTERN.match(period):
+            year = int(period)
+            quarters = self._quarters(snapshot, year, [1, 2, 3, 4])
+            children = [(label, summary) for label, (summary, _) in quarters.items() if summary]
+            summary = self._reduce(f"{year}年", "各季度日记摘要", children, 800)
+        else:
+            raise ValueError(f"摘要只支持周(YYYY-Www), 月(YYYY-MM), 季度(YYYY-Qn)与年(YYYY): {period}")
+
+        if not summary:
+            return ""
+        lines = [f"## {period} 摘要", summary]
+        # 下层内容较短时摘要即为下层原文, 不再重复列出
+        if len(children) > 1 and summary != self._join(children):
+            lines.append("")
+            lines.append("## 分段摘要")
+            lines.extend(f"- {label}: {text}" for label, text in children)
+        return "\n".join(lines)
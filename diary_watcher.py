@@ -0,0 +1,119 @@
+import os
+import sys
+import time
+import struct
+import select
+import ctypes, ctypes.util
+import threading
+from utils import logger
+
+# inotify 事件(见 <sys/inotify.h>)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def _inotify_libc():
+    """Linux 下返回支持 inotify 的 libc, 否则返回 None."""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        return libc if hasattr(libc, "inotify_init1") else None
+    except OSError:
+        return None
+
+
+class DiaryWatcher(threading.Thread):
+    """监视日记文件的后台线程, 文件被修改时调用 on_change(path).
+
+    Linux 下使用 inotify 监视文件所在目录(编辑器常以"写临时文件+重命名"的方式保存,
+    直接监视文件会丢失事件), 其他平台或 inotify 不可用时退化为定时比较修改时间.
+    连续的多个事件会在 debounce 秒内合并为一次回调.
+    """
+
+    def __init__(self, diary_file: str, on_change, interval: float = 1.0, debounce: float = 0.2):
+        super().__init__(name="DiaryWatcher", daemon=True)
+        self.path = os.path.abspath(os.path.expanduser(diary_file))
+        self.on_change = on_change
+        self.interval = interval
+        self.debounce = debounce
+        self._stop_event = threading.Event()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def run(self) -> None:
+        libc = _inotify_libc()
+        if libc is not None:
+            try:
+                self._run_inotify(libc)
+                return
+            except OSError as e:
+                logger.warn(f"##### inotify unavailable, fallback to polling: {e}")
+        self._run_polling()
+
+    def _notify(self) -> None:
+        try:
+            self.on_change(self.path)
+        except Exception as e:
+            logger.error(f"##### Failed to reload diary {self.path}: {e}")
+
+    def _run_inotify(self, libc) -> None:
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        try:
+            directory = os.path.dirname(self.path).encode()
+            mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+            if libc.inotify_add_watch(fd, directory, mask) < 0:
+                raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+            name = os.path.basename(self.path).encode()
+            logger.debug(f"##### DiaryWatcher: inotify on {self.path}")
+
+            pending = False
+            while not self._stop_event.is_set():
+                # 有待处理事件时, 等待 debounce 秒没有新事件再回调
+                ready, _, _ = select.select([fd], [], [], self.debounce if pending else self.interval)
+                if not ready:
+                    if pending:
+                        pending = False
+                        self._notify()
+                    continue
+                try:
+                    data = os.read(fd, 64 * 1024)
+                except BlockingIOError:
+                    continue
+                offset = 0
+                while offset + _EVENT_HEADER.size <= len(data):
+                    _, _, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                    offset += _EVENT_HEADER.size
+                    if data[offset:offset + length].rstrip(b"\0") == name:
+                        pending = True
+                    offset += length
+        finally:
+            os.close(fd)
+
+    def _run_polling(self) -> None:
+        logger.debug(f"##### DiaryWatcher: polling {self.path} every {self.interval}s")
+
+        def stat_key():
+            try:
+                st = os.stat(self.path)
+                return st.st_size, st.st_mtime_ns, st.st_ino
+            except FileNotFoundError:
+                return None
+
+        last = stat_key()
+        while not self._stop_event.wait(self.interval):
+            current = stat_key()
+            if current != last:
+                # 文件仍在写入时等待其稳定
+                time.sleep(self.debounce)
+                last = stat_key()
+                if last is not None:
+                    self._notify()
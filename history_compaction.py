@@ -0,0 +1,197 @@
+import json
+from langchain.agents.middleware import AgentMiddleware
+from langchain_core.messages import HumanMessage, RemoveMessage
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
+from utils import logger
+from model_limit import context_semaphore, model_slot, amodel_slot
+
+# 对话历史(不含系统提示词)的 token 预算, 可在 aid_config.json 中用 "history_max_tokens" 配置
+DEFAULT_MAX_TOKENS = 8000
+# 最近几轮对话(含当前轮)保持原样
+KEEP_TURNS = 2
+# 超过该 token 数的旧工具结果折叠为引用
+COLLAPSE_TOKENS = 200
+# 历史摘要的字数上限
+SUMMARY_CHARS = 800
+
+# 摘要请求的配置; nostream: 摘要的输出不作为回复流式显示
+SUMMARY_CONFIG = {"tags": ["nostream"]}
+
+# additional_kwargs 中的标记, 用于识别摘要消息与已折叠的工具结果
+SUMMARY_KEY = "aid_history_summary"
+COLLAPSED_KEY = "aid_collapsed"
+
+SUMMARY_PROMPT = """下面是一段对话的摘要(可能为空)与之后的几轮对话. 请把它们合并为一份新的摘要, 不超过{limit}字.
+要求: 保留用户的问题与要求, 得出的结论, 涉及的日期, 分数与时长等数字; 省略寒暄与格式; 直接输出摘要.
+
+## 已有摘要
+{summary}
+
+## 之后的对话
+{transcript}"""
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估计 token 数: 中日韩文字约 1 字 1 token, 其他字符约 4 个 1 token."""
+    cjk = sum(1 for c in text if c >= "⺀")
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _text(message) -> str:
+    content = message.content
+    return content if isinstance(content, str) else json.dumps(content, ensure_ascii=False)
+
+
+def message_tokens(message) -> int:
+    tokens = estimate_tokens(_text(message)) + 4
+    for tool_call in getattr(message, "tool_calls", None) or []:
+        tokens += estimate_tokens(tool_call["name"] + json.dumps(tool_call["args"], ensure_ascii=False))
+    return tokens
+
+
+def _is_summary(message) -> bool:
+    return message.type == "human" and bool(message.additional_kwargs.get(SUMMARY_KEY))
+
+
+def _call_text(tool_call: dict | None, name: str | None) -> str:
+    if tool_call is None:
+        return f"{name or '工具'}()"
+    args = ", ".join(f"{k}={json.dumps(v, ensure_ascii=False)}" for k, v in tool_call["args"].items())
+    return f"{tool_call['name']}({args})"
+
+
+def _transcript(messages: list) -> str:
+    lines = []
+    for m in messages:
+        if m.type == "human":
+            lines.append(f"用户: {_text(m)}")
+        elif m.type == "ai":
+            if _text(m):
+                lines.append(f"助手: {_text(m)}")
+            for tool_call in m.tool_calls or []:
+                lines.append(f"(调用 {_call_text(tool_call, None)})")
+        elif m.type == "tool" and m.additional_kwargs.get(COLLAPSED_KEY):
+            continue
+        elif m.type == "tool":
+            lines.append(f"(工具结果: {_text(m)})")
+    return "\n".join(lines)
+
+
+class HistoryCompactionMiddleware(AgentMiddleware):
+    """长会话的对话历史压缩: 每次调用模型前把对话历史控制在 token 预算内.
+
+    1. 之前各轮的工具结果(如整月的日记)折叠为一行引用, 注明工具与参数, 模型需要时可重新调用;
+       最近 keep_turns 轮保持原样.
+    2. 仍超出预算时, 把最近 keep_turns 轮之前的对话并入历史摘要(增量: 已有摘要 + 新并入的对话),
+       摘要作为第一条消息.
+    3. 还超出时, 当前轮之前的工具结果也折叠.
+    压缩结果写回 state, 之后的轮次(包括从 checkpoint 恢复的会话)不再重复发送.
+    """
+
+    def __init__(self, llm, max_tokens: int = DEFAULT_MAX_TOKENS, keep_turns: int = KEEP_TURNS,
+                 collapse_tokens: int = COLLAPSE_TOKENS, summary_chars: int = SUMMARY_CHARS):
+        super().__init__()
+        self.llm = llm
+        self.max_tokens = max_tokens
+        self.keep_turns = max(1, keep_turns)
+        self.collapse_tokens = collapse_tokens
+        self.summary_chars = summary_chars
+
+    def _collapse(self, body: list, end: int) -> bool:
+        """折叠 body[:end] 中较长的工具结果, 返回是否有改动."""
+        calls = {tc["id"]: tc for m in body if m.type == "ai" for tc in (m.tool_calls or [])}
+        changed = False
+        for i in range(end):
+            m = body[i]
+            if m.type != "tool" or m.additional_kwargs.get(COLLAPSED_KEY) or message_tokens(m) <= self.collapse_tokens:
+                continue
+            reference = (f"[{_call_text(calls.get(m.tool_call_id), m.name)} 的结果(约 {message_tokens(m)} tokens)"
+                         f"已从对话历史中省略, 需要时请重新调用该工具.]")
+            body[i] = m.model_copy(update={"content": reference,
+                                           "additional_kwargs": {**m.additional_kwargs, COLLAPSED_KEY: True}})
+            changed = True
+        return changed
+
+    def _prepare(self, messages: list) -> tuple[object, list, list, bool]:
+        """折叠旧的工具结果, 超出预算时切分出要并入摘要的旧对话.
+
+        Returns:
+            (已有的摘要消息或 None, 要并入摘要的消息, 保留的消息, 是否有改动)
+        """
+        summary = messages[0] if messages and _is_summary(messages[0]) else None
+        body = list(messages[1:] if summary is not None else messages)
+        starts = [i for i, m in enumerate(body) if m.type == "human"]
+        if not starts:
+            return summary, [], body, False
+        recent = starts[-self.keep_turns] if len(starts) >= self.keep_turns else starts[0]
+
+        changed = self._collapse(body, recent)
+        summary_tokens = message_tokens(summary) if summary is not None else 0
+        if summary_tokens + sum(map(message_tokens, body)) <= self.max_tokens:
+            return summary, [], body, changed
+
+        fold, body = body[:recent], body[recent:]
+        if fold:
+            summary_tokens = estimate_tokens("字" * self.summary_chars)
+        if summary_tokens + sum(map(message_tokens, body)) > self.max_tokens:
+            changed = self._collapse(body, starts[-1] - recent) or changed
+        return summary, fold, body, changed or bool(fold)
+
+    def _summary_prompt(self, summary, fold: list) -> str:
+        previous = _text(summary).split("\n", 1)[-1] if summary is not None else "(无)"
+        return SUMMARY_PROMPT.format(limit=self.summary_chars, summary=previous, transcript=_transcript(fold))
+
+    @staticmethod
+    def _update(summary, summary_text: str | None, body: list) -> dict:
+        messages = list(body)
+        if summary_text:
+            messages.insert(0, HumanMessage(f"以下是之前对话的摘要:\n{summary_text}", additional_kwargs={SUMMARY_KEY: True}))
+        elif summary is not None:
+            messages.insert(0, summary)
+        return {"messages": [RemoveMessage(id=REMOVE_ALL_MESSAGES), *messages]}
+
+    def _log(self, before: list, update: dict) -> None:
+        after = update["messages"][1:]
+        logger.debug(f"##### history compacted: {len(before)} → {len(after)} messages, "
+                     f"~{sum(map(message_tokens, before))} → ~{sum(map(message_tokens, after))} tokens")
+
+    def _finish(self, messages: list, summary, fold: list, body: list, result) -> dict:
+        """同步与异步的 before_model 共用: 由摘要请求的结果(没有请求时为 None, 失败时为异常)
+        生成写回 state 的更新. 摘要失败时要并入摘要的对话保持原样."""
+        summary_text = None
+        if isinstance(result, Exception):
+            logger.error(f"##### Failed to summarize history: {result}")
+            body = fold + body
+        elif result is not None:
+            summary_text = getattr(result, "content", result).strip()
+        update = self._update(summary, summary_text, body)
+        self._log(messages, update)
+        return update
+
+    def before_model(self, state, runtime) -> dict | None:
+        messages = state["messages"]
+        summary, fold, body, changed = self._prepare(messages)
+        if not changed:
+            return None
+        result = None
+        if fold:
+            try:
+                with model_slot(context_semaphore(runtime)):
+                    result = self.llm.invoke(self._summary_prompt(summary, fold), config=SUMMARY_CONFIG)
+            except Exception as e:
+                result = e
+        return self._finish(messages, summary, fold, body, result)
+
+    async def abefore_model(self, state, runtime) -> dict | None:
+        messages = state["messages"]
+        summary, fold, body, changed = self._prepare(messages)
+        if not changed:
+            return None
+        result = None
+        if fold:
+            try:
+                async with amodel_slot(context_semaphore(runtime)):
+                    result = await self.llm.ainvoke(self._summary_prompt(summary, fold), config=SUMMARY_CONFIG)
+            except Exception as e:
+                result = e
+        return self._finish(messages, summary, fold, body, result)
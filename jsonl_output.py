@@ -0,0 +1,106 @@
+"""--output jsonl: 把一轮对话的过程输出为 JSON Lines 事件流, 供脚本与下游程序处理.
+
+每行一个事件, 不含 ANSI 转义码, 写出后立即 flush. 所有事件都有 "type" 与 "t"(距本轮开始的秒数):
+
+    {"type": "start", "t": 0.0, "thread_id": "...", "input": "..."}
+    {"type": "reasoning", "t": 0.41, "text": "...", "chunks": 12}
+    {"type": "token", "t": 0.52, "text": "...", "chunks": 8}
+    {"type": "model", "t": 1.3, "elapsed": 1.3, "input_tokens": 812, "output_tokens": 40, "tool_calls": 2}
+    {"type": "tool_call", "t": 1.3, "id": "...", "name": "get_month_diary", "args": {"date": "2026-01"}}
+    {"type": "tool_result", "t": 1.5, "id": "...", "name": "get_month_diary", "status": "success",
+     "elapsed": 0.2, "chars": 5230, "content": "...", "truncated": true}
+    {"type": "final", "t": 3.2, "text": "...", "model_calls": 2, "tool_calls": 2,
+     "input_tokens": 2100, "output_tokens": 380, "total_tokens": 2480}
+    {"type": "error", "t": 0.9, "error": "..."}
+
+token/reasoning 事件为一批流式输出的合并(chunks 为合并的分块数), 批之间最多间隔 batch_interval 秒.
+"""
+import sys
+import json
+import time
+
+# 流式文本合并为一个事件的最长时间(秒)
+TOKEN_BATCH_INTERVAL = 0.1
+# tool_result 事件中工具结果的最大字符数, 超出部分截断("truncated": true)
+RESULT_PREVIEW_CHARS = 2000
+
+
+class JsonlEventWriter:
+    """一轮对话的事件输出. 流式文本按时间合并为批, 其他事件写出前先写出未完成的批."""
+
+    def __init__(self, stream=None, batch_interval: float = TOKEN_BATCH_INTERVAL,
+                 preview_chars: int = RESULT_PREVIEW_CHARS):
+        self.stream = stream if stream is not None else sys.stdout
+        self.batch_interval = batch_interval
+        self.preview_chars = preview_chars
+        self._start = time.perf_counter()
+        self._batch_type = None
+        self._batch = []
+        self._batch_start = 0.0
+        # 工具调用 id -> 发起时间, 用于计算工具耗时
+        self._tool_started = {}
+        self._model_started = self._start
+        self.model_calls = 0
+        self.tool_calls = 0
+        self.usage = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+
+    def _now(self) -> float:
+        return time.perf_counter() - self._start
+
+    def _write(self, event: dict) -> None:
+        self.stream.write(json.dumps(event, ensure_ascii=False, default=str) + "\n")
+        self.stream.flush()
+
+    def emit(self, event_type: str, **fields) -> None:
+        self.flush_batch()
+        self._write({"type": event_type, "t": round(self._now(), 3), **fields})
+
+    def flush_batch(self) -> None:
+        if self._batch:
+            self._write({"type": self._batch_type, "t": round(self._batch_start, 3),
+                         "text": "".join(self._batch), "chunks": len(self._batch)})
+            self._batch = []
+
+    def text(self, event_type: str, text: str) -> None:
+        """流式文本("token" 或 "reasoning"), 合并后写出."""
+        if self._batch and (self._batch_type != event_type or self._now() - self._batch_start >= self.batch_interval):
+            self.flush_batch()
+        if not self._batch:
+            self._batch_type = event_type
+            self._batch_start = self._now()
+        self._batch.append(text)
+
+    def start(self, thread_id: str, user_input: str) -> None:
+        self._start = self._model_started = time.perf_counter()
+        self.emit("start", thread_id=thread_id, input=user_input)
+
+    def model_message(self, message) -> None:
+        """模型一步的完整消息: 记录 token 用量, 输出其中的工具调用."""
+        now = time.perf_counter()
+        usage = getattr(message, "usage_metadata", None) or {}
+        for key in self.usage:
+            self.usage[key] += usage.get(key, 0)
+        tool_calls = getattr(message, "tool_calls", None) or []
+        self.model_calls += 1
+        self.emit("model", elapsed=round(now - self._model_started, 3), input_tokens=usage.get("input_tokens"),
+                  output_tokens=usage.get("output_tokens"), tool_calls=len(tool_calls))
+        for tool_call in tool_calls:
+            self.tool_calls += 1
+            self._tool_started[tool_call["id"]] = now
+            self.emit("tool_call", id=tool_call["id"], name=tool_call["name"], args=tool_call["args"])
+
+    def tool_message(self, message) -> None:
+        now = time.perf_counter()
+        content = message.content if isinstance(message.content, str) else json.dumps(message.content, ensure_ascii=False)
+        started = self._tool_started.pop(message.tool_call_id, None)
+        self.emit("tool_result", id=message.tool_call_id, name=message.name, status=message.status,
+                  elapsed=round(now - started, 3) if started is not None else None, chars=len(content),
+                  content=content[:self.preview_chars], truncated=len(content) > self.preview_chars)
+        # 下一次模型调用在工具结果之后开始
+        self._model_started = now
+
+    def final(self, text: str) -> None:
+        self.emit("final", text=text, model_calls=self.model_calls, tool_calls=self.tool_calls, **self.usage)
+
+    def error(self, error: BaseException) -> None:
+        self.emit("error", error=f"{type(error).__name__}: {error}")
@@ -0,0 +1,93 @@
+import os, re, json
+import hashlib
+from typing import Any, Sequence
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core.outputs import Generation
+from utils import logger
+from cache_store import cache_store
+from diary_store import diary_store
+
+# 缓存的模型回复默认保留 7 天
+DEFAULT_TTL = 7 * 24 * 3600
+# 提示词中的时间精确到秒, 归一化为日期, 同一天内的相同问题可以命中缓存
+DATE_TIME_PATTERN = re.compile(r'(\d{4}-\d{2}-\d{2})[ T]\d{2}:\d{2}:\d{2}')
+# 每次运行都不同, 与回复内容无关的字段(字符串形式的 "id" 为消息/工具调用 id, 列表形式的为类路径, 需保留)
+_VOLATILE_KEYS = ("response_metadata", "usage_metadata")
+
+
+def _strip_volatile(obj):
+    if isinstance(obj, dict):
+        return {k: _strip_volatile(v) for k, v in obj.items()
+                if k not in _VOLATILE_KEYS and not (k == "id" and isinstance(v, str))}
+    if isinstance(obj, list):
+        return [_strip_volatile(v) for v in obj]
+    return obj
+
+
+def normalize_prompt(prompt: str) -> str:
+    """归一化 langchain 传给缓存的提示词(聊天模型为序列化的消息列表).
+
+    去掉消息 id 等每次运行都会变化的字段, 并把 "YYYY-MM-DD HH:MM:SS" 归一化为日期.
+    """
+    try:
+        prompt = json.dumps(_strip_volatile(json.loads(prompt)), ensure_ascii=False, sort_keys=True)
+    except json.JSONDecodeError:
+        pass
+    return DATE_TIME_PATTERN.sub(r'\1', prompt)
+
+
+class ResponseCache(BaseCache):
+    """模型回复缓存, 保存在 cache_store 的 llm 命名空间中.
+
+    键为归一化后的消息列表 + 模型参数(llm_string, 包含模型名称与绑定的工具) + 日记与计划文件的版本.
+    第一步模型调用时还没有任何工具结果, 消息列表与日记内容无关, 所以键中要包含文件版本,
+    日记或计划修改后整轮对话都重新调用模型(以整个文件为单位, 修改其他日期的内容也会使缓存失效).
+    """
+
+    def __init__(self, diary_file: str | None = None, plan_file: str | None = None, ttl: float | None = DEFAULT_TTL):
+        self.diary_file = diary_file
+        self.plan_file = plan_file
+        self.ttl = ttl
+        # 计划文件的版本: (mtime_ns, size, 内容哈希), 文件未变化时不重新计算
+        self._plan_version = None
+
+    def _versions(self) -> str:
+        versions = []
+        if self.diary_file:
+            try:
+                versions.append(diary_store.version(self.diary_file))
+            except OSError:
+                versions.append("")
+        if self.plan_file:
+            try:
+                st = os.stat(self.plan_file)
+                if self._plan_version is None or self._plan_version[:2] != (st.st_mtime_ns, st.st_size):
+                    with open(self.plan_file, "rb") as f:
+                        self._plan_version = (st.st_mtime_ns, st.st_size, hashlib.sha1(f.read()).hexdigest())
+                versions.append(self._plan_version[2])
+            except OSError:
+                versions.append("")
+        return "\n".join(versions)
+
+    def _key(self, prompt: str, llm_string: str) -> str:
+        return hashlib.sha1(f"{normalize_prompt(prompt)}\n{llm_string}\n{self._versions()}".encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Sequence[Generation] | None:
+        value = cache_store.get("llm", self._key(prompt, llm_string))
+        if value is None:
+            return None
+        try:
+            return [loads(g) for g in value]
+        except Exception as e:
+            logger.error(f"##### Failed to load cached llm response: {e}")
+            return None
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        try:
+            cache_store.set("llm", self._key(prompt, llm_string), [dumps(g) for g in return_val], ttl=self.ttl)
+        except Exception as e:
+            logger.error(f"##### Failed to save llm response: {e}")
+
+    def clear(self, **kwargs: Any) -> None:
+        cache_store.clear("llm")
@@ -0,0 +1,221 @@
+import time
+import atexit
+import smtplib
+import threading
+from collections import deque
+from email.mime.text import MIMEText
+from utils import logger
+
+# 第一封邮件入队后再等待多久(秒), 把这段时间内的通知合并为一批, 用同一个连接发送
+BATCH_WINDOW = 1.0
+# 连接空闲多久(秒)后主动断开; 服务器通常几分钟后就会断开空闲连接
+KEEPALIVE = 60
+# 发送失败(断线, 4xx 临时错误)时的重试次数与等待时间(秒), 连续失败时逐步加倍
+MAX_ATTEMPTS = 4
+RETRY_DELAY = 2
+MAX_RETRY_DELAY = 60
+# 进程退出时等待队列发送完毕的最长时间(秒)
+FLUSH_TIMEOUT = 30
+
+
+class SmtpSender:
+    """通知邮件的发送队列: email_send_notification 只把邮件放入队列就返回, 由后台线程发送.
+
+    后台线程复用已登录的 SMTP 连接, 把 batch_window 秒内入队的邮件作为一批连续发送,
+    断线或临时错误时重连并退避重试, 5xx 等永久错误不重试. 进程退出时等待队列发送完毕.
+
+    .env 配置:
+        EMAIL_SMTP_SERVER, EMAIL_SMTP_PORT: SMTP 服务器与端口(端口默认 465(SSL) 或 25).
+        EMAIL_SMTP_SSL: 设为 0 时使用明文连接, 用于本地的测试服务器(如 aiosmtpd).
+        EMAIL_ACCOUNT, EMAIL_RECEIVE_KEY: 发件账号与授权码; 服务器不支持 AUTH 时不登录.
+    """
+
+    def __init__(self, env: dict, batch_window: float = BATCH_WINDOW, keepalive: float = KEEPALIVE):
+        self.server = env["EMAIL_SMTP_SERVER"]
+        self.use_ssl = str(env.get("EMAIL_SMTP_SSL", "1")).strip() not in ("0", "false", "no")
+        self.port = int(env.get("EMAIL_SMTP_PORT") or (465 if self.use_ssl else 25))
+        self.account = env["EMAIL_ACCOUNT"]
+        self.password = env.get("EMAIL_RECEIVE_KEY", "")
+        self.batch_window = batch_window
+        self.keepalive = keepalive
+        self._cond = threading.Condition()
+        self._queue: deque[MIMEText] = deque()
+        # 已入队但尚未处理完(发送成功或放弃)的邮件数
+        self._pending = 0
+        # 正在 flush() 中等待的调用方数量, 大于 0 时不再等待合并窗口
+        self._flushers = 0
+        self._closing = False
+        self._thread = None
+        self._conn = None
+
+    def send(self, to: str, subject: str, body: str) -> None:
+        """把一封纯文本邮件放入发送队列, 立即返回."""
+        msg = MIMEText(body, 'plain', 'utf-8')
+        msg['Subject'] = subject
+        msg['From'] = self.account
+        msg['To'] = to
+        with self._cond:
+            if self._closing:
+                raise RuntimeError("sender is closed")
+            self._queue.append(msg)
+            self._pending += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="SmtpSender", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+        logger.debug(f"##### Notification email queued to {to} with subject: {subject}")
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """等待队列中的邮件处理完毕, 超时返回 False."""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._cond:
+            self._flushers += 1
+            self._cond.notify_all()
+            try:
+                while self._pending:
+                    remaining = deadline - time.monotonic() if deadline is not None else None
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+            finally:
+                self._flushers -= 1
+        return True
+
+    def close(self, timeout: float = FLUSH_TIMEOUT) -> None:
+        """发送完队列中的邮件(最多等待 timeout 秒)后停止后台线程并断开连接."""
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        if not self.flush(timeout):
+            logger.error(f"##### {self._pending} notification emails not sent before exit")
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        self._disconnect()
+
+    # --------------------------------------------------------------------------
+    # 后台线程
+    # --------------------------------------------------------------------------
+    def _next_batch(self) -> list[MIMEText] | None:
+        """等待下一批邮件; 空闲超过 keepalive 时断开连接. 关闭且队列为空时返回 None."""
+        while True:
+            idle = None
+            with self._cond:
+                while not self._queue:
+                    if self._closing:
+                        return None
+                    if not self._cond.wait(self.keepalive) and not self._queue and self._conn is not None:
+                        # 在锁外断开: QUIT 可能阻塞到超时, 期间 send/flush 不应等待
+                        idle, self._conn = self._conn, None
+                        break
+                if idle is None:
+                    # 等待合并窗口, 期间有 flush/close 时立即发送
+                    deadline = time.monotonic() + self.batch_window
+                    while not self._closing and not self._flushers:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    batch = list(self._queue)
+                    self._queue.clear()
+                    return batch
+            self._quit(idle)
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                break
+            logger.debug(f"##### Sending {len(batch)} notification emails")
+            for msg in batch:
+                self._deliver(msg)
+                with self._cond:
+                    self._pending -= 1
+                    self._cond.notify_all()
+        self._disconnect()
+
+    def _connection(self) -> smtplib.SMTP:
+        """返回已登录的连接, 没有或已失效时重新连接."""
+        if self._conn is not None:
+            try:
+                if self._conn.noop()[0] == 250:
+                    return self._conn
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._disconnect()
+
+        if self.use_ssl:
+            conn = smtplib.SMTP_SSL(self.server, self.port, timeout=30)
+        else:
+            conn = smtplib.SMTP(self.server, self.port, timeout=30)
+        try:
+            conn.ehlo()
+            if conn.has_extn("auth"):
+                conn.login(self.account, self.password)
+        except Exception:
+            conn.close()
+            raise
+        logger.debug(f"##### Connected to SMTP server: {self.server}:{self.port}")
+        self._conn = conn
+        return conn
+
+    def _disconnect(self) -> None:
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._quit(conn)
+
+    @staticmethod
+    def _quit(conn: smtplib.SMTP) -> None:
+        try:
+            conn.quit()
+        except (smtplib.SMTPException, OSError):
+            conn.close()
+
+    def _deliver(self, msg: MIMEText) -> bool:
+        """发送一封邮件, 失败时退避重试; 返回是否发送成功."""
+        delay = RETRY_DELAY
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                self._connection().sendmail(msg['From'], msg['To'], msg.as_string())
+                logger.debug(f"##### Notification email sent to {msg['To']} with subject: {msg['Subject']}")
+                return True
+            except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused) as e:
+                # SMTPRecipientsRefused 没有 smtp_code, 收件人全部被拒绝视为永久错误
+                if getattr(e, "smtp_code", 550) >= 500:
+                    logger.error(f"##### Failed to send notification email {msg['Subject']!r}: {e}")
+                    return False
+                error = e
+            except (smtplib.SMTPException, OSError) as e:
+                error = e
+            self._disconnect()
+            if attempt < MAX_ATTEMPTS:
+                logger.warn(f"##### Failed to send notification email: {error}, retrying in {delay}s")
+                time.sleep(delay)
+                delay = min(delay * 2, MAX_RETRY_DELAY)
+        logger.error(f"##### Failed to send notification email {msg['Subject']!r} after {MAX_ATTEMPTS} attempts: {error}")
+        return False
+
+
+_sender = None
+_sender_lock = threading.Lock()
+
+
+def notification_sender(env: dict) -> SmtpSender:
+    """进程内共享的发送队列, 第一次使用时创建, 进程退出时发送完剩余邮件."""
+    global _sender
+    with _sender_lock:
+        if _sender is None:
+            _sender = SmtpSender(env)
+            atexit.register(_sender.close)
+        return _sender
+
+
+def close_notification_sender() -> None:
+    """发送完共享队列中的邮件后关闭它, 没有创建过时什么也不做.
+    用于退出时不执行 atexit 的进程(batch 命令的工作进程)."""
+    global _sender
+    with _sender_lock:
+        sender, _sender = _sender, None
+    if sender is not None:
+        atexit.unregister(sender.close)
+        sender.close()
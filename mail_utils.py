@@ -0,0 +1,198 @@
+import os
+import time
+import codecs
+import quopri
+import binascii
+from typing import Iterable, Iterator
+from email.header import decode_header
+from email.message import Message
+from email.parser import BytesHeaderParser
+from utils import logger
+from cache_store import cache_store
+
+# 已处理邮件的 Message-ID 保留 180 天, POP3 与 IMAP 两条路径共用, 避免同一封邮件被处理两次
+SEEN_MESSAGE_TTL = 180 * 24 * 3600
+# mail-watch 守护进程的心跳有效期(秒), 超过后认为守护进程已退出
+WATCHER_HEARTBEAT_TTL = 15 * 60
+
+
+def decode_subject(value: str | None) -> str:
+    """解码邮件主题."""
+    if not value:
+        return ""
+    subject, encoding = decode_header(value)[0]
+    if isinstance(subject, bytes):
+        subject = subject.decode(encoding if encoding else "utf-8", errors="replace")
+    return subject
+
+
+def sender_address(value: str | None) -> str:
+    """从 From 头中取出发件人邮箱地址."""
+    return (value or "").split("<")[-1].rstrip(">").strip()
+
+
+# ------------------------------------------------------------------------------
+# 正文提取: 按行流式扫描 MIME 结构, 找到第一个不是附件的 text/plain 部分就返回.
+# 附件等其他部分只是逐行跳过, 不会被保存或解码, 大附件的邮件也只占用很少的内存.
+# ------------------------------------------------------------------------------
+# 声明的字符集解码失败时依次尝试的编码
+FALLBACK_ENCODINGS = ['utf-8', 'gbk', 'gb2312']
+
+
+def _read_headers(lines: Iterator[bytes]) -> Message:
+    """读取一组头部(直到空行), 返回只有头部的 Message."""
+    buf = []
+    for line in lines:
+        line = line.rstrip(b"\r\n")
+        if not line:
+            break
+        buf.append(line)
+    return BytesHeaderParser().parsebytes(b"\r\n".join(buf) + b"\r\n\r\n")
+
+
+def _skip_to_boundary(lines: Iterator[bytes], delimiter: bytes, close: bytes) -> bytes | None:
+    """跳过各行直到分隔行, 返回遇到的分隔行; 到达结尾返回 None."""
+    for line in lines:
+        line = line.rstrip(b"\r\n")
+        if line == delimiter or line == close:
+            return line
+    return None
+
+
+def _is_text_part(headers: Message) -> bool:
+    return headers.get_content_type() == "text/plain" and "attachment" not in str(headers.get("Content-Disposition"))
+
+
+def _decode_text(headers: Message, body: list[bytes]) -> str:
+    encoding = str(headers.get("Content-Transfer-Encoding", "")).strip().lower()
+    try:
+        if encoding == "base64":
+            payload = binascii.a2b_base64(b"".join(line.strip() for line in body))
+        elif encoding == "quoted-printable":
+            payload = quopri.decodestring(b"\n".join(body))
+        else:
+            payload = b"\n".join(body)
+    except (binascii.Error, ValueError) as e:
+        logger.error(f"##### Failed to decode email body: {e}")
+        return ""
+
+    # 先用声明的字符集, 再尝试常见编码
+    encodings = list(FALLBACK_ENCODINGS)
+    charset = headers.get_content_charset()
+    if charset:
+        try:
+            encodings.insert(0, codecs.lookup(charset).name)
+        except LookupError:
+            logger.warn(f"##### Unknown email charset: {charset}")
+    for encoding in encodings:
+        try:
+            return payload.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    # 如果所有编码都失败，使用latin-1作为兜底
+    return payload.decode('latin-1', errors='replace')
+
+
+def _multipart_text(lines: Iterator[bytes], boundary: str) -> str | None:
+    """在 multipart 中查找正文, 找到即返回(不再读取剩余部分); 没有则读到本层结束并返回 None."""
+    delimiter = b"--" + boundary.encode("ascii", errors="replace")
+    close = delimiter + b"--"
+    line = _skip_to_boundary(lines, delimiter, close)  # 跳过 preamble
+    while line == delimiter:
+        headers = _read_headers(lines)
+        if headers.get_content_maintype() == "multipart" and headers.get_boundary():
+            text = _multipart_text(lines, headers.get_boundary())
+            if text is not None:
+                return text
+            line = _skip_to_boundary(lines, delimiter, close)
+        elif _is_text_part(headers):
+            body = []
+            for line in lines:
+                line = line.rstrip(b"\r\n")
+                if line == delimiter or line == close:
+                    break
+                body.append(line)
+            return _decode_text(headers, body)
+        else:
+            line = _skip_to_boundary(lines, delimiter, close)
+    return None
+
+
+def extract_text_body(lines: Iterable[bytes]) -> tuple[Message, str]:
+    """从邮件的原始行中流式提取邮件头与正文(第一个不是附件的 text/plain 部分).
+
+    Args:
+        lines: The raw lines of the message (with or without line endings), may be a lazy iterator.
+
+    Returns:
+        The (headers, body) of the message, body is "" if there is no text/plain part.
+    """
+    lines = iter(lines)
+    headers = _read_headers(lines)
+    if headers.get_content_maintype() == "multipart" and headers.get_boundary():
+        return headers, _multipart_text(lines, headers.get_boundary()) or ""
+    if _is_text_part(headers):
+        return headers, _decode_text(headers, [line.rstrip(b"\r\n") for line in lines])
+    return headers, ""
+
+
+def pop_retr_lines(pop, which: int) -> Iterator[bytes]:
+    """与 poplib.POP3.retr 相同, 但逐行产出邮件内容, 不在内存中保存整封邮件.
+
+    调用方不再需要剩余内容时, 也必须把迭代器读完(丢弃), 才能继续发送下一条命令.
+    """
+    pop._putcmd(f"RETR {which}")
+    pop._getresp()
+    line, _ = pop._getline()
+    while line != b".":
+        if line[:2] == b"..":
+            line = line[1:]
+        yield line
+        line, _ = pop._getline()
+
+
+# ------------------------------------------------------------------------------
+# 暂存区: mail-watch 收到的日记片段暂存在 cache_store 的 mail_fragments 命名空间中,
+# email_receive_diary_pop 直接从这里取, 不用在对话中等待邮箱.
+# ------------------------------------------------------------------------------
+def is_seen_message(message_id: str | None) -> bool:
+    return bool(message_id) and cache_store.get("mail_seen", message_id) is not None
+
+
+def mark_seen_message(message_id: str | None) -> None:
+    if message_id:
+        cache_store.set("mail_seen", message_id, 1, ttl=SEEN_MESSAGE_TTL)
+
+
+def stage_fragment(key: str, message_id: str | None, subject: str, date: str, body: str) -> None:
+    """暂存一个日记片段. key 在暂存区内唯一(如 "账号:UIDVALIDITY:UID")."""
+    cache_store.set("mail_fragments", key, {
+        "message_id": message_id or "",
+        "subject": subject,
+        "date": date,
+        "body": body,
+    })
+    mark_seen_message(message_id)
+
+
+def staged_fragments() -> list[tuple[str, dict]]:
+    """暂存的日记片段: [(key, 片段), ...], 按邮件日期排序. 片段写入日记后再用 clear_staged_fragments 删除."""
+    return sorted(cache_store.items("mail_fragments"), key=lambda item: item[1].get("date", ""))
+
+
+def clear_staged_fragments(keys: list[str]) -> None:
+    for key in keys:
+        cache_store.delete("mail_fragments", key)
+
+
+def set_watcher_heartbeat() -> None:
+    cache_store.set("mail", "watcher", {"pid": os.getpid(), "time": time.time()}, ttl=WATCHER_HEARTBEAT_TTL)
+
+
+def clear_watcher_heartbeat() -> None:
+    cache_store.delete("mail", "watcher")
+
+
+def watcher_running() -> bool:
+    """mail-watch 守护进程是否在运行(心跳未过期)."""
+    return cache_store.get("mail", "watcher") is not None
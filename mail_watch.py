@@ -0,0 +1,180 @@
+import io
+import time
+import ssl
+import select
+import imaplib
+import email.utils
+from dotenv import dotenv_values
+from utils import logger
+from cache_store import cache_store
+from mail_utils import (decode_subject, extract_text_body, is_seen_message, mark_seen_message, stage_fragment,
+                        set_watcher_heartbeat, clear_watcher_heartbeat)
+
+# RFC 2177 建议客户端至少每 29 分钟重新发起一次 IDLE; 这里更短, 同时用于刷新心跳
+IDLE_TIMEOUT = 5 * 60
+# 断线重连的等待时间(秒), 连续失败时逐步加倍
+RECONNECT_DELAY = 5
+MAX_RECONNECT_DELAY = 300
+
+
+class MailWatcher:
+    """mail-watch 守护进程: 保持 IMAP IDLE 连接, 新邮件到达时取回来自 EMAIL_ACCOUNT_PEER 的邮件,
+    解码正文后暂存在 cache_store 中, email_receive_diary_pop 调用时即可直接返回.
+
+    .env 配置:
+        EMAIL_IMAP_SERVER: IMAP 服务器(默认由 EMAIL_RECV_SERVER 的 pop. 换成 imap. 得到).
+        EMAIL_IMAP_PORT: 端口, 默认 993(SSL) 或 143.
+        EMAIL_IMAP_SSL: 设为 0 时使用明文连接, 用于本地的测试服务器.
+        EMAIL_ACCOUNT, EMAIL_RECEIVE_KEY, EMAIL_ACCOUNT_PEER: 同 POP3.
+    """
+
+    def __init__(self, env: dict, idle_timeout: float = IDLE_TIMEOUT):
+        self.account = env["EMAIL_ACCOUNT"]
+        self.password = env["EMAIL_RECEIVE_KEY"]
+        self.peer = env["EMAIL_ACCOUNT_PEER"]
+        self.server = env.get("EMAIL_IMAP_SERVER") or env["EMAIL_RECV_SERVER"].replace("pop.", "imap.", 1)
+        self.use_ssl = str(env.get("EMAIL_IMAP_SSL", "1")).strip() not in ("0", "false", "no")
+        self.port = int(env.get("EMAIL_IMAP_PORT") or (993 if self.use_ssl else 143))
+        self.idle_timeout = idle_timeout
+        self._uidvalidity = ""
+        self._stopped = False
+
+    def connect(self) -> imaplib.IMAP4:
+        cls = imaplib.IMAP4_SSL if self.use_ssl else imaplib.IMAP4
+        imap = cls(self.server, self.port)
+        imap.login(self.account, self.password)
+        # 126.com/163.com 要求登录后发送 ID 命令, 否则 SELECT 会报 "Unsafe Login"
+        if "ID" in imap.capabilities:
+            imap.xatom("ID", '("name" "aid" "version" "1.0")')
+        imap.select("INBOX")
+        uidvalidity = imap.response("UIDVALIDITY")[1][0]
+        self._uidvalidity = uidvalidity.decode() if uidvalidity else ""
+        logger.debug(f"##### Connected to IMAP server: {self.server}:{self.port}")
+        return imap
+
+    def _state_key(self) -> str:
+        return f"imap_state:{self.account}"
+
+    def sync(self, imap: imaplib.IMAP4) -> int:
+        """取回上次同步之后到达的发件人邮件并暂存, 返回暂存的片段数."""
+        uidvalidity = self._uidvalidity
+        state = cache_store.get("mail", self._state_key()) or {}
+        # UIDVALIDITY 变化时旧的 UID 失效, 从头检查(已处理过的邮件由 Message-ID 过滤)
+        last_uid = state.get("last_uid", 0) if state.get("uidvalidity") == uidvalidity else 0
+
+        status, data = imap.uid("SEARCH", None, f"UID {last_uid + 1}:*", "FROM", f'"{self.peer}"')
+        if status != "OK":
+            raise imaplib.IMAP4.error(f"search failed: {data}")
+        # "n:*" 在没有新邮件时也会返回最大的 UID, 需要过滤
+        uids = sorted(int(uid) for uid in (data[0] or b"").split() if int(uid) > last_uid)
+
+        staged = 0
+        for uid in uids:
+            status, data = imap.uid("FETCH", str(uid), "(BODY.PEEK[])")
+            raw = next((part[1] for part in data if isinstance(part, tuple)), None)
+            if status == "OK" and raw is not None:
+                headers, body = extract_text_body(io.BytesIO(raw))
+                message_id = headers["Message-ID"]
+                if not is_seen_message(message_id):
+                    if body:
+                        subject = decode_subject(headers["Subject"])
+                        date = email.utils.parsedate_to_datetime(headers["Date"]).isoformat() if headers["Date"] else ""
+                        stage_fragment(f"{self.account}:{uidvalidity}:{uid:010d}", message_id, subject, date, body)
+                        logger.info(f"##### Staged email from {self.peer} with subject: {subject}")
+                        staged += 1
+                    else:
+                        mark_seen_message(message_id)
+            cache_store.set("mail", self._state_key(), {"uidvalidity": uidvalidity, "last_uid": uid})
+        return staged
+
+    @staticmethod
+    def _readable(imap: imaplib.IMAP4, timeout: float) -> bool:
+        """等待服务器的下一行, 最多 timeout 秒; 有数据可读时返回 True."""
+        # imaplib 通过带缓冲的 imap.file 读取: 与 "+ idling" 同一次读到的 "* N EXISTS" 留在缓冲区中,
+        # SSL 连接也可能有解密后未读取的数据, select 都看不到. 先以非阻塞方式 peek 缓冲区.
+        sock = imap.sock
+        sock_timeout = sock.gettimeout()
+        sock.settimeout(0)
+        try:
+            if imap.file.peek(1):
+                return True
+        except (BlockingIOError, ssl.SSLWantReadError):
+            pass
+        finally:
+            sock.settimeout(sock_timeout)
+        return bool(select.select([sock], [], [], timeout)[0])
+
+    def idle(self, imap: imaplib.IMAP4) -> bool:
+        """发送 IDLE 并等待, 服务器通知有新邮件(EXISTS)时返回 True, 超时返回 False."""
+        tag = imap._new_tag()
+        imap.send(tag + b" IDLE\r\n")
+        line = imap.readline()
+        if not line.startswith(b"+"):
+            raise imaplib.IMAP4.abort(f"IDLE rejected: {line!r}")
+
+        # 用 select 等待而不是给 socket 设超时: 读超时后 makefile 得到的文件对象不能再使用
+        has_new = False
+        deadline = time.monotonic() + self.idle_timeout
+        while not has_new:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if not self._readable(imap, remaining):
+                break
+            line = imap.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("connection closed during IDLE")
+            has_new = line.startswith(b"*") and line.rstrip().endswith(b"EXISTS")
+
+        imap.send(b"DONE\r\n")
+        while True:
+            line = imap.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("connection closed after IDLE")
+            if line.startswith(tag):
+                break
+        return has_new
+
+    def run(self) -> None:
+        """循环: 连接 → 同步 → IDLE 等待新邮件 → 同步..., 断线后自动重连, Ctrl-C 退出."""
+        delay = RECONNECT_DELAY
+        imap = None
+        try:
+            while not self._stopped:
+                try:
+                    imap = self.connect()
+                    if "IDLE" not in imap.capabilities:
+                        logger.warn("##### IMAP server does not support IDLE, polling instead.")
+                    delay = RECONNECT_DELAY
+                    while not self._stopped:
+                        set_watcher_heartbeat()
+                        self.sync(imap)
+                        if "IDLE" in imap.capabilities:
+                            self.idle(imap)
+                        else:
+                            time.sleep(self.idle_timeout)
+                            imap.noop()
+                except (imaplib.IMAP4.error, OSError) as e:
+                    logger.error(f"##### mail-watch: {e}, reconnecting in {delay}s")
+                    if imap is not None:
+                        try:
+                            imap.shutdown()
+                        except OSError:
+                            pass
+                        imap = None
+                    time.sleep(delay)
+                    delay = min(delay * 2, MAX_RECONNECT_DELAY)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            clear_watcher_heartbeat()
+
+    def stop(self) -> None:
+        self._stopped = True
+
+
+def main() -> None:
+    env_vars = dotenv_values(".env")
+    watcher = MailWatcher(env_vars)
+    logger.info(f"mail-watch: 监视 {watcher.account} 中来自 {watcher.peer} 的邮件(Ctrl-C 退出)")
+    watcher.run()
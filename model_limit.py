@@ -0,0 +1,39 @@
+"""模型请求的并发限制.
+
+batch 命令创建一个跨进程的信号量, 放在 AidContext.model_semaphore 中. agent 的模型调用
+(aid_batch.ModelConcurrencyMiddleware), 工具中的模型调用(get_plan, 日记摘要)与历史压缩的摘要请求
+都先获取一个名额. 信号量为 None(普通对话)时不限制.
+"""
+import asyncio
+import contextlib
+
+
+def context_semaphore(runtime) -> object | None:
+    """取出 runtime.context 中的信号量, 没有时返回 None."""
+    return getattr(getattr(runtime, "context", None), "model_semaphore", None)
+
+
+@contextlib.contextmanager
+def model_slot(semaphore):
+    """在同步代码中(如线程池中的摘要生成)占用一个模型请求名额."""
+    if semaphore is None:
+        yield
+        return
+    semaphore.acquire()
+    try:
+        yield
+    finally:
+        semaphore.release()
+
+
+@contextlib.asynccontextmanager
+async def amodel_slot(semaphore):
+    """异步版本: 等待信号量会阻塞, 放在线程中等待, 不阻塞事件循环."""
+    if semaphore is None:
+        yield
+        return
+    await asyncio.to_thread(semaphore.acquire)
+    try:
+        yield
+    finally:
+        semaphore.release()
@@ -0,0 +1,114 @@
+import re
+
+# 标题行: "## 2026.01计划"
+HEADING_PATTERN = re.compile(r'^(#{1,6})\s*(.*?)\s*$')
+# 月度计划: "2026.01计划", "2026-1月计划", "2026年1月计划"
+MONTH_PLAN_PATTERN = re.compile(r'(\d{4})\s*(?:[.\-/]|年)\s*(\d{1,2})\s*月?份?\s*计划')
+# 季度计划: "2026.S1计划", "2026-Q1计划", "2026年第1季度计划"
+QUARTER_PLAN_PATTERN = re.compile(r'(\d{4})\s*(?:[.\-/]|年)?\s*(?:[SsQq]\s*([1-4])|第\s*([1-4一二三四])\s*季度?)\s*计划')
+# 年度计划: "2026年计划", "2026年度计划", "2026计划"
+YEAR_PLAN_PATTERN = re.compile(r'(\d{4})\s*年?度?\s*计划')
+
+# 计划日期参数: YYYY-MM, YYYY-Sn/YYYY-Qn, YYYY
+MONTH_DATE_PATTERN = re.compile(r'^(\d{4})\s*[.\-/年]\s*(\d{1,2})\s*月?$')
+QUARTER_DATE_PATTERN = re.compile(r'^(\d{4})\s*[.\-/]?\s*[SsQq]\s*([1-4])$')
+YEAR_DATE_PATTERN = re.compile(r'^(\d{4})\s*年?$')
+
+_CHINESE_NUMBERS = {"一": "1", "二": "2", "三": "3", "四": "4"}
+
+
+def heading_key(title: str) -> str | None:
+    """把计划标题转换为键: 月度 "YYYY-MM", 季度 "YYYY-Qn", 年度 "YYYY"; 不是计划标题则返回 None."""
+    m = MONTH_PLAN_PATTERN.search(title)
+    if m and 1 <= int(m.group(2)) <= 12:
+        return f"{m.group(1)}-{int(m.group(2)):02d}"
+    m = QUARTER_PLAN_PATTERN.search(title)
+    if m:
+        quarter = m.group(2) or _CHINESE_NUMBERS.get(m.group(3), m.group(3))
+        return f"{m.group(1)}-Q{quarter}"
+    m = YEAR_PLAN_PATTERN.search(title)
+    if m:
+        return m.group(1)
+    return None
+
+
+def date_key(date: str) -> str | None:
+    """把 get_plan 的日期参数转换为键, 格式无法识别则返回 None."""
+    date = date.strip()
+    m = MONTH_DATE_PATTERN.match(date)
+    if m and 1 <= int(m.group(2)) <= 12:
+        return f"{m.group(1)}-{int(m.group(2)):02d}"
+    m = QUARTER_DATE_PATTERN.match(date)
+    if m:
+        return f"{m.group(1)}-Q{m.group(2)}"
+    m = YEAR_DATE_PATTERN.match(date)
+    if m:
+        return m.group(1)
+    return None
+
+
+class PlanIndex:
+    """计划文件的章节索引: 键 → 章节原文.
+
+    章节从计划标题行开始, 到下一个同级或更高级的标题为止(包含其中的子标题).
+    """
+
+    def __init__(self, text: str):
+        self.sections: dict[str, str] = {}
+        lines = text.splitlines(keepends=True)
+        headings = []  # [(行号, 标题级别, 键)]
+        for i, line in enumerate(lines):
+            m = HEADING_PATTERN.match(line)
+            if m:
+                headings.append((i, len(m.group(1)), heading_key(m.group(2))))
+
+        for n, (start, level, key) in enumerate(headings):
+            if key is None or key in self.sections:
+                continue
+            end = next((i for i, lvl, _ in headings[n + 1:] if lvl <= level), len(lines))
+            self.sections[key] = "".join(lines[start:end]).strip()
+
+    def section(self, date: str) -> str | None:
+        """获取指定日期(YYYY-MM, YYYY-Sn/YYYY-Qn, YYYY)的计划原文, 没有对应章节则返回 None."""
+        key = date_key(date)
+        return self.sections.get(key) if key is not None else None
+
+
+def split_sections(text: str) -> list[tuple[str, str]]:
+    """按最高级别的标题切分文本, 返回 [(标题, 章节原文), ...]; 第一个标题之前的内容标题为空字符串."""
+    lines = text.splitlines(keepends=True)
+    headings = [(i, m) for i, m in ((i, HEADING_PATTERN.match(line)) for i, line in enumerate(lines)) if m]
+    if not headings:
+        return [("", text)]
+    level = min(len(m.group(1)) for _, m in headings)
+    starts = [(i, m.group(2)) for i, m in headings if len(m.group(1)) == level]
+    sections = []
+    if starts[0][0] > 0:
+        sections.append(("", "".join(lines[:starts[0][0]])))
+    for n, (start, title) in enumerate(starts):
+        end = starts[n + 1][0] if n + 1 < len(starts) else len(lines)
+        sections.append((title, "".join(lines[start:end])))
+    return sections
+
+
+def candidate_source(text: str, date: str) -> str:
+    """为 llm 提取计划挑选可能包含该时段计划的章节.
+
+    用于不符合约定格式的计划文件: 选出标题中含有年份及月份/季度数字的章节,
+    这样只有这些章节变化时提取结果才需要更新, 也减少发送给 llm 的内容. 没有匹配时返回全文.
+    """
+    key = date_key(date)
+    if key is None:
+        return text
+    year, _, period = key.partition("-")
+    number = str(int(period.lstrip("Q"))) if period else ""
+    pattern = re.compile(rf'(?<!\d)0?{number}(?!\d)') if number else None
+
+    chosen = []
+    for title, section in split_sections(text):
+        if year not in title:
+            continue
+        rest = title.replace(year, "", 1)
+        if pattern is None or pattern.search(rest):
+            chosen.append(section)
+    return "".join(chosen) if chosen else text
@@ -0,0 +1,128 @@
+import os
+import time
+import uuid
+import sqlite3
+import datetime
+from contextlib import asynccontextmanager
+from utils import logger
+
+SESSION_DIR = os.path.join(".", ".aid")
+SESSION_DB_NAME = "sessions.db"
+# 每个会话保留的最新 checkpoint 数; 恢复会话只需要最新的一个, 其余用于回溯
+KEEP_CHECKPOINTS = 10
+# 超过该天数未使用的会话在启动时删除, 可在 aid_config.json 中用 "session_ttl_days" 配置
+SESSION_TTL_DAYS = 30
+TITLE_CHARS = 40
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS aid_sessions (
+    thread_id  TEXT PRIMARY KEY,
+    title      TEXT NOT NULL DEFAULT '',
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    turns      INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+class SessionStore:
+    """工作区中持久保存的对话会话: .aid/sessions.db.
+
+    对话状态由 langgraph 的 AsyncSqliteSaver 写入同一个数据库(checkpoints/writes 表),
+    thread_id 即会话 ID; 这里另外记录会话的标题与使用时间, 用于列出, 恢复与清理会话.
+    数据库在第一次使用时才打开, 路径相对于当时的工作目录.
+    """
+
+    def __init__(self, session_dir: str = SESSION_DIR, keep_checkpoints: int = KEEP_CHECKPOINTS):
+        self.db_path = os.path.join(session_dir, SESSION_DB_NAME)
+        self.keep_checkpoints = keep_checkpoints
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _has_checkpoints(self, conn: sqlite3.Connection) -> bool:
+        # checkpoints 表由 AsyncSqliteSaver 在第一次写入时创建
+        return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'checkpoints'").fetchone() is not None
+
+    @staticmethod
+    def new_id() -> str:
+        # 时间便于辨认, 随机后缀避免同一秒启动的两次运行使用同一个会话
+        return f"{datetime.datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+
+    def resolve(self, session: str | None) -> str:
+        """会话参数对应的会话 ID: None 为新会话, "last" 为最近使用的会话, 其他为指定的会话(不存在则新建)."""
+        if session is None:
+            return self.new_id()
+        if session == "last":
+            row = self._connect().execute("SELECT thread_id FROM aid_sessions ORDER BY updated_at DESC LIMIT 1").fetchone()
+            if row is None:
+                logger.info("没有可恢复的会话, 开始新会话.")
+                return self.new_id()
+            return row[0]
+        return session
+
+    def touch(self, thread_id: str, user_input: str) -> None:
+        """记录会话的一轮对话, 第一轮的输入作为会话标题."""
+        now = time.time()
+        title = " ".join(user_input.split())[:TITLE_CHARS]
+        self._connect().execute(
+            "INSERT INTO aid_sessions (thread_id, title, created_at, updated_at, turns) VALUES (?, ?, ?, ?, 1) "
+            "ON CONFLICT(thread_id) DO UPDATE SET updated_at = excluded.updated_at, turns = turns + 1",
+            (thread_id, title, now, now))
+
+    def list(self) -> list[tuple[str, str, float, int]]:
+        """所有会话: [(会话 ID, 标题, 最近使用时间, 轮数), ...], 最近使用的在前."""
+        return self._connect().execute(
+            "SELECT thread_id, title, updated_at, turns FROM aid_sessions ORDER BY updated_at DESC").fetchall()
+
+    def prune(self, thread_id: str | None = None, max_age_days: float = SESSION_TTL_DAYS) -> None:
+        """删除超过 max_age_days 天未使用的会话(thread_id 除外); 指定 thread_id 时再把该会话的 checkpoint 裁剪到最新的几个."""
+        conn = self._connect()
+        has_checkpoints = self._has_checkpoints(conn)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            expired = [row[0] for row in conn.execute(
+                "SELECT thread_id FROM aid_sessions WHERE updated_at < ? AND thread_id IS NOT ?",
+                (time.time() - max_age_days * 86400, thread_id))]
+            for old in expired:
+                conn.execute("DELETE FROM aid_sessions WHERE thread_id = ?", (old,))
+                if has_checkpoints:
+                    conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (old,))
+                    conn.execute("DELETE FROM writes WHERE thread_id = ?", (old,))
+            if expired:
+                logger.debug(f"##### sessions: removed {len(expired)} expired sessions")
+
+            if thread_id is not None and has_checkpoints:
+                # checkpoint_id 按时间递增(uuid6), 按它排序即按时间排序
+                conn.execute(
+                    "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_id NOT IN "
+                    "(SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? ORDER BY checkpoint_id DESC LIMIT ?)",
+                    (thread_id, thread_id, self.keep_checkpoints))
+                conn.execute(
+                    "DELETE FROM writes WHERE thread_id = ? AND checkpoint_id NOT IN "
+                    "(SELECT checkpoint_id FROM checkpoints WHERE thread_id = ?)",
+                    (thread_id, thread_id))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @asynccontextmanager
+    async def checkpointer(self):
+        """打开会话数据库上的 AsyncSqliteSaver(需要 langgraph-checkpoint-sqlite)."""
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        async with AsyncSqliteSaver.from_conn_string(self.db_path) as saver:
+            yield saver
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
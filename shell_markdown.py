@@ -0,0 +1,228 @@
+"""流式 Markdown 的终端渲染(--shell): 模型回复分块到达, 按行或按时间片渲染为 ANSI 文本, 每次只写一次."""
+import re
+import sys
+import time
+import unicodedata
+
+# 不满一行的文本最多缓冲的秒数, 超过后把已能确定样式的部分写出
+FLUSH_INTERVAL = 0.05
+# 分隔线宽度
+HR_WIDTH = 40
+
+RESET = "\033[0m"
+BOLD = "\033[01;4m"
+ITALIC = "\033[03;36m"
+CODE = "\033[36m"
+HEADING = "\033[01;34m"
+BULLET = "\033[33m"
+DIM = "\033[02;37m"
+
+_FENCE_RE = re.compile(r"\s*(```|~~~)")
+_HEADING_RE = re.compile(r"\s*#{1,6}(\s|$)")
+_HR_RE = re.compile(r"\s*([-*_])(\s*\1){2,}\s*")
+_BULLET_RE = re.compile(r"(\s*)[-*+]\s+(.*)")
+_NUMBER_RE = re.compile(r"(\s*)(\d+[.)])\s+(.*)")
+_QUOTE_RE = re.compile(r"\s*>\s?(.*)")
+_TABLE_SEP_RE = re.compile(r"\s*:?-+:?\s*")
+# 行首为这些字符时, 要等整行到达才能确定行的类型(标题, 列表, 引用, 表格, 代码块...)
+_BLOCK_CHARS = "#-*+>|`~_0123456789"
+# 行内标记, 位于缓冲末尾时要等下一个字符才能确定含义
+_MARK_CHARS = "*_`"
+
+
+def display_width(text: str) -> int:
+    """终端显示宽度: 全角字符(中文等)占 2 列."""
+    return sum(2 if unicodedata.east_asian_width(c) in "WF" else 1 for c in text)
+
+
+class ShellMarkdownRenderer:
+    """把流式到达的 Markdown 渲染到终端.
+
+    状态(加粗, 斜体, 行内代码, 代码块, 表格)保存在实例中, 标记跨分块到达也能正确处理.
+    输出按行写出; 长行在缓冲超过 interval 秒后写出已能确定样式的部分. 每次写出只调用一次 write.
+    表格缓冲到结束后按列宽对齐输出. 每个回复使用一个实例, 结束时调用 close().
+    """
+
+    def __init__(self, stream=None, interval: float = FLUSH_INTERVAL):
+        self.stream = stream if stream is not None else sys.stdout
+        self.interval = interval
+        self._pending = ""
+        self._out = []
+        self._last_write = time.monotonic()
+        # 当前行已部分输出
+        self._line_open = False
+        self._line_style = ""
+        self._bold = False
+        self._italic = False
+        self._code = False
+        self._prev = " "
+        self._fence = None
+        self._table = []
+
+    def feed(self, text: str) -> None:
+        """追加一块文本. 有完整的行或缓冲超时时写出."""
+        self._pending += text
+        lines = self._complete_lines()
+        if not lines and time.monotonic() - self._last_write < self.interval:
+            return
+        for line in lines:
+            self._render_line(line)
+        self._render_partial()
+        self.flush()
+
+    def flush(self) -> None:
+        """写出已渲染的文本."""
+        if self._out:
+            self.stream.write("".join(self._out))
+            self.stream.flush()
+            self._out.clear()
+        self._last_write = time.monotonic()
+
+    def close(self) -> None:
+        """渲染剩余的文本(包括不完整的行与表格), 恢复终端样式并写出."""
+        for line in self._complete_lines():
+            self._render_line(line)
+        if self._pending or self._line_open:
+            line, self._pending = self._pending, ""
+            self._render_line(line, newline=False)
+        self._flush_table()
+        if self._fence is not None:
+            self._out.append(RESET)
+            self._fence = None
+        self.flush()
+
+    def _complete_lines(self) -> list[str]:
+        lines = self._pending.split("\n")
+        self._pending = lines.pop()
+        return lines
+
+    # ------------------------------------------------------------------------------
+    # 行
+    # ------------------------------------------------------------------------------
+    def _render_line(self, line: str, newline: bool = True) -> None:
+        if self._line_open:
+            # 行首已处理, 余下部分只做行内渲染(代码块中原样输出)
+            self._out.append(line if self._fence is not None else self._inline(line))
+        elif self._fence is not None:
+            if _FENCE_RE.match(line) and line.strip().startswith(self._fence):
+                self._out.append(f"{DIM}{line}")
+                self._fence = None
+            else:
+                self._out.append(f"{CODE}{line}")
+        elif line.strip().startswith("|"):
+            self._table.append(line)
+            return
+        else:
+            self._flush_table()
+            self._render_block(line)
+        self._end_line(newline)
+
+    def _render_block(self, line: str) -> None:
+        if m := _FENCE_RE.match(line):
+            self._fence = m.group(1)
+            self._out.append(f"{DIM}{line}")
+        elif _HEADING_RE.match(line):
+            self._line_style = HEADING
+            self._out.append(HEADING + self._inline(line))
+        elif _HR_RE.fullmatch(line):
+            self._out.append(DIM + "─" * HR_WIDTH)
+        elif m := _BULLET_RE.fullmatch(line):
+            self._out.append(f"{m.group(1)}{BULLET}•{RESET} {self._inline(m.group(2))}")
+        elif m := _NUMBER_RE.fullmatch(line):
+            self._out.append(f"{m.group(1)}{BULLET}{m.group(2)}{RESET} {self._inline(m.group(3))}")
+        elif m := _QUOTE_RE.fullmatch(line):
+            self._out.append(f"{DIM}│{RESET} {self._inline(m.group(1))}")
+        else:
+            self._out.append(self._inline(line))
+
+    def _end_line(self, newline: bool) -> None:
+        self._out.append(RESET + ("\n" if newline else ""))
+        self._line_open = False
+        self._line_style = ""
+        self._bold = self._italic = self._code = False
+        self._prev = " "
+
+    def _render_partial(self) -> None:
+        """输出不完整的行中已能确定样式的部分; 行首为块标记时等整行到达."""
+        if not self._pending or self._table:
+            return
+        if not self._line_open:
+            head = self._pending.lstrip()
+            if not head or head[0] in _BLOCK_CHARS:
+                return
+            if self._fence is not None:
+                self._out.append(CODE)
+            self._line_open = True
+        if self._fence is not None:
+            self._out.append(self._pending)
+            self._pending = ""
+            return
+        end = len(self._pending.rstrip(_MARK_CHARS))
+        self._out.append(self._inline(self._pending[:end]))
+        self._pending = self._pending[end:]
+
+    def _flush_table(self) -> None:
+        """按列宽对齐输出缓冲的表格."""
+        if not self._table:
+            return
+        rows = [[cell.strip() for cell in line.strip().strip("|").split("|")] for line in self._table]
+        self._table = []
+        plain = [[re.sub(r"\*\*|`", "", cell) for cell in row] for row in rows]
+        columns = max(len(row) for row in rows)
+        widths = [max((display_width(row[i]) for row in plain if i < len(row) and not _TABLE_SEP_RE.fullmatch(row[i])),
+                      default=1) for i in range(columns)]
+        bar = f"{DIM}│{RESET}"
+        for row, text in zip(rows, plain):
+            if all(_TABLE_SEP_RE.fullmatch(cell) for cell in row):
+                self._out.append(DIM + "┼".join("─" * (w + 2) for w in widths) + RESET + "\n")
+                continue
+            cells = []
+            for i, width in enumerate(widths):
+                cell = row[i] if i < len(row) else ""
+                width_text = text[i] if i < len(text) else ""
+                cells.append(f" {self._inline(cell)}{RESET}{' ' * (width - display_width(width_text))} ")
+                self._bold = self._italic = self._code = False
+                self._prev = " "
+            self._out.append(bar.join(cells) + "\n")
+
+    # ------------------------------------------------------------------------------
+    # 行内: **加粗**, *斜体* / _斜体_, `代码`
+    # ------------------------------------------------------------------------------
+    def _style(self) -> str:
+        return RESET + self._line_style + (BOLD if self._bold else "") + (ITALIC if self._italic else "")
+
+    def _emphasis(self, text: str, i: int) -> bool:
+        """text[i] 处的 * 或 _ 是否为斜体标记; 单词内部的 _ (如 file_path) 不是."""
+        c = text[i]
+        prev = text[i - 1] if i > 0 else self._prev
+        after = text[i + 1] if i + 1 < len(text) else " "
+        if not self._italic:
+            return not after.isspace() and (c == "*" or not prev.isalnum())
+        return not prev.isspace() and (c == "*" or not after.isalnum())
+
+    def _inline(self, text: str) -> str:
+        out = []
+        i = 0
+        while i < len(text):
+            c = text[i]
+            if self._code:
+                if c == "`":
+                    self._code = False
+                    out.append(self._style())
+                else:
+                    out.append(c)
+            elif c == "`":
+                self._code = True
+                out.append(RESET + CODE)
+            elif text.startswith("**", i):
+                self._bold = not self._bold
+                out.append(self._style())
+                i += 1
+            elif c in "*_" and self._emphasis(text, i):
+                self._italic = not self._italic
+                out.append(self._style())
+            else:
+                out.append(c)
+            self._prev = text[i]
+            i += 1
+        return "".join(out)
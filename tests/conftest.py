@@ -0,0 +1,28 @@
+import os
+import sys
+import datetime
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache_store import cache_store
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    """在临时目录中运行, .aid/cache 等相对路径都在其中; 共享的 cache_store 在前后各关闭一次, 重新打开."""
+    cache_store.close()
+    monkeypatch.chdir(tmp_path)
+    yield tmp_path
+    cache_store.close()
+
+
+def write_diary(path, days: dict[str, list[str]]) -> str:
+    """写入日记文件: {日期: [条目行, ...]}, 按给出的顺序."""
+    lines = []
+    for date, items in days.items():
+        weekday = "一二三四五六日"[datetime.date.fromisoformat(date).weekday()]
+        lines.append(f"- {date} 周{weekday}：\n")
+        lines.extend(f"    - {item}\n" for item in items)
+    path.write_text("".join(lines), encoding="utf-8")
+    return str(path)
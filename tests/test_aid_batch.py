@@ -0,0 +1,19 @@
+from aid_batch import read_prompts, result_file_name
+
+
+def test_result_file_names_are_unique_per_workspace(tmp_path):
+    a = tmp_path / "a" / "diary"
+    b = tmp_path / "b" / "diary"
+
+    assert result_file_name(str(a)) != result_file_name(str(b))
+    assert result_file_name(str(a)).startswith("diary-")
+    assert result_file_name(str(a)).endswith(".jsonl")
+    # 同一工作区(相对路径或末尾的 "/")得到同一个文件名
+    assert result_file_name(str(a) + "/") == result_file_name(str(a))
+
+
+def test_read_prompts_skips_blank_and_comment_lines(tmp_path):
+    path = tmp_path / "prompts.txt"
+    path.write_text("# 每周回顾\n本周跑步几次?\n\n  总结本月  \n", encoding="utf-8")
+
+    assert read_prompts(str(path)) == ["本周跑步几次?", "总结本月"]
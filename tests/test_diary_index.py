@@ -0,0 +1,65 @@
+from conftest import write_diary
+from diary_index import build_diary_index, update_diary_index
+from diary_reader import DiaryReader
+
+
+def _dates(entries):
+    return [e[0] for e in entries]
+
+
+def test_range_and_prefix(tmp_path):
+    path = write_diary(tmp_path / "diary.md", {
+        "2025-12-31": ["年末"],
+        "2026-01-01": ["元旦"],
+        "2026-01-15": ["月中"],
+        "2026-02-01": ["二月"],
+    })
+    index = build_diary_index(path)
+
+    assert _dates(index.range("2026-01-01", "2026-01-31")) == ["2026-01-01", "2026-01-15"]
+    assert _dates(index.range("2025-12-31", "2026-01-01")) == ["2025-12-31", "2026-01-01"]
+    assert index.range("2026-03-01", "2026-03-31") == []
+    assert _dates(index.prefix("2026-01")) == ["2026-01-01", "2026-01-15"]
+    assert _dates(index.prefix("2026")) == ["2026-01-01", "2026-01-15", "2026-02-01"]
+    assert index.lookup("2026-01-02") is None
+
+
+def test_entries_cover_the_day(tmp_path):
+    path = write_diary(tmp_path / "diary.md", {"2026-01-01": ["跑步：+2."], "2026-01-02": ["读书"]})
+    index = build_diary_index(path)
+    reader = DiaryReader(path)
+    try:
+        assert reader.read_entries([index.lookup("2026-01-01")]) == "- 2026-01-01 周四：\n    - 跑步：+2.\n"
+        assert reader.read_entries(index.prefix("2026-01")) == (tmp_path / "diary.md").read_text(encoding="utf-8")
+    finally:
+        reader.close()
+
+
+def _same_index(a, b):
+    return (a.entries, a.digest, a.size, a.tail_start, a.prefix_digest) == \
+        (b.entries, b.digest, b.size, b.tail_start, b.prefix_digest)
+
+
+def test_update_after_append(tmp_path):
+    days = {"2026-01-01": ["元旦"], "2026-01-02": ["上班"]}
+    path = write_diary(tmp_path / "diary.md", days)
+    index = build_diary_index(path)
+
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("    - 加班\n- 2026-01-03 周六：\n    - 休息\n")
+    updated = update_diary_index(index)
+
+    assert _dates(updated.entries) == ["2026-01-01", "2026-01-02", "2026-01-03"]
+    assert _same_index(updated, build_diary_index(path))
+
+
+def test_update_after_editing_earlier_days(tmp_path):
+    path = write_diary(tmp_path / "diary.md", {"2026-01-01": ["元旦"], "2026-01-02": ["上班"]})
+    index = build_diary_index(path)
+
+    # 修改最后一条之前的内容, 前缀哈希不一致, 需要重建
+    write_diary(tmp_path / "diary.md", {"2026-01-01": ["元旦, 看电影"], "2026-01-02": ["上班"]})
+    updated = update_diary_index(index)
+
+    assert _same_index(updated, build_diary_index(path))
+    assert updated.lookup("2026-01-02")[1] > index.lookup("2026-01-02")[1]
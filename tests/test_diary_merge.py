@@ -0,0 +1,64 @@
+from conftest import write_diary
+from diary_merge import format_fragment, merge_fragments
+
+
+def _diary(workspace):
+    return write_diary(workspace / "diary.md", {
+        "2026-01-19": ["跑步：+2."],
+        "2026-01-22": ["读书"],
+    })
+
+
+def _read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def test_format_fragment():
+    date, items = format_fragment("2026-01-20 周二：\n加班\n  - 修复bug\n-- \n签名", "2026-01-01")
+    assert date == "2026-01-20"
+    assert items == ["    - 加班", "      - 修复bug"]
+    assert format_fragment("跑步", "2026-01-01") == ("2026-01-01", ["    - 跑步"])
+
+
+def test_merge_into_existing_and_new_days(workspace):
+    path = _diary(workspace)
+
+    dates = merge_fragments(path, [
+        {"message_id": "<a@x>", "body": "2026-01-22\n跑步：+2."},
+        {"message_id": "<b@x>", "body": "2026-01-20\n加班"},
+        {"message_id": "<c@x>", "body": "2026-01-01\n元旦"},
+        {"message_id": "<d@x>", "body": "跑步", "date": "2026-01-25T08:00:00"},
+    ])
+
+    assert dates == ["2026-01-01", "2026-01-20", "2026-01-22", "2026-01-25"]
+    assert _read(path) == (
+        "- 2026-01-01 周四：\n    - 元旦\n"
+        "- 2026-01-19 周一：\n    - 跑步：+2.\n"
+        "- 2026-01-20 周二：\n    - 加班\n"
+        "- 2026-01-22 周四：\n    - 读书\n    - 跑步：+2.\n"
+        "- 2026-01-25 周日：\n    - 跑步\n"
+    )
+
+
+def test_merge_into_empty_diary(workspace):
+    path = str(workspace / "diary.md")
+    open(path, "w").close()
+
+    merge_fragments(path, [{"message_id": "<a@x>", "body": "2026-01-20\n加班"}])
+
+    assert _read(path) == "- 2026-01-20 周二：\n    - 加班"
+
+
+def test_merged_fragments_are_skipped(workspace):
+    path = _diary(workspace)
+    fragment = {"message_id": "<a@x>", "body": "2026-01-19\n早睡：+1."}
+
+    assert merge_fragments(path, [fragment, fragment]) == ["2026-01-19"]
+    assert merge_fragments(path, [fragment]) == []
+    # 没有 Message-ID 时以正文去重
+    assert merge_fragments(path, [{"body": "2026-01-19\n冥想"}]) == ["2026-01-19"]
+    assert merge_fragments(path, [{"body": "2026-01-19\n冥想"}]) == []
+
+    assert _read(path).count("早睡：+1.") == 1
+    assert _read(path).count("冥想") == 1
@@ -0,0 +1,29 @@
+import pytest
+from diary_period import period_range
+
+
+@pytest.mark.parametrize("period, expected", [
+    ("2026-01-19", ("2026-01-19", "2026-01-19")),
+    ("2024-02", ("2024-02-01", "2024-02-29")),
+    ("2026", ("2026-01-01", "2026-12-31")),
+    ("2026-W04", ("2026-01-19", "2026-01-25")),
+    ("2026w4", ("2026-01-19", "2026-01-25")),
+    ("2026-Q1", ("2026-01-01", "2026-03-31")),
+    ("2026-S4", ("2026-10-01", "2026-12-31")),
+    ("2026-01..2026-Q2", ("2026-01-01", "2026-06-30")),
+])
+def test_period_range(period, expected):
+    assert period_range(period) == expected
+
+
+def test_iso_week_53_crosses_the_year():
+    # 2026 年的 1 月 1 日是周四, 该 ISO 年有 53 周, 第 53 周延续到 2027 年
+    assert period_range("2026-W53") == ("2026-12-28", "2027-01-03")
+    # 2025-W01 从 2024 年开始
+    assert period_range("2025-W01") == ("2024-12-30", "2025-01-05")
+
+
+@pytest.mark.parametrize("period", ["2025-W53", "2026-13", "2026-Q5", "下个月", "2026-02..2026-01"])
+def test_invalid_periods(period):
+    with pytest.raises(ValueError):
+        period_range(period)
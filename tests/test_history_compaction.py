@@ -0,0 +1,48 @@
+import io
+import asyncio
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from aid_agent import build_agent, stream_reply, stream_reply_jsonl
+from history_compaction import HistoryCompactionMiddleware
+
+SUMMARY = "内部摘要-不应输出"
+PROMPTS = ["第一个问题" + "日记" * 300, "第二个问题" + "计划" * 300, "第三个问题"]
+
+
+def _agent():
+    """每轮: 一次回复; 从第二轮起, 回复之前先压缩历史(一次摘要请求)."""
+    replies = [AIMessage("回答一"), AIMessage(SUMMARY), AIMessage("回答二"), AIMessage(SUMMARY), AIMessage("回答三")]
+    llm = GenericFakeChatModel(messages=iter(replies))
+    compaction = HistoryCompactionMiddleware(llm, max_tokens=500, keep_turns=1)
+    return llm, build_agent(llm, [], [compaction])
+
+
+def test_summary_is_not_printed(capsys):
+    llm, agent = _agent()
+
+    async def run():
+        for prompt in PROMPTS:
+            await stream_reply(agent, llm, "", "", prompt, False)
+
+    asyncio.run(run())
+    out = capsys.readouterr().out
+
+    assert "回答一" in out and "回答二" in out and "回答三" in out
+    assert SUMMARY not in out
+    assert "之前对话的摘要" not in out
+
+
+def test_summary_is_not_emitted_as_jsonl():
+    llm, agent = _agent()
+    stream = io.StringIO()
+
+    async def run():
+        for prompt in PROMPTS:
+            await stream_reply_jsonl(agent, llm, "", "", prompt, stream=stream)
+
+    asyncio.run(run())
+    out = stream.getvalue()
+
+    assert '"text": "回答三"' in out
+    assert SUMMARY not in out
+    assert "之前对话的摘要" not in out
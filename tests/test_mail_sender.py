@@ -0,0 +1,169 @@
+import time
+import threading
+import socketserver
+import pytest
+import mail_sender
+from mail_sender import SmtpSender
+
+
+class SmtpStub(socketserver.ThreadingTCPServer):
+    """最小的明文 SMTP 服务器(不支持 AUTH), 记录连接数, 收到的邮件与 QUIT 次数."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SmtpHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.quits = 0
+        self.messages: list[bytes] = []
+        # 依次用于之后各次 MAIL FROM 的处理: "drop" 断开连接, 或返回的错误响应(如 "451 try later")
+        self.mail_faults: list[str] = []
+        # 回复 QUIT 前等待的秒数
+        self.quit_delay = 0.0
+
+
+class SmtpHandler(socketserver.StreamRequestHandler):
+    def reply(self, line: str) -> None:
+        self.wfile.write(line.encode() + b"\r\n")
+        self.wfile.flush()
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply("220 stub ready")
+        for line in self.rfile:
+            command = line.decode().strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250 stub")
+            elif command.startswith("MAIL FROM"):
+                with server.lock:
+                    fault = server.mail_faults.pop(0) if server.mail_faults else None
+                if fault == "drop":
+                    return
+                self.reply(fault or "250 OK")
+            elif command.startswith(("RCPT TO", "RSET", "NOOP")):
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 end with .")
+                data = []
+                for line in self.rfile:
+                    if line.rstrip(b"\r\n") == b".":
+                        break
+                    data.append(line)
+                with server.lock:
+                    server.messages.append(b"".join(data))
+                self.reply("250 queued")
+            elif command == "QUIT":
+                time.sleep(server.quit_delay)
+                with server.lock:
+                    server.quits += 1
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("502 not implemented")
+
+
+@pytest.fixture
+def smtp_server():
+    server = SmtpStub()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def fast_retry(monkeypatch):
+    monkeypatch.setattr(mail_sender, "RETRY_DELAY", 0.01)
+
+
+def _sender(server, **kwargs) -> SmtpSender:
+    host, port = server.server_address
+    return SmtpSender({
+        "EMAIL_SMTP_SERVER": host,
+        "EMAIL_SMTP_PORT": str(port),
+        "EMAIL_SMTP_SSL": "0",
+        "EMAIL_ACCOUNT": "me@example.com",
+    }, **kwargs)
+
+
+def _wait_for(condition, timeout: float = 5) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_batch_over_one_connection(smtp_server):
+    sender = _sender(smtp_server, batch_window=0.2)
+    for n in range(3):
+        sender.send("peer@example.com", f"通知 {n}", f"内容 {n}")
+
+    assert sender.flush(5)
+    assert len(smtp_server.messages) == 3
+    assert smtp_server.connections == 1
+    assert smtp_server.quits == 0
+
+    # 之后的邮件复用同一个连接
+    sender.send("peer@example.com", "通知 3", "内容 3")
+    assert sender.flush(5)
+    assert smtp_server.connections == 1
+
+    sender.close(5)
+    assert smtp_server.quits == 1
+    assert len(smtp_server.messages) == 4
+
+
+def test_retry_after_dropped_connection(smtp_server):
+    sender = _sender(smtp_server, batch_window=0)
+    smtp_server.mail_faults = ["drop", "451 try again later"]
+    sender.send("peer@example.com", "通知", "内容")
+
+    assert sender.flush(5)
+    assert len(smtp_server.messages) == 1
+    assert smtp_server.connections == 3
+    sender.close(5)
+
+
+def test_permanent_error_is_not_retried(smtp_server):
+    sender = _sender(smtp_server, batch_window=0)
+    smtp_server.mail_faults = ["550 mailbox unavailable"]
+    sender.send("peer@example.com", "通知", "内容")
+    sender.send("peer@example.com", "通知 2", "内容 2")
+
+    assert sender.flush(5)
+    assert len(smtp_server.messages) == 1
+    assert smtp_server.connections == 1
+    sender.close(5)
+
+
+def test_idle_connection_quit_does_not_block_send(smtp_server):
+    sender = _sender(smtp_server, batch_window=0, keepalive=0.2)
+    smtp_server.quit_delay = 1.0
+    sender.send("peer@example.com", "通知", "内容")
+    assert sender.flush(5)
+
+    # 空闲超过 keepalive 后断开; 等待 QUIT 的回复期间, send 不需要等待队列的锁
+    assert _wait_for(lambda: sender._conn is None)
+    start = time.monotonic()
+    sender.send("peer@example.com", "通知 2", "内容 2")
+    assert time.monotonic() - start < 0.2
+
+    assert sender.flush(5)
+    assert smtp_server.quits == 1
+    assert smtp_server.connections == 2
+    assert len(smtp_server.messages) == 2
+    sender.close(5)
+
+
+def test_send_after_close_fails(smtp_server):
+    sender = _sender(smtp_server)
+    sender.close(5)
+    with pytest.raises(RuntimeError):
+        sender.send("peer@example.com", "通知", "内容")
@@ -0,0 +1,79 @@
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.charset import Charset, QP
+from email.header import Header
+from mail_utils import decode_subject, extract_text_body, sender_address
+
+
+def _lines(msg) -> list[bytes]:
+    """与 POP3 RETR 相同: 不带换行符的各行."""
+    return msg.as_bytes().split(b"\n")
+
+
+def test_plain_text_base64():
+    msg = MIMEText("- 2026-01-20\n跑步：+2.\n", "plain", "utf-8")
+    msg["Subject"] = Header("日记", "utf-8").encode()
+    msg["From"] = "Peer <peer@example.com>"
+
+    headers, body = extract_text_body(_lines(msg))
+
+    assert body == "- 2026-01-20\n跑步：+2.\n"
+    assert decode_subject(headers["Subject"]) == "日记"
+    assert sender_address(headers["From"]) == "peer@example.com"
+
+
+def test_quoted_printable_gbk():
+    charset = Charset("gbk")
+    charset.body_encoding = QP
+    msg = MIMEText("今天读书两小时", "plain", charset)
+    assert msg["Content-Transfer-Encoding"] == "quoted-printable"
+
+    _, body = extract_text_body(_lines(msg))
+
+    assert body == "今天读书两小时"
+
+
+def test_nested_multipart_stops_before_attachments():
+    alternative = MIMEMultipart("alternative")
+    alternative.attach(MIMEText("正文", "plain", "utf-8"))
+    alternative.attach(MIMEText("<p>正文</p>", "html", "utf-8"))
+    msg = MIMEMultipart("mixed")
+    msg.attach(alternative)
+    msg.attach(MIMEApplication(b"\0" * 100_000, Name="big.bin"))
+    lines = _lines(msg)
+
+    consumed = 0
+
+    def lazy():
+        nonlocal consumed
+        for line in lines:
+            consumed += 1
+            yield line
+
+    _, body = extract_text_body(lazy())
+
+    assert body == "正文"
+    # 找到正文后不再读取之后的部分(附件)
+    assert consumed < len(lines) // 10
+
+
+def test_text_attachment_is_not_the_body():
+    msg = MIMEMultipart("mixed")
+    msg.attach(MIMEApplication(b"data", Name="a.bin"))
+    attachment = MIMEText("附件内容", "plain", "utf-8")
+    attachment.add_header("Content-Disposition", "attachment", filename="notes.txt")
+    msg.attach(attachment)
+
+    _, body = extract_text_body(_lines(msg))
+
+    assert body == ""
+
+
+def test_crlf_lines():
+    msg = MIMEText("第一行\n第二行", "plain", "utf-8")
+    lines = [line + b"\r\n" for line in _lines(msg)]
+
+    _, body = extract_text_body(lines)
+
+    assert body == "第一行\n第二行"
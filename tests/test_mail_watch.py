@@ -0,0 +1,170 @@
+import time
+import threading
+import socketserver
+from email.mime.text import MIMEText
+import pytest
+from cache_store import cache_store
+from mail_utils import staged_fragments
+from mail_watch import MailWatcher
+
+PEER = "peer@example.com"
+
+
+def _message(uid: int, sender: str, body: str, message_id: str, subtype: str = "plain") -> tuple[int, bytes]:
+    msg = MIMEText(body, subtype, "utf-8")
+    msg["From"] = sender
+    msg["Subject"] = f"日记 {uid}"
+    msg["Message-ID"] = message_id
+    msg["Date"] = "Tue, 20 Jan 2026 08:00:00 +0800"
+    return uid, msg.as_bytes().replace(b"\n", b"\r\n")
+
+
+class ImapStub(socketserver.ThreadingTCPServer):
+    """最小的明文 IMAP4 服务器: 一个 INBOX, 支持 LOGIN, SELECT, UID SEARCH/FETCH 与 IDLE."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), ImapHandler)
+        self.messages: list[tuple[int, bytes]] = []
+        self.uidvalidity = 7
+        # 为 True 时 "* N EXISTS" 与 IDLE 的 "+ idling" 在同一次写入中发送
+        self.exists_on_idle = False
+
+
+class ImapHandler(socketserver.StreamRequestHandler):
+    def send(self, data: bytes) -> None:
+        self.wfile.write(data)
+        self.wfile.flush()
+
+    def handle(self):
+        server = self.server
+        self.send(b"* OK IMAP4rev1 stub ready\r\n")
+        for line in self.rfile:
+            tag, command, *args = line.decode().rstrip("\r\n").split(" ", 2)
+            command = command.upper()
+            rest = args[0] if args else ""
+            if command == "CAPABILITY":
+                self.send(b"* CAPABILITY IMAP4rev1 IDLE\r\n")
+            elif command == "SELECT":
+                self.send(f"* {len(server.messages)} EXISTS\r\n"
+                          f"* OK [UIDVALIDITY {server.uidvalidity}] UIDs valid\r\n".encode())
+            elif command == "UID" and rest.startswith("SEARCH"):
+                self.send(f"* SEARCH {' '.join(map(str, self.search(rest)))}\r\n".encode())
+            elif command == "UID" and rest.startswith("FETCH"):
+                uid = int(rest.split()[1])
+                raw = dict(server.messages)[uid]
+                n = [u for u, _ in server.messages].index(uid) + 1
+                self.send(f"* {n} FETCH (UID {uid} BODY[] {{{len(raw)}}}\r\n".encode() + raw + b")\r\n")
+            elif command == "IDLE":
+                exists = f"* {len(server.messages)} EXISTS\r\n" if server.exists_on_idle else ""
+                self.send(f"+ idling\r\n{exists}".encode())
+                if self.rfile.readline().strip() != b"DONE":
+                    return
+            elif command == "LOGOUT":
+                self.send(f"* BYE\r\n{tag} OK LOGOUT completed\r\n".encode())
+                return
+            self.send(f"{tag} OK {command} completed\r\n".encode())
+
+    def search(self, criteria: str) -> list[int]:
+        # "SEARCH UID n:* FROM "peer"": 与真实服务器相同, 没有大于等于 n 的 UID 时也返回最大的 UID
+        first = int(criteria.split()[2].split(":")[0])
+        sender = criteria.split("FROM", 1)[1].strip().strip('"').encode()
+        uids = [uid for uid, raw in self.server.messages if sender in raw.split(b"\r\n\r\n", 1)[0]]
+        return [uid for uid in uids if uid >= first] or uids[-1:]
+
+
+@pytest.fixture
+def imap_server():
+    server = ImapStub()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _watcher(server, idle_timeout: float = 5) -> MailWatcher:
+    host, port = server.server_address
+    return MailWatcher({
+        "EMAIL_ACCOUNT": "me@example.com",
+        "EMAIL_RECEIVE_KEY": "secret",
+        "EMAIL_ACCOUNT_PEER": PEER,
+        "EMAIL_IMAP_SERVER": host,
+        "EMAIL_IMAP_PORT": str(port),
+        "EMAIL_IMAP_SSL": "0",
+    }, idle_timeout=idle_timeout)
+
+
+def _staged_bodies() -> list[str]:
+    return [fragment["body"] for _, fragment in staged_fragments()]
+
+
+def test_sync_stages_new_peer_mail(workspace, imap_server):
+    imap_server.messages = [
+        _message(1, PEER, "2026-01-20\n跑步", "<1@x>"),
+        _message(2, "other@example.com", "广告", "<2@x>"),
+        _message(3, PEER, "<p>只有 HTML</p>", "<3@x>", "html"),
+    ]
+    watcher = _watcher(imap_server)
+    imap = watcher.connect()
+    try:
+        assert watcher.sync(imap) == 1
+        assert _staged_bodies() == ["2026-01-20\n跑步"]
+        # 已同步的 UID 不再取回
+        assert watcher.sync(imap) == 0
+
+        imap_server.messages += [
+            _message(4, PEER, "读书", "<4@x>"),
+            # 同一封邮件以新的 UID 再次出现(如被移动回收件箱), 按 Message-ID 跳过
+            _message(5, PEER, "2026-01-20\n跑步", "<1@x>"),
+        ]
+        assert watcher.sync(imap) == 1
+        assert _staged_bodies() == ["2026-01-20\n跑步", "读书"]
+        assert cache_store.get("mail", "imap_state:me@example.com") == {"uidvalidity": "7", "last_uid": 5}
+    finally:
+        imap.logout()
+
+
+def test_sync_after_uidvalidity_change(workspace, imap_server):
+    imap_server.messages = [_message(1, PEER, "跑步", "<1@x>")]
+    watcher = _watcher(imap_server)
+    imap = watcher.connect()
+    assert watcher.sync(imap) == 1
+    imap.logout()
+
+    # UIDVALIDITY 变化后从头检查, 已暂存的邮件由 Message-ID 过滤
+    imap_server.uidvalidity = 8
+    imap_server.messages = [_message(1, PEER, "跑步", "<1@x>"), _message(2, PEER, "读书", "<2@x>")]
+    imap = watcher.connect()
+    try:
+        assert watcher.sync(imap) == 1
+        assert _staged_bodies() == ["跑步", "读书"]
+    finally:
+        imap.logout()
+
+
+def test_idle_notices_exists_sent_with_continuation(workspace, imap_server):
+    imap_server.messages = [_message(1, PEER, "跑步", "<1@x>")]
+    imap_server.exists_on_idle = True
+    watcher = _watcher(imap_server, idle_timeout=5)
+    imap = watcher.connect()
+    try:
+        start = time.monotonic()
+        assert watcher.idle(imap) is True
+        assert time.monotonic() - start < 1
+        # IDLE 结束后连接仍可使用
+        assert imap.noop()[0] == "OK"
+    finally:
+        imap.logout()
+
+
+def test_idle_times_out_without_new_mail(workspace, imap_server):
+    watcher = _watcher(imap_server, idle_timeout=0.2)
+    imap = watcher.connect()
+    try:
+        assert watcher.idle(imap) is False
+        assert imap.noop()[0] == "OK"
+    finally:
+        imap.logout()
@@ -0,0 +1,80 @@
+import pytest
+from plan_parser import PlanIndex, candidate_source, date_key, heading_key
+
+PLAN = """# 2026年计划
+
+- 全年读 24 本书
+
+## 2026.S1计划
+
+- 完成后端重构
+
+### 2026.01计划
+
+- 跑步: 每周至少5次.
+
+#### 第1周
+
+- 整理需求
+
+### 2026年2月计划
+
+- 春节休息
+
+## 2026-Q2计划
+
+- 上线新版本
+"""
+
+
+@pytest.mark.parametrize("title, key", [
+    ("2026.01计划", "2026-01"),
+    ("2026-1月计划", "2026-01"),
+    ("2026年12月份计划", "2026-12"),
+    ("2026.S1计划", "2026-Q1"),
+    ("2026年第二季度计划", "2026-Q2"),
+    ("2026年度计划", "2026"),
+    ("2026.13计划", None),
+    ("读书笔记", None),
+])
+def test_heading_key(title, key):
+    assert heading_key(title) == key
+
+
+@pytest.mark.parametrize("date, key", [
+    ("2026-01", "2026-01"),
+    ("2026.1", "2026-01"),
+    ("2026-S3", "2026-Q3"),
+    ("2026q3", "2026-Q3"),
+    ("2026", "2026"),
+    ("2026-13", None),
+    ("下个月", None),
+])
+def test_date_key(date, key):
+    assert date_key(date) == key
+
+
+def test_sections_include_subheadings():
+    index = PlanIndex(PLAN)
+    assert index.section("2026-01") == "### 2026.01计划\n\n- 跑步: 每周至少5次.\n\n#### 第1周\n\n- 整理需求"
+    assert index.section("2026-02") == "### 2026年2月计划\n\n- 春节休息"
+    # 季度章节包含其中的月度计划, 到下一个同级标题为止
+    assert index.section("2026-S1").startswith("## 2026.S1计划")
+    assert index.section("2026-S1").endswith("- 春节休息")
+    assert index.section("2026-Q2") == "## 2026-Q2计划\n\n- 上线新版本"
+    assert index.section("2026") == PLAN.strip()
+    assert index.section("2026-03") is None
+    assert index.section("下个月") is None
+
+
+def test_unformatted_plan_has_no_sections():
+    assert PlanIndex("一月: 读书\n二月: 跑步\n").sections == {}
+
+
+def test_candidate_source_picks_matching_sections():
+    text = "## 2025年1月\n- 旧计划\n## 2026年1月\n- 读书\n## 2026年11月\n- 跑步\n"
+    assert candidate_source(text, "2026-01") == "## 2026年1月\n- 读书\n"
+    assert candidate_source(text, "2026-11") == "## 2026年11月\n- 跑步\n"
+    # 没有匹配的章节或日期无法识别时使用全文
+    assert candidate_source(text, "2027-01") == text
+    assert candidate_source(text, "下个月") == text
@@ -0,0 +1,65 @@
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from langchain.agents.middleware import AgentMiddleware
+from langchain.messages import ToolMessage
+from utils import logger
+
+# 同时执行的工具数量(线程池宽度), 可在 aid_config.json 中用 "tool_workers" 配置
+DEFAULT_TOOL_WORKERS = 8
+# 单个工具调用的超时(秒), 可用 "tool_timeout" 配置, 或用 "tool_timeouts": {"get_plan": 300} 按工具配置
+DEFAULT_TOOL_TIMEOUT = 120
+
+
+class ToolExecutionMiddleware(AgentMiddleware):
+    """工具执行层: 同一条 AI 消息中的多个工具调用并发执行, 每个调用有超时并记录耗时.
+
+    agent.astream 会把一步中的各个工具调用同时调度; 阻塞的部分(asyncio.to_thread 与同步工具)
+    都在事件循环的默认线程池中执行, 这里把它替换为宽度为 max_workers 的线程池.
+    超时的调用返回错误信息给模型, 不等待其结束(线程无法被中止, 仍会在后台执行完).
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_TOOL_WORKERS, timeout: float = DEFAULT_TOOL_TIMEOUT,
+                 tool_timeouts: dict[str, float] | None = None):
+        super().__init__()
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.tool_timeouts = dict(tool_timeouts or {})
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="aid-tool")
+        # 本轮对话的工具调用记录: [(工具名, 开始时间, 耗时秒数, 状态), ...], 开始时间为 perf_counter
+        self.timings: list[tuple[str, float, float, str]] = []
+        self._loop = None
+
+    async def abefore_agent(self, state, runtime) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            loop.set_default_executor(self.executor)
+            self._loop = loop
+        self.timings = []
+
+    async def aafter_agent(self, state, runtime) -> None:
+        if self.timings:
+            start = min(t[1] for t in self.timings)
+            wall = max(t[1] + t[2] for t in self.timings) - start
+            total = sum(t[2] for t in self.timings)
+            logger.debug(f"##### tools: {len(self.timings)} calls, {total:.3f}s in total, {wall:.3f}s from first to last")
+
+    async def awrap_tool_call(self, request, handler):
+        name = request.tool_call["name"]
+        timeout = self.tool_timeouts.get(name, self.timeout)
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            return await asyncio.wait_for(handler(request), timeout)
+        except asyncio.TimeoutError:
+            status = "timeout"
+            logger.error(f"##### tool {name} timed out after {timeout}s")
+            return ToolMessage(content=f"错误: 工具 {name} 执行超时({timeout}秒).",
+                               tool_call_id=request.tool_call["id"], name=name, status="error")
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings.append((name, start, elapsed, status))
+            logger.debug(f"##### tool {name}: {elapsed:.3f}s {status}")
@@ -1,23 +1,47 @@
 import os
-import re, json
+import asyncio
+import re
+import hashlib
 import datetime
 import imaplib
 import poplib
 import email
+import email.parser
 from email.header import decode_header
-from email.mime.text import MIMEText
-import smtplib
 from dotenv import dotenv_values
-from langchain.tools import tool
+from dataclasses import dataclass
+from typing import Any
 from langchain.tools import tool, ToolRuntime
 from langchain.messages import ToolMessage
 from langgraph.types import Command
 from utils import logger
+from cache_store import cache_store
+from diary_store import diary_store
+from diary_stats import score_stats
+from diary_period import period_range
+from diary_summary import DiarySummarizer
+from model_limit import context_semaphore, amodel_slot
+from plan_parser import PlanIndex, candidate_source, date_key
+from mail_utils import (decode_subject, sender_address, extract_text_body, pop_retr_lines, is_seen_message,
+                        mark_seen_message, stage_fragment, staged_fragments,
+                        clear_staged_fragments, watcher_running)
+from mail_sender import notification_sender
+from diary_merge import merge_fragments
 
 env_vars = dotenv_values(".env")
 
 EMAIL_ACCOUNT_PEER=os.getenv('EMAIL_ACCOUNT_PEER')
 
+# 运行时上下文, 不进入 checkpoint. 工具通过 runtime.context 访问.
+# 工具参数写作 ToolRuntime[AidContext]: 调用工具前 langchain 会校验并序列化参数(包括 runtime),
+# 不标注上下文类型时, 序列化会按 None 处理 context 并在每次工具调用时给出 Pydantic 警告.
+@dataclass
+class AidContext:
+    # ChatOpenAI | OllamaLLM; 标注为 Any, 序列化时不展开模型对象
+    llm: Any = None
+    # batch 命令中跨进程的信号量, 限制模型请求的并发数(见 model_limit.py); 普通对话中为 None
+    model_semaphore: Any = None
+
 @tool
 def get_current_date_time() -> str:
     """Get the current date and time.
@@ -28,41 +52,33 @@ def get_current_date_time() -> str:
     return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
 
-def read_diary_file(diary_file: str) -> list[str]:
-    """Read the diary file and return its lines.
+def read_day_diary(runtime: ToolRuntime[AidContext], date: str) -> str:
+    """Read the diary for a specific date through the date index.
 
     Args:
-        diary_file: The path to the diary file.
+        runtime: The runtime object.
+        date: The date to read the diary for, in the format YYYY-MM-DD
 
     Returns:
-        The lines read from the diary file.
+        The diary string for the specified date, or an empty string if no entry is found.
     """
-    # logger.debug(f"read_diary_file_: {diary_file}")
-    with open(diary_file, "r", encoding="utf-8") as f:
-        lines = f.readlines()
-
-    if len(lines) > 0:
-        logger.debug(f"##### read_diary_file_: {len(lines)} lines.")
-        # runtime.state["lst_diary_lines"] = lines
-        return lines
-
-    return []
-    # return len(lines)
-    #return Command(update={
-    #    "lst_diary_lines": lines,
-    #    # update the message history
-    #    "messages": [
-    #        ToolMessage(
-    #            "Successfully read the diary file",
-    #            tool_call_id=runtime.tool_call_id
-    #        )
-    #    ]
-    #})
+    diary = diary_store.get(runtime.state.get('diary_file_path', None))
+
+    # 通过日记索引直接定位该日期的字节区间, 只读取这一段
+    entry = diary.index.lookup(date)
+    if entry is None:
+        logger.error(f"##### start_idx not found: {date}")
+        return ""
+
+    return diary.reader.read(entry[1], entry[2])
 
 
+# 工具为 async 实现, 由 agent.astream 调用; 文件读取, 日记解析等阻塞操作放到线程中执行,
+# 同一步中的多个工具调用可以并发, 终端输出也不会因工具执行而停顿.
+
 # Get day diary
 @tool
-def get_day_diary(runtime: ToolRuntime, date: str) -> str:
+async def get_day_diary(runtime: ToolRuntime[AidContext], date: str) -> str:
     """Read the diary for a specific date.
 
     Args:
@@ -72,129 +88,141 @@ def get_day_diary(runtime: ToolRuntime, date: str) -> str:
     Returns:
         The diary string for the specified date, or an empty string if no entry is found.
     """
+    return await asyncio.to_thread(read_day_diary, runtime, date)
 
-    lst_diary_lines = runtime.state.get('lst_diary_lines', None)
-    if lst_diary_lines is None or len(lst_diary_lines) == 0:
-        # Read the diary file if lst_diary_lines is empty
-        lst_diary_lines = read_diary_file(runtime.state.get('diary_file_path', None))
-        runtime.state["lst_diary_lines"] = lst_diary_lines
 
-    start_idx = None
-    end_idx = None
+def read_period_diary(runtime: ToolRuntime[AidContext], period: str) -> str:
+    """Read the diary entries within a period through the date index.
 
-    # Pattern to match the target date entry line (allowing leading whitespace and -)
-    target_pattern = rf'^\s*\-\s*{re.escape(date)}'
+    Args:
+        runtime: The runtime object.
+        period: The period accepted by diary_period.period_range.
 
-    # Pattern to match any date entry line
-    date_pattern = r'^\s*\-\s*\d{4}-\d{2}-\d{2}'
+    Returns:
+        The diary string of the period, an empty string if no entry is found, or an error message.
+    """
+    try:
+        start, end = period_range(period)
+    except ValueError as e:
+        logger.error(f"##### invalid period: {period}: {e}")
+        return f"错误: {e}"
 
-    # Find the start index of the target date entry
-    for i, line in enumerate(lst_diary_lines):
-        if re.match(target_pattern, line):
-            # print(f"##### start_idx: {i}")
-            start_idx = i
-            break
+    diary = diary_store.get(runtime.state.get('diary_file_path', None))
 
-    if start_idx is None:
-        logger.error(f"##### start_idx not found: {date}")
+    # 通过日记索引(bisect)查找时段内的所有条目
+    entries = diary.index.range(start, end)
+    if not entries:
+        logger.error(f"##### start_idx not found: {period}")
         return ""
 
-    # Find the end index (next date entry)
-    for i in range(start_idx + 1, len(lst_diary_lines)):
-        if re.match(date_pattern, lst_diary_lines[i]):
-            # print(f"##### end_idx: {i}")
-            end_idx = i
-            break
-
-    # If no next date entry found, go to end of list
-    end_idx = end_idx if end_idx is not None else len(lst_diary_lines)
-
-    # Return the diary entry
-    # return '\n'.join(lst_diary_lines[start_idx:end_idx])
-    return Command(update={
-        # "str_day_diary": '\n'.join(lst_diary_lines[start_idx:end_idx]),
-        "lst_diary_lines": lst_diary_lines,
-        # update the message history
-        "messages": [
-            ToolMessage(
-                '\n'.join(lst_diary_lines[start_idx:end_idx]),
-                tool_call_id=runtime.tool_call_id
-            )
-        ]
-    })
+    return diary.read_entries(entries)
 
 
 # Get month diary
 @tool
-def get_month_diary(runtime: ToolRuntime, date: str) -> str:
+async def get_month_diary(runtime: ToolRuntime[AidContext], date: str) -> str:
     """Read the diary for a specific month.
 
     Args:
         runtime: The runtime object.
         date: The date to read the diary for, in the format YYYY-MM
     """
+    return await asyncio.to_thread(read_period_diary, runtime, date)
 
-    lst_diary_lines = runtime.state.get('lst_diary_lines', None)
-    if lst_diary_lines is None or len(lst_diary_lines) == 0:
-        # Read the diary file if lst_diary_lines is empty
-        lst_diary_lines = read_diary_file(runtime.state.get('diary_file_path', None))
-        runtime.state["lst_diary_lines"] = lst_diary_lines
 
-    # Get month from date
-    str_year = date.split('-')[0]
-    str_month = date.split('-')[1]
-    str_next_month = str(int(str_month) + 1).zfill(2)
-    str_next_month_with_year = f"{str_year}-{str_next_month}"
+# Get week diary
+@tool
+async def get_week_diary(runtime: ToolRuntime[AidContext], week: str) -> str:
+    """Read the diary for a specific ISO week (Monday to Sunday), the "第NN周" in the diary.
 
-    start_idx = None
-    end_idx = None
-    
-    # Pattern to match the target date entry line (allowing leading whitespace and -)
-    target_pattern = rf'^\s*\-\s*{re.escape(date)}'
-    next_month_pattern = rf'^\s*\-\s*{re.escape(str_next_month_with_year)}'
+    Args:
+        runtime: The runtime object.
+        week: The week to read the diary for, in the format YYYY-Www, e.g. 2026-W04
+    """
+    return await asyncio.to_thread(read_period_diary, runtime, week)
 
-    # Pattern to match any date entry line
-    date_pattern = r'^\s*\-\s*\d{4}-\d{2}-\d{2}'
 
-    # Find the start index of the target date entry
-    for i, line in enumerate(lst_diary_lines):
-        if re.match(target_pattern, line):
-            start_idx = i
-            break
+# Get quarter diary
+@tool
+async def get_quarter_diary(runtime: ToolRuntime[AidContext], quarter: str) -> str:
+    """Read the diary for a specific quarter.
 
-    if start_idx is None:
-        logger.error(f"##### start_idx not found: {date}")
-        return ""
+    Args:
+        runtime: The runtime object.
+        quarter: The quarter to read the diary for, in the format YYYY-Qn (or YYYY-Sn), e.g. 2026-Q1
+    """
+    return await asyncio.to_thread(read_period_diary, runtime, quarter)
 
-    # Find the end index (str_next_month_with_year)
-    for i in range(start_idx + 1, len(lst_diary_lines)):
-        if re.match(next_month_pattern, lst_diary_lines[i]):
-            end_idx = i
-            break
 
-    # If no next date entry found, go to end of list
-    end_idx = end_idx if end_idx is not None else len(lst_diary_lines)
+# Get diary of a date range
+@tool
+async def get_diary_range(runtime: ToolRuntime[AidContext], start: str, end: str) -> str:
+    """Read the diary between two dates, both inclusive.
+
+    Args:
+        runtime: The runtime object.
+        start: The first date, in the format YYYY-MM-DD
+        end: The last date, in the format YYYY-MM-DD
+    """
+    return await asyncio.to_thread(read_period_diary, runtime, f"{start}..{end}")
+
+
+def summarize_period_diary(runtime: ToolRuntime[AidContext], period: str) -> str:
+    """Summarize the diary of a period with the cached hierarchical summaries, plus its score statistics.
+
+    Args:
+        runtime: The runtime object.
+        period: The period, in the format YYYY-Www, YYYY-MM, YYYY-Qn or YYYY.
+
+    Returns:
+        The summary string, or an error message.
+    """
+    llm = runtime.context.llm if runtime.context is not None else None
+    if llm is None:
+        logger.error(f"##### llm not found in context")
+        return "错误: 未配置llm模型."
+
+    diary = diary_store.get(runtime.state.get('diary_file_path', None))
+    try:
+        summary = DiarySummarizer(llm, model_semaphore=context_semaphore(runtime)).summarize(diary, period)
+        if not summary:
+            return ""
+        stats = score_stats(diary.records.range(*period_range(period)), "category")
+    except ValueError as e:
+        logger.error(f"##### summarize_period_diary: {e}")
+        return f"错误: {e}"
+    except Exception as e:
+        logger.error(f"##### Failed to summarize diary: {e}")
+        return "错误: 生成日记摘要失败."
+
+    return f"{summary}\n\n## 分数统计\n{stats}"
+
+
+# Get period summary
+@tool
+async def get_period_summary(runtime: ToolRuntime[AidContext], period: str) -> str:
+    """Get the summary of the diary for a week, month, quarter or year, with its score statistics.
+    Use it for reviews of long periods instead of reading all the entries.
+
+    Args:
+        runtime: The runtime object.
+        period: The period, in the format YYYY-Www (week), YYYY-MM (month), YYYY-Qn (quarter) or YYYY (year)
+    """
+    return await asyncio.to_thread(summarize_period_diary, runtime, period)
 
-    # Return the diary entry
-    return '\n'.join(lst_diary_lines[start_idx:end_idx])
 
 # Get year diary
 @tool
-def get_year_diary(runtime: ToolRuntime, date: str) -> str:
-    """Read the diary for a specific year.
+async def get_year_diary(runtime: ToolRuntime[AidContext], date: str) -> str:
+    """Read the diary for a specific year, as the year summary and its quarter summaries
+    (the full text of a year is too long). Use get_diary_range for the entries of specific days.
 
     Args:
         runtime: The runtime object.
         date: The date to read the diary for, in the format YYYY
     """
-    lst_diary_lines = runtime.state.get('lst_diary_lines', None)
-    if lst_diary_lines is None or len(lst_diary_lines) == 0:
-        # Read the diary file if lst_diary_lines is empty
-        lst_diary_lines = read_diary_file(runtime.state.get('diary_file_path', None))
-        runtime.state["lst_diary_lines"] = lst_diary_lines
+    return await asyncio.to_thread(summarize_period_diary, runtime, date[:4])
 
-    # 直接返回全部日记
-    return '\n'.join(lst_diary_lines)
 
 def show_diary(diary: str) -> None:
     """Show the diary text.
@@ -225,108 +253,112 @@ def calc_sum_from_expression(expression: str) -> int:
     return ret_sum
 
 
+def calc_score_stats(runtime: ToolRuntime[AidContext], start: str, end: str, group_by: str = "category") -> str:
+    """Calculate the score statistics of the diary between two dates, see get_score_stats."""
+    diary = diary_store.get(runtime.state.get('diary_file_path', None))
+
+    try:
+        # 也接受 YYYY-MM, YYYY-Www 等时段格式
+        start, end = period_range(f"{start}..{end}")
+        return score_stats(diary.records.range(start, end), group_by)
+    except ValueError as e:
+        logger.error(f"##### get_score_stats: {e}")
+        return f"错误: {e}"
+
+
+@tool
+async def get_score_stats(runtime: ToolRuntime[AidContext], start: str, end: str, group_by: str = "category") -> str:
+    """统计指定时段内日记中的分数(如 "跑步：+2", "熬夜：-1")与时长(如 "(8.0h)"), 按类别分项汇总.
+
+    Args:
+        runtime: The runtime object.
+        start: 开始日期, 格式为 YYYY-MM-DD.
+        end: 结束日期(包含), 格式为 YYYY-MM-DD.
+        group_by: 分组方式: "category"(按类别汇总), "day", "week" 或 "month"(按时段列出各类别分数).
+
+    Returns:
+        The statistics as a markdown table.
+    """
+    return await asyncio.to_thread(calc_score_stats, runtime, start, end, group_by)
+
+
+def read_text_file(path: str) -> str:
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
 @tool
-def get_plan(runtime: ToolRuntime, date: str) -> str:
+async def get_plan(runtime: ToolRuntime[AidContext], date: str) -> str:
     """获取指定时段的计划.
 
     Args:
         runtime: The runtime object.
-        date: 计划日期. 如果是月度计划, 则格式为YYYY-MM. 如果是季度计划, 则格式为YYYY-Sn(表示第n季度).
+        date: 计划日期. 如果是月度计划, 则格式为YYYY-MM. 如果是季度计划, 则格式为YYYY-Sn(表示第n季度). 如果是年度计划, 则格式为YYYY.
     """
 
     plan_file_path = runtime.state.get('plan_file_path', None)
-    llm = runtime.state.get('llm', None)
-    if llm is None:
-        logger.error(f"##### llm not found in state")
-        return "错误: 未配置llm模型."
-    
-    # 获取计划文件时间标签
-    str_plan_date = None
+
     try:
-        # 获取计划文件的最后修改时间戳
-        mtime = os.path.getmtime(plan_file_path)
-        # 将时间戳转换为格式化字符串
-        str_plan_date = datetime.datetime.fromtimestamp(mtime).strftime("%Y-%m-%d %H:%M:%S")
+        file_content = await asyncio.to_thread(read_text_file, plan_file_path)
     except FileNotFoundError:
-        logger.error(f"##### plan file not found: {plan_file_path}")
-    except Exception as e:
-        logger.error(f"##### failed to get plan file time: {e}")
-    
-    if str_plan_date is None:
-        logger.error(f"##### plan date not found: {plan_file_path}")
-        return "错误: 计划文件时间标签获取失败."
+        logger.error(f"##### Plan file not found: {plan_file_path}")
+        return "错误: 计划文件不存在."
 
-    logger.trace(f"##### plan date: {str_plan_date}")
+    # 按标题(如 "## 2026.01计划")切分计划文件, 符合格式的计划直接返回原文, 不调用llm
+    plan_index = PlanIndex(file_content)
+    plan_section = plan_index.section(date)
+    if plan_section is not None:
+        logger.debug(f"##### Found plan section for {date}")
+        return plan_section
 
-    # 计划文件与缓存内容记录的时间标签对比, 计划文件更新, 则重新调用llm读取计划文件, 并更新缓存内容(如果没有缓存文件则创建). 否则使用缓存内容.
-    # 缓存文件路径为: ./.aid/cache/plan.json. 如果目录不存在, 则创建目录.
-    # 缓存文件内容格式为: {YYYY-MM: {"update": "2025-12-01 12:00:00", "plan": "计划内容文本"}}
-    cache_file_path = os.path.join(".", ".aid", "cache", "plan.json")
-    
-    # 确保缓存目录存在
-    cache_dir = os.path.dirname(cache_file_path)
-    os.makedirs(cache_dir, exist_ok=True)
-    
-    # 读取缓存内容
-    cache_data = {}
-    if os.path.exists(cache_file_path):
-        try:
-            with open(cache_file_path, "r", encoding="utf-8") as f:
-                cache_data = json.load(f)
-        except json.JSONDecodeError:
-            logger.error(f"##### Failed to decode cache file: {cache_file_path}")
-            cache_data = {}
+    # 计划文件符合约定格式(有可识别的计划标题)但没有该时段的章节, 说明没有这个时段的计划, 不调用llm
+    if plan_index.sections and date_key(date) is not None:
+        logger.debug(f"##### No plan section for {date}")
+        return f"没有{date}的计划."
+
+    # 计划不符合约定格式或日期格式无法识别时, 由llm提取
+    llm = runtime.context.llm if runtime.context is not None else None
+    if llm is None:
+        logger.error(f"##### llm not found in context")
+        return "错误: 未配置llm模型."
     
-    # 检查缓存是否存在且未过期(缓存日期比计划文件更新时间晚)
-    if date in cache_data and cache_data[date]["update"] >= str_plan_date:
+    # 只把可能包含该时段计划的章节交给llm, 并以这些章节原文的哈希作为缓存键.
+    # 这样修改其他月份的计划不会使本月的提取结果失效.
+    # 缓存在 cache_store 的 plan 命名空间中, 内容格式为: {YYYY-MM: {"hash": "章节原文的sha1", "plan": "计划内容文本"}}
+    source = candidate_source(file_content, date)
+    source_hash = hashlib.sha1(f"{date}\n{source}".encode("utf-8")).hexdigest()
+
+    # 检查缓存是否存在且对应的章节未修改
+    cached = cache_store.get("plan", date)
+    if cached is not None and cached.get("hash") == source_hash:
         # 使用缓存内容
         logger.debug(f"##### Using cached plan for {date}")
-        return cache_data[date]["plan"]
-    
-    # 缓存不存在或已过期，重新读取计划文件
-    try:
-        with open(plan_file_path, "r", encoding="utf-8") as f:
-            file_content = f.read()
-    except FileNotFoundError:
-        logger.error(f"##### Plan file not found: {plan_file_path}")
-        return "错误: 计划文件不存在."
-    
-    # 调用llm提取计划内容
-    # plan_content = file_content
+        return cached["plan"]
+
+    # 缓存不存在或已过期，调用llm提取计划内容
     plan_content = ""
     try:
-        # plan_content = llm.invoke(f"请提取{date}的计划内容. 精确的输出提取到的计划原文内容, 不要添加与修改文本, 要全部计划内容如下:\n{file_content}").content
-        plan_content = llm.invoke(f"请提取{date}的计划内容. 精确的输出提取到的计划原文内容, 不要添加与修改文本, 要全部计划内容如下:\n{file_content}").content
-        # print(f"plan_content: >>>>{plan_content}<<<<")
-
-        #for chunk in agent.stream({
-        #    "messages": [{"role": "user", "content": user_input}],
-        #    # "lst_diary_lines": [],
-        #    "diary_file_path": diary_file_path,
-        #}, {
-        #    "configurable": {"thread_id": "1"}
-        #}, stream_mode="values"):
+        async with amodel_slot(context_semaphore(runtime)):
+            result = await llm.ainvoke(f"请提取{date}的计划内容. 精确的输出提取到的计划原文内容, 不要添加与修改文本, 要全部计划内容如下:\n{source}")
+        plan_content = getattr(result, "content", result)
     except Exception as e:
         logger.error(f"##### Failed to invoke llm: {e}")
         return "错误: 调用llm模型提取计划失败."
-    
+
     # 更新缓存
-    cache_data[date] = {
-        "update": str_plan_date,
-        "plan": plan_content
-    }
-    
     try:
-        with open(cache_file_path, "w", encoding="utf-8") as f:
-            json.dump(cache_data, f, ensure_ascii=False, indent=2)
+        cache_store.set("plan", date, {
+            "hash": source_hash,
+            "plan": plan_content
+        })
         logger.debug(f"##### Cache updated for {date}")
     except Exception as e:
         logger.error(f"##### Failed to save cache: {e}")
-    
+
     # 返回计划内容
     return plan_content
 
-#def email_receive_diary(runtime: ToolRuntime) -> str:
+#def email_receive_diary(runtime: ToolRuntime[AidContext]) -> str:
 #    """接收指定邮箱的邮件, 从邮箱中提取日记片段. 并返回日记片段内容.
 #        1. 从 cache 文件中上次接收邮件的时间戳开始, 接收所有未读邮件.
 #        2. 从邮件内容中提取日记片段. 并将新时间戳记录到 cache 中.
@@ -511,41 +543,44 @@ def get_plan(runtime: ToolRuntime, date: str) -> str:
 #        return "错误: 接收邮件失败."
 
 
-def email_receive_diary_pop(runtime: ToolRuntime) -> str:
+async def email_receive_diary_pop(runtime: ToolRuntime[AidContext]) -> str:
     """
     从指定邮箱接收未读日记邮件，提取其中的内容作为日记片段。 仅处理来自指定发件人的邮件。
-        1. 从 cache 文件中上次接收邮件的时间戳开始, 接收所有未读邮件.
-        2. 从邮件内容中提取日记片段. 并将新时间戳记录到 cache 中.
-        3. 返回提取到的日记片段.
+        0. mail-watch 守护进程把日记片段暂存在 cache 中; 守护进程在运行时直接使用暂存的片段, 不再连接邮箱.
+        1. 用 UIDL 找出未处理过的邮件(已处理的 UID 记录在 cache 中), 先用 TOP n 0 只取邮件头,
+           仅下载来自指定发件人的新邮件. 没有新邮件时只需一次 UIDL 交互.
+        2. 从邮件内容中提取日记片段并暂存. 并将新时间戳与已处理的 UID 记录到 cache 中.
+        3. 把暂存的日记片段写入日记文件的对应日期下(见 diary_merge.py, 按 Message-ID 去重),
+           写入成功后才从暂存区删除; 中途出错时片段留在暂存区, 下次接收时再写入.
+        4. 返回提取到的日记片段.
+
+    Args:
+        runtime: The runtime object.
+    """
+    # poplib 与日记写入都是阻塞的, 在线程中执行
+    return await asyncio.to_thread(receive_diary_pop, runtime)
+
+
+def receive_diary_pop(runtime: ToolRuntime[AidContext]) -> str:
+    """通过 POP3(或 mail-watch 的暂存区)接收日记邮件并写入日记, 见 email_receive_diary_pop.
 
     Args:
         runtime: The runtime object.
     """
     try:
-        # 1. 获取缓存文件中的上次接收时间戳
-        cache_file_path = os.path.join(".", ".aid", "cache", "cache.json")
-        cache_data = {}
+        # 0. mail-watch 运行时片段已在暂存区中
+        if watcher_running():
+            logger.debug("##### mail-watch is running, using staged fragments.")
+            return merge_staged_fragments(runtime)
+
+        # 1. 获取缓存中的上次接收时间戳
         last_receive_time = None
-        
-        # 确保缓存目录存在
-        cache_dir = os.path.dirname(cache_file_path)
-        os.makedirs(cache_dir, exist_ok=True)
-        
-        # 读取缓存文件
-        if os.path.exists(cache_file_path):
+        last_receive_time_str = cache_store.get("mail", "last_email_receive_time")
+        if last_receive_time_str:
             try:
-                with open(cache_file_path, "r", encoding="utf-8") as f:
-                    cache_data = json.load(f)
-                last_receive_time_str = cache_data.get("last_email_receive_time")
-                if last_receive_time_str:
-                    try:
-                        last_receive_time = datetime.datetime.strptime(last_receive_time_str, "%Y-%m-%d %H:%M:%S")
-                    except ValueError:
-                        logger.error(f"##### Invalid date format in cache: {last_receive_time_str}")
-                        last_receive_time = None
-            except json.JSONDecodeError:
-                logger.error(f"##### Failed to decode cache file: {cache_file_path}")
-                cache_data = {}
+                last_receive_time = datetime.datetime.strptime(last_receive_time_str, "%Y-%m-%d %H:%M:%S")
+            except ValueError:
+                logger.error(f"##### Invalid date format in cache: {last_receive_time_str}")
                 last_receive_time = None
         
         # 2. 连接到POP3服务器
@@ -569,99 +604,75 @@ def email_receive_diary_pop(runtime: ToolRuntime) -> str:
                        f"          4. 联系邮箱客服获取帮助"
             
             return f"错误: 邮箱登录失败. 服务器信息: {login_error}"
-        logger.debug(f"##### Logged in to email account: {EMAIL_ACCOUNT}")
+        logger.debug(f"##### Logged in to email account: {env_vars['EMAIL_ACCOUNT']}")
         
-        # 获取邮件数量和大小
-        num_messages = len(pop.list()[1])
-        logger.debug(f"##### Total messages in inbox: {num_messages}")
+        # 获取邮件编号与 UID, 过滤掉已处理过的邮件
+        seen_key = f"pop_seen_uidls:{env_vars['EMAIL_ACCOUNT']}"
+        seen_uids = cache_store.get("mail", seen_key)
+        use_date_filter = seen_uids is None and last_receive_time is not None
+        seen_uids = set(seen_uids or [])
+        server_uids = {}
+        for line in pop.uidl()[1]:
+            msg_num, uid = line.decode("ascii", errors="replace").split(None, 1)
+            server_uids[uid] = int(msg_num)
+        new_uids = [uid for uid in server_uids if uid not in seen_uids]
+        logger.debug(f"##### Total messages in inbox: {len(server_uids)}, new: {len(new_uids)}")
         
-        diary_fragments = []
         latest_receive_time = datetime.datetime.now()
         
-        # 3. 遍历所有邮件
-        for msg_num in range(1, num_messages + 1):
-            # 获取邮件内容
-            resp, lines, octets = pop.retr(msg_num)
-            
-            # 解析邮件
-            msg_content = b"\n".join(lines)
-            msg = email.message_from_bytes(msg_content)
+        # 3. 遍历新邮件
+        for uid in new_uids:
+            msg_num = server_uids[uid]
+            # 先只取邮件头, 判断发件人
+            resp, lines, octets = pop.top(msg_num, 0)
+            headers = email.parser.BytesHeaderParser().parsebytes(b"\n".join(lines))
             
             # 获取发件人信息
-            from_ = msg["From"]
-            sender_email = from_.split("<")[-1].rstrip(">")
+            sender_email = sender_address(headers["From"])
             
-            # 只处理来自指定发件人的邮件
+            # 只处理来自指定发件人的邮件; 邮件头不会变化, 其他发件人的邮件以后也不用再检查
             if sender_email != env_vars["EMAIL_ACCOUNT_PEER"]:
+                seen_uids.add(uid)
                 continue
 
-            # 获取邮件主题
-            subject, encoding = decode_header(msg["Subject"])[0]
-            if isinstance(subject, bytes):
-                subject = subject.decode(encoding if encoding else "utf-8")
-
-            # 判断时间是否比上次接收时间新
-            date_str = msg["Date"]
-            date = email.utils.parsedate_to_datetime(date_str)
-            # 移除时区信息，以便与缓存中的时间戳比较
-            if date.tzinfo is not None:
-                date = date.replace(tzinfo=None)
-            if last_receive_time and date <= last_receive_time:
+            # 已由 mail-watch(IMAP) 处理过的邮件
+            message_id = headers["Message-ID"]
+            if is_seen_message(message_id):
+                seen_uids.add(uid)
                 continue
+
+            # 还没有 UID 记录时(旧版本只记录了时间戳), 判断时间是否比上次接收时间新
+            if use_date_filter:
+                date = email.utils.parsedate_to_datetime(headers["Date"])
+                # 移除时区信息，以便与缓存中的时间戳比较
+                if date.tzinfo is not None:
+                    date = date.replace(tzinfo=None)
+                if date <= last_receive_time:
+                    seen_uids.add(uid)
+                    continue
+
+            # 获取邮件正文: 逐行下载并提取, 附件只跳过不保存; 剩余内容需读完才能发送下一条命令
+            lines = pop_retr_lines(pop, msg_num)
+            _, body = extract_text_body(lines)
+            for _ in lines:
+                pass
+            seen_uids.add(uid)
+
+            # 获取邮件主题
+            subject = decode_subject(headers["Subject"])
             
-            # 获取邮件正文
-            body = ""
-            if msg.is_multipart():
-                for part in msg.walk():
-                    content_type = part.get_content_type()
-                    content_disposition = str(part.get("Content-Disposition"))
-                    
-                    try:
-                        if content_type == "text/plain" and "attachment" not in content_disposition:
-                            payload = part.get_payload(decode=True)
-                            # 尝试多种编码解码
-                            encodings = ['utf-8', 'gbk', 'gb2312', 'latin-1']
-                            for encoding in encodings:
-                                try:
-                                    body = payload.decode(encoding)
-                                    break
-                                except UnicodeDecodeError:
-                                    continue
-                            else:
-                                # 如果所有编码都失败，使用latin-1作为兜底
-                                body = payload.decode('latin-1', errors='replace')
-                            break
-                    except Exception as e:
-                        logger.error(f"##### Failed to decode email body: {e}")
-            else:
-                content_type = msg.get_content_type()
-                if content_type == "text/plain":
-                    try:
-                        payload = msg.get_payload(decode=True)
-                        # 尝试多种编码解码
-                        encodings = ['utf-8', 'gbk', 'gb2312', 'latin-1']
-                        for encoding in encodings:
-                            try:
-                                body = payload.decode(encoding)
-                                break
-                            except UnicodeDecodeError:
-                                continue
-                        else:
-                            # 如果所有编码都失败，使用latin-1作为兜底
-                            body = payload.decode('latin-1', errors='replace')
-                    except Exception as e:
-                        logger.error(f"##### Failed to decode email body: {e}")
-            
-            # 将邮件正文作为日记片段
+            # 将邮件正文作为日记片段暂存, 写入日记后再删除
             if body:
-                print(f"##### Received email from {sender_email} with subject: {subject}")
-                diary_fragments.append(body)
+                logger.info(f"##### Received email from {sender_email} with subject: {subject}")
+                date = email.utils.parsedate_to_datetime(headers["Date"]).isoformat() if headers["Date"] else ""
+                stage_fragment(f"pop:{env_vars['EMAIL_ACCOUNT']}:{uid}", message_id, subject, date, body)
+            else:
+                mark_seen_message(message_id)
         
-        # 4. 更新缓存文件中的时间戳
-        cache_data["last_email_receive_time"] = latest_receive_time.strftime("%Y-%m-%d %H:%M:%S")
+        # 4. 更新缓存中的时间戳与已处理的 UID(只保留仍在服务器上的)
         try:
-            with open(cache_file_path, "w", encoding="utf-8") as f:
-                json.dump(cache_data, f, ensure_ascii=False, indent=2)
+            cache_store.set("mail", "last_email_receive_time", latest_receive_time.strftime("%Y-%m-%d %H:%M:%S"))
+            cache_store.set("mail", seen_key, sorted(seen_uids & server_uids.keys()))
             logger.debug(f"##### Email receive time updated in cache")
         except Exception as e:
             logger.error(f"##### Failed to save cache: {e}")
@@ -669,19 +680,46 @@ def email_receive_diary_pop(runtime: ToolRuntime) -> str:
         # 5. 关闭邮件连接
         pop.quit()
         
-        # 返回提取到的日记片段
-        if not diary_fragments:
-            logger.debug("##### No new emails received.")
-            return "没有新的邮件."
-        return "\n".join(diary_fragments) if diary_fragments else ""
+        # 写入日记并返回提取到的日记片段(包括之前未能写入的)
+        return merge_staged_fragments(runtime)
         
     except Exception as e:
         logger.error(f"##### Failed to receive email via POP3: {e}")
         return "错误: 接收邮件失败."
 
 
-def email_send_notification(runtime: ToolRuntime, subject: str, body: str) -> str:
+def merge_staged_fragments(runtime: ToolRuntime[AidContext]) -> str:
+    """把暂存的日记片段写入日记文件, 成功后从暂存区删除; 返回片段内容与写入结果.
+
+    Args:
+        runtime: The runtime object.
+    """
+    staged = staged_fragments()
+    if not staged:
+        logger.debug("##### No new emails received.")
+        return "没有新的邮件."
+
+    fragments = [fragment for _, fragment in staged]
+    text = "\n".join(fragment["body"] for fragment in fragments)
+    diary_file_path = runtime.state.get('diary_file_path', None)
+    if not diary_file_path:
+        clear_staged_fragments([key for key, _ in staged])
+        return text
+    try:
+        dates = merge_fragments(diary_file_path, fragments)
+    except Exception as e:
+        logger.error(f"##### Failed to merge diary fragments: {e}")
+        return f"{text}\n\n(错误: 日记片段未能写入日记文件, 下次接收邮件时重试.)"
+    clear_staged_fragments([key for key, _ in staged])
+    if not dates:
+        return text
+    return f"{text}\n\n(以上日记片段已写入日记: {', '.join(dates)})"
+
+
+def email_send_notification(runtime: ToolRuntime[AidContext], subject: str, body: str) -> str:
     """发送指定邮箱的通知邮件.
+        邮件放入发送队列后立即返回, 由后台线程复用已登录的 SMTP 连接发送(见 mail_sender.py),
+        失败时自动重试. 进程退出前会等待队列中的邮件发送完毕.
 
     Args:
         runtime: The runtime object.
@@ -689,33 +727,8 @@ def email_send_notification(runtime: ToolRuntime, subject: str, body: str) -> st
         body: The body of the email.
     """
     try:
-        # 1. 配置SMTP服务器
-        smtp_server = env_vars["EMAIL_SMTP_SERVER"]
-        smtp_port = int(env_vars["EMAIL_SMTP_PORT"])
-        smtp_username = env_vars["EMAIL_ACCOUNT"]
-        smtp_password = env_vars["EMAIL_RECEIVE_KEY"]
-
-        logger.debug(f"##### send notification email. enter.")
-        # 2. 创建SMTP连接
-        with smtplib.SMTP_SSL(smtp_server, smtp_port) as server:
-            # server.starttls()
-            logger.debug(f"##### Log in ...")
-            server.login(smtp_username, smtp_password)
-            logger.debug(f"##### Logged in OK")
-
-            # 3. 构造邮件
-            EMAIL_ACCOUNT_PEER = env_vars["EMAIL_ACCOUNT_PEER"]
-            msg = MIMEText(body, 'plain', 'utf-8')
-            msg['Subject'] = subject
-            msg['From'] = smtp_username
-            msg['To'] = EMAIL_ACCOUNT_PEER
-
-            # 4. 发送邮件
-            str_msg = msg.as_string()
-            logger.debug(f"##### Email content: {str_msg}")
-            server.sendmail(smtp_username, EMAIL_ACCOUNT_PEER, str_msg)
-            logger.debug(f"##### Notification email sent to {EMAIL_ACCOUNT_PEER} with subject: {subject}")
-            return "通知邮件发送成功."
+        notification_sender(env_vars).send(env_vars["EMAIL_ACCOUNT_PEER"], subject, body)
+        return "通知邮件已加入发送队列."
     except Exception as e:
         logger.error(f"##### Failed to send notification email: {e}")
-        return "错误: 发送通知邮件失败."
\ No newline at end of file
+        return "错误: 发送通知邮件失败."
@@ -12,37 +12,42 @@ class Logger:
 
     def __init__(self, level):
         self.level = level
+        # 输出流, None 为标准输出; --output jsonl 时改为标准错误, 标准输出只留给事件
+        self.stream = None
+
+    def _print(self, color, args, kwargs):
+        kwargs.setdefault("file", self.stream)
+        if color:
+            print(color, end='', file=self.stream)
+        print(*args, **kwargs)
+        if color:
+            print('\033[0m', end='', file=self.stream)
 
     def trace(self, *args, **kwargs):
         if self.level >= 4:
-            print('\033[02;34m', end='')
-            print(*args, **kwargs)
-            print('\033[0m', end='')
+            self._print('\033[02;34m', args, kwargs)
     
     def debug(self, *args, **kwargs):
         if self.level >= 3:
-            print('\033[02;37m', end='')
-            print(*args, **kwargs)
-            print('\033[0m', end='')
+            self._print('\033[02;37m', args, kwargs)
     
     def info(self, *args, **kwargs):
         if self.level >= 2:
-            print(*args, **kwargs)
+            self._print(None, args, kwargs)
     
     def warn(self, *args, **kwargs):
         if self.level >= 1:
-            print('\033[33m', end='')
-            print(*args, **kwargs)
-            print('\033[0m', end='')
+            self._print('\033[33m', args, kwargs)
     
     def error(self, *args, **kwargs):
         if self.level >= 0:
-            print('\033[31m', end='')
-            print(*args, **kwargs)
-            print('\033[0m', end='')
+            self._print('\033[31m', args, kwargs)
 
     def set_level(self, level):
         self.level = level
+
+    def set_stream(self, stream):
+        self.stream = stream
     
     # 为了保持向后兼容，仍然支持字典形式调用
     def __getitem__(self, key):